@@ -0,0 +1,182 @@
+"""
+Approximate nearest-neighbour index (IVF) for large face galleries.
+
+Rows of the gallery matrix are grouped into `nlist` clusters with spherical
+k-means. A query only scores the rows in the `nprobe` clusters whose centroids
+are closest, then returns the top-k of those by exact cosine similarity.
+
+Build from the face_encodings table and save to disk (from the Backend directory):
+    python ann_index.py build [--nlist 1024]
+"""
+import os
+import sys
+import threading
+
+import numpy as np
+
+ANN_INDEX_PATH = os.environ.get(
+    'FACE_ANN_INDEX_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'face_ann_index.npz')
+)
+ANN_NPROBE = int(os.environ.get('FACE_ANN_NPROBE', '8'))
+ANN_RERANK_K = int(os.environ.get('FACE_ANN_RERANK_K', '10'))
+
+# Scoring is done in chunks so k-means on 100k+ rows doesn't allocate an N x nlist matrix at once
+_CHUNK_ROWS = 16384
+
+
+def default_nlist(num_rows):
+    """Rule-of-thumb cluster count: ~4*sqrt(N), at least 1."""
+    return max(1, min(num_rows, int(4 * np.sqrt(max(num_rows, 1)))))
+
+
+def _assign(matrix, centroids):
+    """Index of the most similar centroid for every row of matrix."""
+    labels = np.empty(matrix.shape[0], dtype=np.int32)
+    for start in range(0, matrix.shape[0], _CHUNK_ROWS):
+        block = matrix[start:start + _CHUNK_ROWS]
+        labels[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+
+def train_centroids(matrix, nlist, iterations=20, sample_size=65536, seed=0):
+    """Spherical k-means over L2-normalized rows; returns (nlist, dim) unit centroids."""
+    rng = np.random.default_rng(seed)
+    if matrix.shape[0] > sample_size:
+        matrix = matrix[rng.choice(matrix.shape[0], sample_size, replace=False)]
+    nlist = min(nlist, matrix.shape[0])
+    centroids = matrix[rng.choice(matrix.shape[0], nlist, replace=False)].astype(np.float32, copy=True)
+
+    for _ in range(iterations):
+        labels = _assign(matrix, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, matrix)
+        counts = np.bincount(labels, minlength=nlist)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty clusters with random rows so every list stays useful
+            sums[empty] = matrix[rng.choice(matrix.shape[0], int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file index over the rows of a FaceGallery matrix."""
+
+    def __init__(self, centroids, labels, person_ids, nprobe=ANN_NPROBE):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.labels = np.asarray(labels, dtype=np.int32)
+        self.person_ids = list(person_ids)
+        self.nprobe = nprobe
+        self._lock = threading.Lock()
+        self._lists = self._build_lists(self.labels, len(self.centroids))
+
+    @staticmethod
+    def _build_lists(labels, nlist):
+        order = np.argsort(labels, kind='stable')
+        bounds = np.searchsorted(labels[order], np.arange(nlist + 1))
+        return [order[bounds[i]:bounds[i + 1]].astype(np.int64) for i in range(nlist)]
+
+    @classmethod
+    def build(cls, matrix, person_ids, nlist=None, nprobe=ANN_NPROBE, iterations=20, seed=0):
+        """Train centroids on matrix and assign every row to its inverted list."""
+        nlist = nlist or default_nlist(matrix.shape[0])
+        centroids = train_centroids(matrix, nlist, iterations=iterations, seed=seed)
+        return cls(centroids, _assign(matrix, centroids), person_ids, nprobe=nprobe)
+
+    def __len__(self):
+        return len(self.labels)
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    def add(self, row, vec):
+        """Assign one (new or changed) gallery row to its nearest list."""
+        label = int(np.argmax(self.centroids @ vec))
+        with self._lock:
+            if row < len(self.labels):
+                old = int(self.labels[row])
+                self._lists[old] = self._lists[old][self._lists[old] != row]
+            else:
+                self.labels = np.concatenate([self.labels, np.full(row + 1 - len(self.labels), -1, dtype=np.int32)])
+            self.labels[row] = label
+            # Lists are replaced, never mutated, so concurrent searches see a consistent array
+            self._lists[label] = np.append(self._lists[label], row)
+
+    def candidates(self, query, nprobe=None):
+        """Row indices stored in the nprobe lists closest to query."""
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        centroid_scores = self.centroids @ query
+        if nprobe < self.nlist:
+            probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            probe = np.arange(self.nlist)
+        lists = self._lists
+        return np.concatenate([lists[i] for i in probe])
+
+    def search(self, query, matrix, k=ANN_RERANK_K, nprobe=None):
+        """
+        Return (rows, similarities) of the k best rows, best first.
+        Candidates from the probed lists are re-ranked exactly against matrix.
+        """
+        rows = self.candidates(query, nprobe)
+        # The gallery may have grown since the matrix snapshot the caller holds
+        rows = rows[rows < matrix.shape[0]]
+        if rows.size == 0:
+            return rows, np.zeros(0, dtype=np.float32)
+        scores = matrix[rows] @ query
+        if rows.size > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.lexsort((rows, -scores))  # best score first, lower row wins ties like the exact scan
+        return rows[order], scores[order]
+
+    def save(self, path=ANN_INDEX_PATH):
+        """Persist the index next to the app; writes atomically via a temp file."""
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, centroids=self.centroids, labels=self.labels,
+                 person_ids=np.array(self.person_ids, dtype=np.str_), nprobe=self.nprobe)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=ANN_INDEX_PATH):
+        """Load a saved index, or return None if there is none."""
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return cls(data['centroids'], data['labels'], data['person_ids'].tolist(), nprobe=int(data['nprobe']))
+
+
+def build_from_database(path=ANN_INDEX_PATH, nlist=None):
+    """Build an index from the face_encodings table and save it to path."""
+    from neon_db import SessionLocal
+    from face_gallery import FaceGallery
+
+    gallery = FaceGallery(use_ann=False)
+    db = SessionLocal()
+    try:
+        gallery.load(db)
+    finally:
+        db.close()
+    if not len(gallery):
+        print("❌ No face encodings found, nothing to index")
+        return False
+    index = IVFIndex.build(gallery.matrix, gallery.template_person_ids, nlist=nlist)
+    index.save(path)
+    print(f"✅ Indexed {len(index)} face templates into {index.nlist} lists -> {path}")
+    return True
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Face gallery ANN index")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help="Build the IVF index from face_encodings")
+    build.add_argument('--nlist', type=int, default=None)
+    build.add_argument('--path', default=ANN_INDEX_PATH)
+    args = parser.parse_args()
+    sys.exit(0 if build_from_database(args.path, args.nlist) else 1)
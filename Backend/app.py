@@ -11,23 +11,39 @@ os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
 os.environ["XLA_FLAGS"] = "--xla_gpu_cuda_data_dir="
 
 import json
-import base64
 import gc
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request
 from flask_cors import CORS
+try:
+    from flask_sock import Sock
+except ImportError:  # /api/recognize/stream is only available with flask-sock installed
+    Sock = None
 # from flask_sqlalchemy import SQLAlchemy # Removed
 from neon_db import get_db
 from models import FaceEncoding, Attendance, Notification, User
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, func, text, case
+from sqlalchemy import desc, func, text, case, tuple_
 import sys
-import cv2
-import numpy as np
-from deepface import DeepFace
+import logging
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 import period_attendance as period_db
+from rosters import get_roster, upsert_student
+from face_tracker import RecognitionSession
+from uploads import read_upload, UploadTooLarge, MAX_UPLOAD_BYTES, MAX_REQUEST_BYTES
+from warmup import ModelWarmup, MODEL_WARMUP
+from logging_config import configure_logging, start_request_logging
+import metrics
+from metrics import REQUEST_STAGE_SECONDS, HTTP_REQUESTS, HTTP_REQUEST_SECONDS, FACES_PER_REQUEST, RECOGNITION_ERRORS
+# numpy/OpenCV/DeepFace are only imported by the recognition endpoints (`import face_service`),
+# so the rest of the API boots without them. Inference runs in-process, or in the sidecar when INFERENCE_SOCKET is set.
+
+# Logging goes through a queue drained by a background thread; levels via LOG_LEVEL / LOG_LEVELS
+configure_logging()
+logger = logging.getLogger(__name__)
 
 def normalize_date(date_str):
     """Normalize date from DD/MM/YYYY to YYYY-MM-DD if needed."""
@@ -45,9 +61,10 @@ def normalize_date(date_str):
 
 # Face recognition settings for DeepFace (Facenet is lighter for 512MB RAM)
 FACE_RECOGNITION_THRESHOLD = 0.40 # Threshold for Facenet (Cosine) is usually around 0.40
-MODEL_NAME = 'Facenet'
 
 app = Flask(__name__)
+# Reject oversized bodies before they are buffered (enrollment may carry several images)
+app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_BYTES * 10
 
 # ✅ GLOBAL CORS — Allow Vercel and Local Development
 CORS(
@@ -60,13 +77,15 @@ CORS(
 @app.before_request
 def handle_pre_request():
     """Log details and handle OPTIONS preflight."""
-    if request.path == '/health': return
+    g.request_start = time.perf_counter()
+    if request.path in ('/health', '/metrics'): return
     
-    # Log the request
-    print(f"[DEBUG] Request: {request.method} {request.path}", flush=True)
-    if request.method != 'OPTIONS':
+    # Log the request (sampled per LOG_REQUEST_SAMPLE_RATE; the header dict is only built when DEBUG is on)
+    start_request_logging()
+    logger.debug("Request: %s %s", request.method, request.path)
+    if request.method != 'OPTIONS' and logger.isEnabledFor(logging.DEBUG):
         important_headers = {k: v for k, v in request.headers.items() if k.lower() in ['origin', 'referer', 'content-type']}
-        print(f"[DEBUG] Headers: {important_headers}", flush=True)
+        logger.debug("Headers: %s", important_headers)
 
     # ✅ Handle OPTIONS preflight centrally
     if request.method == 'OPTIONS':
@@ -95,34 +114,81 @@ def after_request(response):
     # but keeping it for Gunicorn compatibility if it strips them
     response.headers["Access-Control-Allow-Credentials"] = "true"
     
+    # Count and time every request by its URL rule, so /api/student/<student_id>/... is one series
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    HTTP_REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+    if 'request_start' in g:
+        elapsed = time.perf_counter() - g.request_start
+        HTTP_REQUEST_SECONDS.observe(elapsed, route=route)
+        # One access line per request at INFO, thinned out by LOG_REQUEST_SAMPLE_RATE
+        if request.path not in ('/health', '/metrics'):
+            logger.info("%s %s %d %.1fms", request.method, request.path, response.status_code, elapsed * 1000)
     return response
 
 @app.route('/')
 def index():
-    return jsonify({"status": "Server running", "info": "Use /api/warmup to pre-load models"})
+    return jsonify({"status": "Server running", "info": "Models load in the background; see /api/ready"})
 
 @app.route('/health')
 def health_check():
     return "OK", 200
 
+def load_models():
+    import face_service
+    face_service.get_inference().warm_up()
+
+# One model load per worker, shared by the background warmup and the recognition endpoints
+models = ModelWarmup(load_models)
+
 @app.route('/api/warmup', methods=['GET', 'OPTIONS'])
 def warmup():
-    """Trigger DeepFace model loading to avoid timeout on first real request."""
-    print("[DEBUG] Warmup started: Pre-loading DeepFace components...", flush=True)
+    """Load the models now (or wait for the load already in progress) and report the result."""
     try:
-        # Create a dummy image to trigger internal lazy loading
-        dummy_img = np.zeros((224, 224, 3), dtype=np.uint8)
-        # Just call represent with enforce_detection=False
-        DeepFace.represent(dummy_img, model_name=MODEL_NAME, enforce_detection=False, detector_backend='opencv')
-        print("[DEBUG] Warmup successful!", flush=True)
-        return jsonify({'success': True, 'message': 'Models warmed up and ready'})
+        models.ensure_ready()
+        return jsonify({'success': True, 'message': 'Models warmed up and ready', **models.status()})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e), **models.status()}), 500
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape target: this worker's metrics, plus the inference sidecar's once the models are loaded."""
+    text = metrics.render()
+    # A scrape must never be the thing that loads the recognition stack
+    if models.state == 'ready':
+        try:
+            import face_service
+            text += face_service.get_inference().metrics_text()
+        except Exception as e:
+            logger.warning("Inference metrics unavailable: %s", e)
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    """Model warmup state (cold/loading/ready/failed); 503 until recognition can serve without loading."""
+    status = models.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+@app.route('/api/recognition/stats', methods=['GET'])
+def recognition_stats():
+    """Stage timings and embedding-cache hit/miss counters of the inference pipeline."""
+    try:
+        import face_service
+        return jsonify({'success': True, **face_service.get_inference().stats()})
     except Exception as e:
-        print(f"[ERROR] Warmup failed: {str(e)}", flush=True)
         return jsonify({'success': False, 'message': str(e)}), 500
 
-# ✅ Startup warmup DISABLED for Render Free Tier to avoid OOM
-# DeepFace will load the model on the first request.
-# Initial requests might be slower, but this prevents startup crashes.
+# Models load in a background thread once the worker has booted (MODEL_WARMUP=lazy defers them
+# to the first recognition request on hosts without memory for a model per worker)
+if MODEL_WARMUP == 'background':
+    models.start()
+
+# ATTENDANCE_WRITE_MODE=write-behind: marks are journaled locally and flushed to the database in the
+# background; start the flusher now so marks journaled before a restart are replayed right away
+if period_db.WRITE_BEHIND:
+    period_db.start_write_behind()
+
+# Load today's marks in the background, so repeat recognitions are answered without the database
+period_db.warm_marked_index()
 
 # Database configuration
 # Removed Flask-SQLAlchemy config
@@ -140,110 +206,7 @@ def warmup():
 def get_db_session():
     return next(get_db())
 
-# ===== Face Recognition Helper Functions (DeepFace) =====
-
-def load_all_face_encodings(db=None):
-    """Load all face encodings from the database."""
-    encodings = {}
-    should_close = False
-    if db is None:
-        db = get_db_session()
-        should_close = True
-        
-    try:
-        records = db.query(FaceEncoding).all()
-        for record in records:
-            try:
-                # Convert JSON back to NumPy
-                enc = np.array(json.loads(record.encoding_data)) 
-                encodings[record.person_id] = enc 
-            except Exception as e:
-                print(f"Error loading encoding for {record.person_id}: {e}")
-    except Exception as e:
-        print(f"Error accessing FaceEncoding DB: {e}")
-    finally:
-        if should_close:
-            db.close()
-    
-    return encodings
-
-def get_face_encodings_from_image(image):
-    """
-    Extract face encodings from an image using DeepFace.
-    Returns a list of encodings (one per detected face).
-    """
-    try:
-        # DeepFace expects RGB (or BGR if specified, but safely convert to RGB)
-        # cv2 reads as BGR, DeepFace handles it but being explicit is good
-        # DeepFace.represent returns a list of dicts: [{'embedding': [...], 'facial_area': ...}]
-        
-        # We pass BGR image directly since we have it via opencv
-        # enforce_detection=False allows returning embedding even if face detection is weak (useful for alignment issues)
-        # but for accuracy, we want detection. Let's try True first, fall back to False if needed or handle exception.
-        
-        print(f"[DEBUG] Starting DeepFace.represent with image shape: {image.shape}", flush=True)
-        
-        results = DeepFace.represent(
-            img_path=image,
-            model_name=MODEL_NAME,
-            enforce_detection=True,
-            detector_backend='opencv' # opencv is much lighter/faster than ssd, better for low-mem environments
-        )
-        
-        print(f"[DEBUG] DeepFace.represent completed successfully", flush=True)
-        encodings = [np.array(res['embedding']) for res in results]
-        return encodings
-        
-    except ValueError as ve:
-        # No face detected
-        print(f"[DEBUG] No face detected: {str(ve)}", flush=True)
-        return []
-    except Exception as e:
-        print(f"[ERROR] DeepFace encoding error: {str(e)}", flush=True)
-        import traceback
-        traceback.print_exc()
-        return []
-
-def find_cosine_distance(source_representation, test_representation):
-    """
-    Calculate cosine distance between two vectors.
-    """
-    a = np.matmul(np.transpose(source_representation), test_representation)
-    b = np.sum(np.multiply(source_representation, source_representation))
-    c = np.sum(np.multiply(test_representation, test_representation))
-    return 1 - (a / (np.sqrt(b) * np.sqrt(c)))
-
-def find_matching_face(encoding, known_encodings, threshold=FACE_RECOGNITION_THRESHOLD):
-    """
-    Find the best matching face in the database using Cosine Distance.
-    Returns (person_id, confidence_percent)
-    """
-    if not known_encodings:
-        return None, 0
-    
-    min_distance = float('inf')
-    best_match_id = None
-    
-    for person_id, db_encoding in known_encodings.items():
-        pass
-        # Vector size check
-        if len(encoding) != len(db_encoding):
-            continue
-            
-        distance = find_cosine_distance(encoding, db_encoding)
-        
-        if distance < min_distance:
-            min_distance = distance
-            best_match_id = person_id
-            
-    # Convert distance to confidence (approximate mapping)
-    # distance 0 -> 100%, distance threshold -> 60% approx
-    confidence = max(0, (1 - min_distance) * 100)
-    
-    if min_distance <= threshold:
-        return best_match_id, confidence
-    
-    return None, confidence
+# ===== Face Recognition Helper Functions =====
 
 def parse_person_id(person_id):
     """
@@ -260,6 +223,33 @@ def parse_person_id(person_id):
         # Fallback: use person_id as name
         return person_id, 'Unknown'
 
+def describe_face(person_id, confidence):
+    """Response entry for one detected face (attendance fields are added once it is marked)."""
+    if person_id:
+        name, roll_number = parse_person_id(person_id)
+        return {
+            'name': name,
+            'rollNumber': roll_number,
+            'spoofed': False,
+            'emotion': 'Neutral',
+            'recognitionConfidence': float(round(confidence, 1)),
+            'livenessConfidence': 88.0,
+            'isLive': True
+        }
+    # Unknown face
+    return {
+        'name': 'Unknown',
+        'rollNumber': 'N/A',
+        'spoofed': False,
+        'emotion': 'Neutral',
+        'recognitionConfidence': round(confidence, 1),
+        'livenessConfidence': 88.0,
+        'isLive': True,
+        'attendanceMarked': False,
+        'attendanceAlreadyMarked': False,
+        'attendanceQueued': False
+    }
+
 # ===== End Face Recognition Helper Functions =====
 
 
@@ -324,9 +314,10 @@ def get_student_attendance(student_id):
         })
         
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Student attendance lookup failed")
         return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        db.close()
 
 @app.route('/api/student/<student_id>/calendar', methods=['GET', 'OPTIONS'])
 def get_student_calendar(student_id):
@@ -355,6 +346,8 @@ def get_student_calendar(student_id):
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        db.close()
 
 @app.route('/api/student/<student_id>/analytics', methods=['GET', 'OPTIONS'])
 def get_student_analytics(student_id):
@@ -415,15 +408,46 @@ def get_student_analytics(student_id):
         })
         
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Student analytics failed")
         return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        db.close()
+
+NOTIFICATIONS_PAGE_SIZE = 50
+NOTIFICATIONS_MAX_PAGE_SIZE = 200
+
+def unread_notification_count(db):
+    # Counted from the partial index on unread rows (see models.Notification)
+    return db.query(func.count(Notification.id)).filter(Notification.read == 0).scalar()
 
 @app.route('/api/notifications', methods=['GET', 'OPTIONS'])
 def get_notifications():
+    """
+    Newest notifications first, a page at a time. Pass the previous page's
+    nextBefore as ?before=<timestamp>,<id> for the next (older) page.
+    """
     db = get_db_session()
     try:
-        notifications = db.query(Notification).order_by(desc(Notification.timestamp)).limit(50).all()
+        limit = request.args.get('limit', NOTIFICATIONS_PAGE_SIZE, type=int)
+        if limit < 1:
+            return jsonify({'success': False, 'error': 'limit must be at least 1'}), 400
+        limit = min(limit, NOTIFICATIONS_MAX_PAGE_SIZE)
+        query = db.query(Notification)
+        before = request.args.get('before')
+        if before:
+            try:
+                before_time, before_id = before.rsplit(',', 1)
+                cursor = (datetime.fromisoformat(before_time), int(before_id))
+            except ValueError:
+                return jsonify({'success': False, 'error': 'before must be <ISO timestamp>,<id>'}), 400
+            # Keyset pagination: an index range scan on (timestamp, id), however deep the page
+            query = query.filter(tuple_(Notification.timestamp, Notification.id) < cursor)
+        notifications = query.order_by(desc(Notification.timestamp), desc(Notification.id)).limit(limit).all()
+        
+        next_before = None
+        if len(notifications) == limit:
+            last = notifications[-1]
+            next_before = f"{last.timestamp.isoformat()},{last.id}"
         
         return jsonify({
             'success': True,
@@ -434,11 +458,24 @@ def get_notifications():
                 'message': n.message,
                 'timestamp': n.timestamp,
                 'read': n.read
-            } for n in notifications]
+            } for n in notifications],
+            'nextBefore': next_before,
+            'unreadCount': unread_notification_count(db)
         })
         
     except Exception as e:
-        print(f"[ERROR] Error fetching notifications: {str(e)}", flush=True)
+        logger.error("Error fetching notifications: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        db.close()
+
+@app.route('/api/notifications/unread-count', methods=['GET', 'OPTIONS'])
+def get_unread_notification_count():
+    db = get_db_session()
+    try:
+        return jsonify({'success': True, 'unreadCount': unread_notification_count(db)})
+    except Exception as e:
+        logger.error("Error counting unread notifications: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
     finally:
         db.close()
@@ -457,64 +494,68 @@ def mark_notification_read(notification_id):
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        db.close()
 
 @app.route('/api/recognize', methods=['POST', 'OPTIONS'])
 def recognize_face():
     
     try:
-        data = request.get_json()
-        if not data or 'image' not in data:
-            return jsonify({'success': False, 'message': 'No image provided'}), 400
+        # Accepts raw image/jpeg, multipart/form-data or JSON with a base64 'image'
+        try:
+            image_data, data = read_upload(request)
+        except UploadTooLarge as e:
+            RECOGNITION_ERRORS.inc(endpoint='recognize', stage='upload')
+            return jsonify({'success': False, 'message': str(e)}), 413
+        except ValueError as e:
+            RECOGNITION_ERRORS.inc(endpoint='recognize', stage='upload')
+            return jsonify({'success': False, 'message': str(e)}), 400
         
         period = data.get('period', '')
         raw_date = data.get('date', datetime.now().strftime('%Y-%m-%d'))
         date = normalize_date(raw_date)
+        # Optional class/section: that roster is searched before the whole school
+        class_name = data.get('className', '')
+        section = data.get('section', '')
         
-        # Decode base64 image
+        import face_service
         try:
-            print(f"[DEBUG] Decoding image... size: {len(data['image'])} bytes", flush=True)
-            image_data = base64.b64decode(data['image'])
-            nparr = np.frombuffer(image_data, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            if image is None:
-                print("[ERROR] Failed to decode image", flush=True)
-                return jsonify({'success': False, 'message': 'Failed to decode image'}), 400
-            
+            logger.debug("Decoding image... size: %d bytes", len(image_data))
             # Downscale image AGGRESSIVELY for Render's 512MB RAM limit
             # 800px is enough for face detection while saving significant memory
-            max_dim = 800  # Reduced from 1280 for memory efficiency
-            h, w = image.shape[:2]
-            if max(h, w) > max_dim:
-                scale = max_dim / max(h, w)
-                new_w, new_h = int(w * scale), int(h * scale)
-                image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_AREA)
-                print(f"[DEBUG] Resized image from ({w}x{h}) to {image.shape} for memory efficiency", flush=True)
-            else:
-                print(f"[DEBUG] Image dimensions OK: {image.shape}", flush=True)
-                
-            print(f"[DEBUG] Image ready for processing", flush=True)
+            image = face_service.decode_image(image_data, max_dim=800)
+            del image_data
+            if image is None:
+                logger.warning("Failed to decode image")
+                RECOGNITION_ERRORS.inc(endpoint='recognize', stage='decode')
+                return jsonify({'success': False, 'message': 'Failed to decode image'}), 400
+            logger.debug("Image ready for processing: %s", image.shape)
         except Exception as e:
-            print(f"[ERROR] Image decode error: {str(e)}", flush=True)
+            logger.warning("Image decode error: %s", e)
+            RECOGNITION_ERRORS.inc(endpoint='recognize', stage='decode')
             return jsonify({'success': False, 'message': f'Image decode error: {str(e)}'}), 400
         
-        # Load known face encodings from database
+        try:
+            # Waits for the background warmup if it is still loading
+            models.ensure_ready()
+        except Exception as e:
+            RECOGNITION_ERRORS.inc(endpoint='recognize', stage='warmup')
+            return jsonify({'success': False, 'message': f'Recognition models failed to load: {str(e)}', 'detectedFaces': []}), 503
+        
         db = get_db_session()
         try:
-            print("[DEBUG] Loading all face encodings from DB...", flush=True)
-            known_encodings = load_all_face_encodings(db)
-            print(f"[DEBUG] Loaded {len(known_encodings)} encodings", flush=True)
+            inference = face_service.get_inference()
             
             # Get face encodings from the input image using DeepFace
-            print("[DEBUG] Calling DeepFace.represent...", flush=True)
-            print(f"[DEBUG] Current memory usage before DeepFace call", flush=True)
             
             try:
-                face_encodings = get_face_encodings_from_image(image)
-                print(f"[DEBUG] DeepFace.represent returned {len(face_encodings) if face_encodings else 0} faces", flush=True)
+                # Detection, alignment and embedding (in the sidecar, when there is one)
+                with REQUEST_STAGE_SECONDS.time(stage='detect_embed'):
+                    face_encodings = inference.embed(image)
+                logger.debug("Inference returned %d faces", len(face_encodings) if face_encodings else 0)
             except Exception as deepface_error:
-                print(f"[ERROR] DeepFace failed catastrophically: {str(deepface_error)}", flush=True)
-                import traceback
-                traceback.print_exc()
+                logger.exception("Face recognition service failed")
+                RECOGNITION_ERRORS.inc(endpoint='recognize', stage='detect_embed')
                 return jsonify({
                     'success': False,
                     'message': f'Face recognition service error: {str(deepface_error)}. This may be due to memory constraints on the server. Please try with a smaller image or contact support.',
@@ -523,6 +564,7 @@ def recognize_face():
             
             # Immediate GC to clear large activation tensors from detection
             gc.collect()
+            FACES_PER_REQUEST.observe(len(face_encodings) if face_encodings else 0, endpoint='recognize')
             
             if not face_encodings:
                 return jsonify({
@@ -531,57 +573,39 @@ def recognize_face():
                     'detectedFaces': []
                 })
             
-            print(f"[DEBUG] Detected {len(face_encodings)} faces in image", flush=True)
+            
+            # Score every face against the gallery at once; each student is assigned to at most one face
+            roster = get_roster(db, class_name, section) if class_name else None
+            with REQUEST_STAGE_SECONDS.time(stage='match'):
+                matches = inference.match_batch(face_encodings, FACE_RECOGNITION_THRESHOLD, db=db, roster=roster)
             detected_faces = []
+            recognized = []
             
-            for i, encoding in enumerate(face_encodings):
-                # Find matching face in database
-                person_id, confidence = find_matching_face(encoding, known_encodings)
-                
+            for i, (person_id, confidence) in enumerate(matches):
+                detected_face = describe_face(person_id, confidence)
                 if person_id:
-                    name, roll_number = parse_person_id(person_id)
-                    print(f"[DEBUG] Face {i+1} recognized as {name} ({roll_number}) with {confidence:.1f}% confidence", flush=True)
-                    detected_face = {
-                        'name': name,
-                        'rollNumber': roll_number,
-                        'spoofed': False,
-                        'emotion': 'Neutral',
-                        'recognitionConfidence': float(round(confidence, 1)),
-                        'livenessConfidence': 88.0,
-                        'isLive': True
-                    }
-                    
-                    # Try to mark attendance
-                    success, message = period_db.mark_period_attendance(
-                        student_id=roll_number,
-                        name=name,
-                        date_str=date,
-                        period=period,
-                        emotion=detected_face['emotion'],
-                        liveness_confidence=detected_face['livenessConfidence'],
-                        recognition_confidence=detected_face['recognitionConfidence'],
-                        is_live=True,
-                        db=db
-                    )
-                    
-                    detected_face['attendanceMarked'] = success
-                    detected_face['attendanceAlreadyMarked'] = not success and 'already marked' in message.lower()
+                    logger.debug("Face %d recognized as %s (%s) with %.1f%% confidence", i + 1, detected_face['name'], detected_face['rollNumber'], confidence)
+                    recognized.append(detected_face)
                 else:
-                    # Unknown face
-                    print(f"[DEBUG] Face {i+1} not recognized (Unknown)", flush=True)
-                    detected_face = {
-                        'name': 'Unknown',
-                        'rollNumber': 'N/A',
-                        'spoofed': False,
-                        'emotion': 'Neutral',
-                        'recognitionConfidence': round(confidence, 1),
-                        'livenessConfidence': 88.0,
-                        'isLive': True,
-                        'attendanceMarked': False,
-                        'attendanceAlreadyMarked': False
-                    }
+                    logger.debug("Face %d not recognized (Unknown)", i + 1)
                 
                 detected_faces.append(detected_face)
+            
+            # Mark attendance for everyone recognized in this photo: one duplicate check, one insert, one commit
+            with REQUEST_STAGE_SECONDS.time(stage='mark_attendance'):
+                outcomes = period_db.mark_period_attendance_bulk([{
+                    'student_id': f['rollNumber'],
+                    'name': f['name'],
+                    'emotion': f['emotion'],
+                    'liveness_confidence': f['livenessConfidence'],
+                    'recognition_confidence': f['recognitionConfidence'],
+                    'is_live': True
+                } for f in recognized], date_str=date, period=period, db=db)
+
+            for detected_face, (success, message) in zip(recognized, outcomes):
+                detected_face['attendanceMarked'] = success
+                detected_face['attendanceAlreadyMarked'] = not success and 'already marked' in message.lower()
+                detected_face['attendanceQueued'] = success and 'queued' in message.lower()
         finally:
             db.close()
         
@@ -593,13 +617,100 @@ def recognize_face():
             'detectedFaces': detected_faces
         })
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Recognition failed")
+        RECOGNITION_ERRORS.inc(endpoint='recognize', stage='unhandled')
         return jsonify({'success': False, 'message': str(e)}), 500
     finally:
         # Manual garbage collection to prevent OOM
         gc.collect()
 
+if Sock is not None:
+    sock = Sock(app)
+    app.config['SOCK_SERVER_OPTIONS'] = {'ping_interval': 25, 'max_message_size': MAX_UPLOAD_BYTES}
+
+    @sock.route('/api/recognize/stream')
+    def recognize_stream(ws):
+        """
+        Live camera recognition over a WebSocket.
+        Text messages set the session: {"period": "...", "date": "...", "className": "...", "section": "..."}.
+        Binary messages are JPEG frames; each gets one JSON reply shaped like /api/recognize,
+        with a trackId per face. Faces are tracked across frames and only embedded when needed.
+        """
+        settings = {'period': '', 'date': normalize_date(None)}
+        
+        def mark(person_id, confidence):
+            name, roll_number = parse_person_id(person_id)
+            db = get_db_session()
+            try:
+                with REQUEST_STAGE_SECONDS.time(stage='mark_attendance'):
+                    success, message = period_db.mark_period_attendance(
+                        student_id=roll_number,
+                        name=name,
+                        date_str=settings['date'],
+                        period=settings['period'],
+                        liveness_confidence=88.0,
+                        recognition_confidence=float(round(confidence, 1)),
+                        is_live=True,
+                        db=db
+                    )
+            finally:
+                db.close()
+            return {
+                'attendanceMarked': success,
+                'attendanceAlreadyMarked': not success and 'already marked' in message.lower(),
+                'attendanceQueued': success and 'queued' in message.lower()
+            }
+        
+        import face_service
+        try:
+            models.ensure_ready()
+        except Exception as e:
+            RECOGNITION_ERRORS.inc(endpoint='stream', stage='warmup')
+            ws.send(json.dumps({'success': False, 'message': f'Recognition models failed to load: {str(e)}'}))
+            return
+        session = RecognitionSession(face_service.get_inference(), FACE_RECOGNITION_THRESHOLD, mark, describe_face)
+        while True:
+            message = ws.receive()
+            if message is None:
+                break
+            if isinstance(message, str):
+                try:
+                    control = json.loads(message)
+                    if not isinstance(control, dict):
+                        raise ValueError("control message must be a JSON object")
+                    # Only the keys present change; a message with just a period keeps the session date
+                    if 'period' in control:
+                        settings['period'] = control['period']
+                    if 'date' in control:
+                        settings['date'] = normalize_date(control['date'])
+                    if 'className' in control:
+                        db = get_db_session()
+                        try:
+                            session.roster = get_roster(db, control['className'], control.get('section')) or None
+                        finally:
+                            db.close()
+                    ws.send(json.dumps({'success': True, 'message': 'Session updated'}))
+                except (ValueError, TypeError):
+                    ws.send(json.dumps({'success': False, 'message': 'Invalid control message'}))
+                continue
+            
+            image = face_service.decode_image(message, max_dim=800)
+            if image is None:
+                RECOGNITION_ERRORS.inc(endpoint='stream', stage='decode')
+                ws.send(json.dumps({'success': False, 'message': 'Failed to decode image'}))
+                continue
+            try:
+                with REQUEST_STAGE_SECONDS.time(stage='stream_frame'):
+                    result = session.process_frame(image)
+                FACES_PER_REQUEST.observe(len(result['detectedFaces']), endpoint='stream')
+            except Exception as e:
+                logger.exception("Stream frame failed")
+                RECOGNITION_ERRORS.inc(endpoint='stream', stage='process_frame')
+                result = {'success': False, 'message': str(e), 'detectedFaces': []}
+            ws.send(json.dumps(result))
+        
+        logger.info("Stream closed: embedded %d of %d faces seen", session.embedded_faces, session.seen_faces)
+
 @app.route('/api/mark-attendance', methods=['POST', 'OPTIONS'])
 def mark_attendance_endpoint():
     
@@ -694,6 +805,8 @@ def get_teacher_stats():
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        db.close()
 
 @app.route('/api/login', methods=['POST', 'OPTIONS'])
 def login():
@@ -818,6 +931,8 @@ def enroll_face():
     try:
         student_name = request.form.get('studentName')
         student_id = request.form.get('studentId')
+        class_name = request.form.get('className')
+        section = request.form.get('section')
         images = request.files.getlist('images')
         
         if not student_name or not student_id:
@@ -826,36 +941,32 @@ def enroll_face():
         if len(images) < 1: # Relaxed requirement for testing
             return jsonify({'success': False, 'message': 'At least 1 image required'}), 400
         
-        # Extract real face encodings from uploaded images using DeepFace
-        all_encodings = []
+        # Read every upload first (size-checked), then decode them in parallel
+        uploads = []
         for i, image_file in enumerate(images):
-            # Read image data
-            image_bytes = image_file.read()
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            if image is None:
-                continue
-            
-            # Downscale for efficiency
-            max_dim = 640
-            h, w = image.shape[:2]
-            if max(h, w) > max_dim:
-                scale = max_dim / max(h, w)
-                image = cv2.resize(image, (int(w*scale), int(h*scale)), interpolation=cv2.INTER_AREA)
-            
-            # Get face encoding from image
-            print(f"[DEBUG] Enrolling: Processing image {i+1}...", flush=True)
-            encodings = get_face_encodings_from_image(image)
-            if encodings:
-                all_encodings.append(encodings[0])  # Take first face
+            image_bytes = image_file.read(MAX_UPLOAD_BYTES + 1)
+            if len(image_bytes) > MAX_UPLOAD_BYTES:
+                return jsonify({'success': False, 'message': f'Image {i+1} exceeds {MAX_UPLOAD_BYTES} bytes'}), 413
+            uploads.append(image_bytes)
+        
+        import face_service
+        with ThreadPoolExecutor(max_workers=max(1, min(face_service.ENROLL_WORKERS, len(uploads)))) as pool:
+            decoded = list(pool.map(lambda buf: face_service.decode_image(buf, max_dim=640), uploads))
+        decoded = [image for image in decoded if image is not None]
+        
+        # Detect/align in parallel and embed the first face of every photo in one batch
+        models.ensure_ready()
+        inference = face_service.get_inference()
+        logger.debug("Enrolling: processing %d images", len(decoded))
+        with REQUEST_STAGE_SECONDS.time(stage='enroll_embed'):
+            all_encodings = [encoding for encoding in inference.embed_many(decoded) if encoding is not None]
+        FACES_PER_REQUEST.observe(len(all_encodings), endpoint='enroll')
         
         if not all_encodings:
             return jsonify({'success': False, 'message': 'No faces detected in any of the uploaded images. Please ensure your face is clearly visible.'}), 400
         
-        # Calculate average encoding for more robust matching
-        avg_encoding = np.mean(all_encodings, axis=0)
-        face_encoding = avg_encoding.tolist()
+        # Store the centroid plus each photo's embedding as templates; matching uses the best one
+        templates, face_encoding = face_service.enrollment_templates(all_encodings)
         
         # Format person_id as "ID-{student_id} - {student_name}"
         # Format person_id as "ID-{student_id} - {student_name}"
@@ -864,29 +975,39 @@ def enroll_face():
         
         # Save to postgres via SQLAlchemy
         db = get_db_session()
-        # Check if exists
-        existing_face = db.query(FaceEncoding).filter(FaceEncoding.person_id == person_id).first()
-        
-        if existing_face:
-            existing_face.encoding_data = json.dumps(face_encoding)
-            existing_face.num_images = len(all_encodings)
-            db.commit()
-        else:
-            new_face = FaceEncoding(
-                person_id=person_id,
-                encoding_data=json.dumps(face_encoding),
-                num_images=len(all_encodings)
-            )
-            db.add(new_face)
-            db.commit()
+        try:
+            # Keep the class roster in sync with enrollment
+            upsert_student(db, student_id, student_name, class_name, section)
+            
+            # Check if exists
+            existing_face = db.query(FaceEncoding).filter(FaceEncoding.person_id == person_id).first()
+            
+            if existing_face:
+                existing_face.embedding = face_encoding
+                existing_face.encoding_data = None
+                existing_face.num_images = len(all_encodings)
+                db.commit()
+            else:
+                new_face = FaceEncoding(
+                    person_id=person_id,
+                    embedding=face_encoding,
+                    num_images=len(all_encodings)
+                )
+                db.add(new_face)
+                db.commit()
+            
+            # Patch the resident gallery so the new face is matchable immediately
+            inference.upsert(person_id, templates, db=db)
+        finally:
+            db.close()
         
         return jsonify({
             'success': True,
-            'message': f'Successfully enrolled {student_name} (ID: {student_id}) with {len(all_encodings)} face encodings (Model: {MODEL_NAME})'
+            'message': f'Successfully enrolled {student_name} (ID: {student_id}) with {len(all_encodings)} face encodings (Model: {inference.model_name})'
         })
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Enrollment failed")
+        RECOGNITION_ERRORS.inc(endpoint='enroll', stage='unhandled')
         return jsonify({'success': False, 'message': f'Enrollment failed: {str(e)}'}), 500
     finally:
         # Manual garbage collection to prevent OOM
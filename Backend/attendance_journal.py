@@ -0,0 +1,323 @@
+"""
+Write-behind journal for attendance marks.
+
+With ATTENDANCE_WRITE_MODE=write-behind, a mark is committed to a local
+SQLite file (WAL, fsync on commit) and acknowledged at once, so a slow or
+cold-starting Neon never holds up /api/recognize. A background flusher
+drains the journal to the database in batches and retries with backoff
+until it succeeds; marks survive a crash or restart and are replayed on
+the next boot.
+
+Each mark carries an idempotency key (student_id|date|period). The journal
+accepts a key once, and the database insert is ON CONFLICT DO NOTHING, so a
+batch that is replayed after a crash between the database commit and the
+journal update writes nothing twice. Flushed marks stay in the journal for
+ATTENDANCE_JOURNAL_RETENTION_HOURS, so repeats are answered locally as
+"already marked". Gunicorn workers on one host share the file, and a file
+lock lets one of them flush at a time.
+
+Some failures can't be fixed by retrying the whole batch, for example a
+payload the database rejects. When a batch fails that way, its marks are
+retried one at a time, so the rest still reach the database. A mark that
+keeps failing on its own is dead-lettered after ATTENDANCE_FLUSH_MAX_ATTEMPTS
+attempts (dead_at is set and the error logged). It stays in the journal for
+inspection and is counted in praesentix_attendance_journal_dead_letters.
+Connection errors never dead-letter a mark; they only back off.
+
+    ATTENDANCE_WRITE_MODE=sync|write-behind
+    ATTENDANCE_JOURNAL_PATH=attendance_journal.db   (next to app.py)
+    ATTENDANCE_FLUSH_BATCH=500
+    ATTENDANCE_FLUSH_INTERVAL_SECONDS=1.0
+    ATTENDANCE_FLUSH_MAX_BACKOFF_SECONDS=60
+    ATTENDANCE_JOURNAL_RETENTION_HOURS=36
+    ATTENDANCE_FLUSH_MAX_ATTEMPTS=5
+"""
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, so every worker flushes (still idempotent)
+    fcntl = None
+
+from metrics import (ATTENDANCE_JOURNAL_BACKLOG, ATTENDANCE_JOURNAL_OLDEST_SECONDS,
+                     ATTENDANCE_JOURNAL_FLUSHES, ATTENDANCE_JOURNAL_FLUSHED, ATTENDANCE_JOURNAL_DEAD_LETTERS)
+
+ATTENDANCE_WRITE_MODE = os.environ.get('ATTENDANCE_WRITE_MODE', 'sync').lower()
+ATTENDANCE_JOURNAL_PATH = os.environ.get(
+    'ATTENDANCE_JOURNAL_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'attendance_journal.db'))
+ATTENDANCE_FLUSH_BATCH = int(os.environ.get('ATTENDANCE_FLUSH_BATCH', '500'))
+ATTENDANCE_FLUSH_INTERVAL_SECONDS = float(os.environ.get('ATTENDANCE_FLUSH_INTERVAL_SECONDS', '1.0'))
+ATTENDANCE_FLUSH_MAX_BACKOFF_SECONDS = float(os.environ.get('ATTENDANCE_FLUSH_MAX_BACKOFF_SECONDS', '60'))
+ATTENDANCE_JOURNAL_RETENTION_HOURS = float(os.environ.get('ATTENDANCE_JOURNAL_RETENTION_HOURS', '36'))
+ATTENDANCE_FLUSH_MAX_ATTEMPTS = int(os.environ.get('ATTENDANCE_FLUSH_MAX_ATTEMPTS', '5'))
+
+WRITE_BEHIND = ATTENDANCE_WRITE_MODE == 'write-behind'
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS marks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    flushed_at REAL,
+    dead_at REAL
+);
+CREATE INDEX IF NOT EXISTS ix_marks_pending ON marks (flushed_at, id);
+"""
+
+
+def idempotency_key(student_id, date_str, period):
+    return f"{student_id}|{date_str}|{period}"
+
+
+class AttendanceJournal:
+    """
+    Durable local queue of marks in front of the database.
+
+    flush(payloads) writes a batch of journaled payloads to the database and
+    raises if it could not; it must be idempotent. rejected(exc) tells whether
+    a flush error is about the marks themselves (retrying the same batch won't
+    help) rather than the database being unreachable.
+    """
+
+    def __init__(self, path, flush, rejected=None, batch_size=ATTENDANCE_FLUSH_BATCH,
+                 interval=ATTENDANCE_FLUSH_INTERVAL_SECONDS, max_backoff=ATTENDANCE_FLUSH_MAX_BACKOFF_SECONDS,
+                 retention_hours=ATTENDANCE_JOURNAL_RETENTION_HOURS, max_attempts=ATTENDANCE_FLUSH_MAX_ATTEMPTS):
+        self.path = path
+        self._flush = flush
+        self._rejected = rejected or (lambda exc: False)
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.retention_seconds = retention_hours * 3600
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+        self._conn.executescript(_SCHEMA)
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(marks)')}
+        if 'dead_at' not in columns:  # journals created before dead-lettering
+            self._conn.execute('ALTER TABLE marks ADD COLUMN dead_at REAL')
+        self._stopping = threading.Event()
+        self._thread = None
+        self._lock_file = None
+        self._failures = 0
+        self._last_prune = 0.0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        # fsync on every commit: an acknowledged mark survives a crash or power loss
+        conn.execute('PRAGMA synchronous=FULL')
+        return conn
+
+    def start(self):
+        """Start the background flusher (which first replays anything left from before a restart)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='attendance-flusher', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def stop(self, timeout=5):
+        """Stop the flusher after one last flush attempt."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+
+    def append(self, entries):
+        """
+        Journal (key, payload) pairs in one transaction.
+        Returns one bool per entry: True if newly journaled, False if the key was already there.
+        """
+        results = []
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                now = time.time()
+                for key, payload in entries:
+                    cursor = self._conn.execute(
+                        'INSERT OR IGNORE INTO marks (idempotency_key, payload, created_at) VALUES (?, ?, ?)',
+                        (key, json.dumps(payload), now))
+                    results.append(cursor.rowcount == 1)
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        ATTENDANCE_JOURNAL_BACKLOG.inc(sum(results))
+        return results
+
+    def backlog(self):
+        """(pending marks, age in seconds of the oldest one); dead-lettered marks aren't pending."""
+        with self._lock:
+            count, oldest = self._conn.execute(
+                'SELECT COUNT(*), MIN(created_at) FROM marks WHERE flushed_at IS NULL AND dead_at IS NULL').fetchone()
+        return count, (time.time() - oldest if oldest is not None else 0.0)
+
+    def dead_letters(self):
+        """(id, payload, attempts, last_error) of every dead-lettered mark."""
+        with self._lock:
+            return [(row_id, json.loads(payload), attempts, last_error) for row_id, payload, attempts, last_error
+                    in self._conn.execute('SELECT id, payload, attempts, last_error FROM marks '
+                                          'WHERE dead_at IS NOT NULL ORDER BY id')]
+
+    def _update_backlog_metrics(self):
+        count, oldest_age = self.backlog()
+        ATTENDANCE_JOURNAL_BACKLOG.set(count)
+        ATTENDANCE_JOURNAL_OLDEST_SECONDS.set(round(oldest_age, 3))
+        with self._lock:
+            dead = self._conn.execute('SELECT COUNT(*) FROM marks WHERE dead_at IS NOT NULL').fetchone()[0]
+        ATTENDANCE_JOURNAL_DEAD_LETTERS.set(dead)
+        return count
+
+    def _acquire_flush_lock(self):
+        if fcntl is None:
+            return True
+        if self._lock_file is None:
+            self._lock_file = open(self.path + '.flush-lock', 'a')
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False  # another worker on this host is flushing
+
+    def _release_flush_lock(self):
+        if fcntl is not None and self._lock_file is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _mark_flushed(self, ids):
+        placeholders = ','.join('?' * len(ids))
+        with self._lock:
+            self._conn.execute(f'UPDATE marks SET flushed_at = ? WHERE id IN ({placeholders})', [time.time()] + ids)
+
+    def _mark_failed(self, ids, error):
+        placeholders = ','.join('?' * len(ids))
+        with self._lock:
+            self._conn.execute(
+                f'UPDATE marks SET attempts = attempts + 1, last_error = ? WHERE id IN ({placeholders})',
+                [str(error)[:500]] + ids)
+
+    def _flush_batch(self, rows):
+        """Write one batch; raises what flush() raised."""
+        self._flush([json.loads(payload) for _, payload, _ in rows])
+        ids = [row_id for row_id, _, _ in rows]
+        ATTENDANCE_JOURNAL_FLUSHES.inc(result='ok')
+        ATTENDANCE_JOURNAL_FLUSHED.inc(len(rows))
+        self._mark_flushed(ids)
+
+    def _flush_one_by_one(self, rows):
+        """
+        After a batch was rejected: write its marks one at a time so the good ones
+        get through, and dead-letter marks rejected max_attempts times.
+        Returns False if the database became unreachable meanwhile.
+        """
+        for position, (row_id, payload, attempts) in enumerate(rows):
+            try:
+                self._flush_batch([(row_id, payload, attempts)])
+                continue
+            except Exception as e:
+                error = e
+            ATTENDANCE_JOURNAL_FLUSHES.inc(result='error')
+            if not self._rejected(error):
+                self._mark_failed([row_id for row_id, _, _ in rows[position:]], error)
+                logger.warning("Attendance journal flush failed (will retry): %s", error)
+                return False
+            self._mark_failed([row_id], error)
+            if attempts + 1 < self.max_attempts:
+                logger.warning("Journaled attendance mark %d was rejected (attempt %d of %d): %s",
+                               row_id, attempts + 1, self.max_attempts, error)
+                continue
+            with self._lock:
+                self._conn.execute('UPDATE marks SET dead_at = ? WHERE id = ?', (time.time(), row_id))
+            logger.error("Journaled attendance mark %d was rejected %d times and is dead-lettered: %s (%s)",
+                         row_id, attempts + 1, payload, error)
+        return True
+
+    def flush_once(self):
+        """
+        Write pending marks to the database, batch by batch, until the journal is
+        drained or the database fails. Returns False if the database failed.
+        """
+        if not self._acquire_flush_lock():
+            return True
+        try:
+            # Walk forward by id, so marks that stay pending after a rejected batch aren't re-read in this pass
+            last_id = 0
+            while True:
+                with self._lock:
+                    rows = self._conn.execute(
+                        'SELECT id, payload, attempts FROM marks WHERE flushed_at IS NULL AND dead_at IS NULL '
+                        'AND id > ? ORDER BY id LIMIT ?', (last_id, self.batch_size)).fetchall()
+                if not rows:
+                    return True
+                last_id = rows[-1][0]
+                try:
+                    self._flush_batch(rows)
+                    logger.debug("Flushed %d journaled attendance marks", len(rows))
+                except Exception as e:
+                    ATTENDANCE_JOURNAL_FLUSHES.inc(result='error')
+                    if not self._rejected(e):
+                        logger.warning("Attendance journal flush of %d marks failed (will retry): %s", len(rows), e)
+                        self._mark_failed([row_id for row_id, _, _ in rows], e)
+                        return False
+                    logger.warning("Attendance journal batch of %d marks was rejected, retrying one by one: %s",
+                                   len(rows), e)
+                    if not self._flush_one_by_one(rows):
+                        return False
+                if len(rows) < self.batch_size:
+                    return True
+        finally:
+            self._release_flush_lock()
+            self._update_backlog_metrics()
+
+    def _prune(self):
+        """Forget flushed marks past the retention window, at most once a minute."""
+        now = time.time()
+        if now - self._last_prune < 60:
+            return
+        self._last_prune = now
+        with self._lock:
+            self._conn.execute('DELETE FROM marks WHERE flushed_at IS NOT NULL AND flushed_at < ?',
+                               (now - self.retention_seconds,))
+
+    def _run(self):
+        pending = self._update_backlog_metrics()
+        if pending:
+            logger.info("Attendance journal: replaying %d marks not yet written to the database", pending)
+        while True:
+            try:
+                ok = self.flush_once()
+                self._prune()
+            except Exception:
+                logger.exception("Attendance journal flusher error")
+                ok = False
+            if self._stopping.is_set():
+                return
+            self._failures = 0 if ok else self._failures + 1
+            # Marks arriving meanwhile go out together in the next batch; back off while the database fails
+            delay = self.interval if ok else min(self.interval * 2 ** self._failures, self.max_backoff)
+            self._stopping.wait(delay)
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def get_journal(flush, rejected=None):
+    """Process-wide journal with its flusher running; created on first use."""
+    global _journal
+    if _journal is None:
+        with _journal_lock:
+            if _journal is None:
+                journal = AttendanceJournal(ATTENDANCE_JOURNAL_PATH, flush, rejected)
+                journal.start()
+                _journal = journal
+    return _journal
@@ -0,0 +1,69 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Coalesces items submitted from many threads into batched calls.
+
+    A single worker thread waits for the first pending item, then keeps
+    collecting until `max_batch_size` items are queued or `max_wait_ms` has
+    passed, calls `process_batch(items)` once and hands each caller its own
+    result. `process_batch` must return one result per item, in order.
+    """
+
+    def __init__(self, process_batch, max_batch_size=16, max_wait_ms=10, name='micro-batcher'):
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, items):
+        """Queue items and block until all of their results are ready."""
+        futures = []
+        for item in items:
+            future = Future()
+            self._queue.put((item, future))
+            futures.append(future)
+        return [f.result() for f in futures]
+
+    @property
+    def mean_batch_size(self):
+        with self._stats_lock:
+            return self.items / self.batches if self.batches else 0.0
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+            try:
+                results = self.process_batch(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"Batch returned {len(results)} results for {len(items)} items")
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            with self._stats_lock:
+                self.batches += 1
+                self.items += len(items)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
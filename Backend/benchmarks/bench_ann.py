@@ -0,0 +1,83 @@
+"""
+Recall/latency of the IVF index against the exact gallery scan.
+
+Uses a synthetic gallery (random unit identities, queries = identity + noise),
+so it runs without a database or TensorFlow:
+    python benchmarks/bench_ann.py --size 100000 --nprobe 1 2 4 8 16 32
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ann_index import IVFIndex, default_nlist
+
+
+def unit(x):
+    return (x / np.linalg.norm(x, axis=-1, keepdims=True)).astype(np.float32)
+
+
+def make_gallery(size, dim, queries, noise, seed):
+    rng = np.random.default_rng(seed)
+    gallery = unit(rng.standard_normal((size, dim)))
+    targets = rng.integers(0, size, queries)
+    probes = unit(gallery[targets] + noise * rng.standard_normal((queries, dim)) / np.sqrt(dim))
+    return gallery, probes
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=128)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--noise', type=float, default=0.6, help="Query noise relative to a unit vector")
+    parser.add_argument('--nlist', type=int, default=None)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--k', type=int, default=10, help="Candidates re-ranked exactly")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    gallery, probes = make_gallery(args.size, args.dim, args.queries, args.noise, args.seed)
+    person_ids = [f"ID-{i}" for i in range(args.size)]
+
+    # Exact reference: the same matrix-vector product + argmax FaceGallery.match uses
+    exact_times = []
+    exact = np.empty(args.queries, dtype=np.int64)
+    for i, q in enumerate(probes):
+        start = time.perf_counter()
+        exact[i] = int(np.argmax(gallery @ q))
+        exact_times.append(time.perf_counter() - start)
+
+    nlist = args.nlist or default_nlist(args.size)
+    start = time.perf_counter()
+    index = IVFIndex.build(gallery, person_ids, nlist=nlist)
+    build_seconds = time.perf_counter() - start
+
+    print(f"gallery={args.size} dim={args.dim} queries={args.queries} nlist={nlist} build={build_seconds:.2f}s")
+    print(f"{'mode':<12}{'recall@1':>10}{'p50 ms':>10}{'p95 ms':>10}{'scanned':>10}")
+    print(f"{'exact':<12}{1.0:>10.3f}{percentile_ms(exact_times, 50):>10.3f}"
+          f"{percentile_ms(exact_times, 95):>10.3f}{args.size:>10}")
+
+    for nprobe in args.nprobe:
+        times = []
+        hits = 0
+        scanned = 0
+        for i, q in enumerate(probes):
+            start = time.perf_counter()
+            rows, _ = index.search(q, gallery, k=args.k, nprobe=nprobe)
+            times.append(time.perf_counter() - start)
+            hits += int(rows.size > 0 and rows[0] == exact[i])
+            scanned += index.candidates(q, nprobe).size
+        print(f"{'nprobe=' + str(nprobe):<12}{hits / args.queries:>10.3f}{percentile_ms(times, 50):>10.3f}"
+              f"{percentile_ms(times, 95):>10.3f}{scanned // args.queries:>10}")
+
+
+if __name__ == "__main__":
+    main()
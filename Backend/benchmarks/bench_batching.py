@@ -0,0 +1,96 @@
+"""
+Throughput vs latency of the Facenet micro-batcher under concurrent requests.
+
+Each client thread plays one classroom posting frames back to back. Every
+(max batch size, max wait) pair is compared with calling the model directly
+from each thread. The default stub model is a dense 160x160x3 -> 128
+projection with a fixed per-call overhead, so the benchmark runs without
+TensorFlow; pass --model facenet to measure the real network:
+    python benchmarks/bench_batching.py --clients 16 --batch 1 8 16 32 --wait 0 5 10 20
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from batching import MicroBatcher
+
+INPUT_SHAPE = (160, 160, 3)
+
+
+def stub_model(call_overhead_ms, seed=0):
+    rng = np.random.default_rng(seed)
+    weights = rng.standard_normal((int(np.prod(INPUT_SHAPE)), 128)).astype(np.float32) / 100
+
+    def embed(crops):
+        time.sleep(call_overhead_ms / 1000.0)  # framework dispatch cost paid once per forward pass
+        batch = np.concatenate(crops, axis=0).reshape(len(crops), -1)
+        return list(batch @ weights)
+    return embed
+
+
+def facenet_model():
+    import recognition
+    recognition.warm_up()
+    return recognition.get_pipeline().embedder.embed
+
+
+def run(embed, clients, requests, faces, batcher=None):
+    crop = np.random.default_rng(1).random((1,) + INPUT_SHAPE, dtype=np.float32)
+    latencies = []
+    lock = threading.Lock()
+
+    def client():
+        local = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            crops = [crop] * faces
+            batcher.submit(crops) if batcher else embed(crops)
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    total_faces = clients * requests * faces
+    return total_faces / elapsed, np.percentile(latencies, 50) * 1000, np.percentile(latencies, 95) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', choices=['stub', 'facenet'], default='stub')
+    parser.add_argument('--call-overhead-ms', type=float, default=2.0, help="Stub model per-call overhead")
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=30, help="Requests per client")
+    parser.add_argument('--faces', type=int, default=1, help="Faces per request")
+    parser.add_argument('--batch', type=int, nargs='+', default=[4, 8, 16, 32])
+    parser.add_argument('--wait', type=float, nargs='+', default=[0, 5, 10, 20], help="Max wait in ms")
+    args = parser.parse_args()
+
+    embed = facenet_model() if args.model == 'facenet' else stub_model(args.call_overhead_ms)
+    embed([np.zeros((1,) + INPUT_SHAPE, dtype=np.float32)])
+
+    print(f"model={args.model} clients={args.clients} requests/client={args.requests} faces/request={args.faces}")
+    print(f"{'mode':<22}{'faces/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'mean batch':>12}")
+    throughput, p50, p95 = run(embed, args.clients, args.requests, args.faces)
+    print(f"{'direct':<22}{throughput:>10.1f}{p50:>10.2f}{p95:>10.2f}{1.0:>12.2f}")
+
+    for max_batch in args.batch:
+        for max_wait in args.wait:
+            batcher = MicroBatcher(embed, max_batch, max_wait)
+            throughput, p50, p95 = run(embed, args.clients, args.requests, args.faces, batcher)
+            label = f"batch={max_batch} wait={max_wait:g}ms"
+            print(f"{label:<22}{throughput:>10.1f}{p50:>10.2f}{p95:>10.2f}{batcher.mean_batch_size:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
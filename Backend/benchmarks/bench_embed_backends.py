@@ -0,0 +1,92 @@
+"""
+Startup time, memory and latency of each embedding backend.
+
+Every backend is measured in a fresh subprocess, so import cost and RSS are
+not shared between them: time to import + load the weights, RSS after
+loading, and per-call latency at a few batch sizes:
+    FACENET_ONNX_PATH=facenet.onnx python benchmarks/bench_embed_backends.py --backends deepface onnx --batch 1 8
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def rss_mb():
+    """Current resident set size in MB (Linux /proc; falls back to peak RSS elsewhere)."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def measure(backend_name, batch_sizes, runs):
+    """Runs inside the subprocess; returns a dict of measurements."""
+    rss_start = rss_mb()
+    start = time.perf_counter()
+    sys.path.insert(0, BACKEND_DIR)
+    import numpy as np
+    from embedding_backends import EMBEDDERS
+
+    backend = EMBEDDERS[backend_name]()
+    backend.load()
+    h, w = backend.input_size
+    backend.embed([np.zeros((1, h, w, 3), dtype=np.float32)])  # first call builds kernels / graph
+    startup = time.perf_counter() - start
+    rss_loaded = rss_mb()
+
+    rng = np.random.default_rng(0)
+    latency = {}
+    for size in batch_sizes:
+        crops = [rng.random((1, h, w, 3), dtype=np.float32) for _ in range(size)]
+        times = []
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            backend.embed(crops)
+            times.append(time.perf_counter() - t0)
+        latency[size] = float(np.percentile(times, 50) * 1000)
+    return {'startup_s': startup, 'rss_mb': rss_loaded, 'rss_delta_mb': rss_loaded - rss_start, 'latency_ms': latency}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', nargs='+', default=['deepface', 'onnx'])
+    parser.add_argument('--batch', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--worker', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(measure(args.worker, args.batch, args.runs)))
+        return 0
+
+    header = f"{'backend':<10}{'startup s':>11}{'RSS MB':>10}{'+RSS MB':>10}"
+    header += ''.join(f"{'b=' + str(b) + ' ms':>11}" for b in args.batch)
+    print(header)
+    for name in args.backends:
+        cmd = [sys.executable, os.path.abspath(__file__), '--worker', name, '--runs', str(args.runs),
+               '--batch', *map(str, args.batch)]
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        if proc.returncode != 0:
+            error = (proc.stderr.strip().splitlines() or ['failed'])[-1]
+            print(f"{name:<10} ❌ {error}")
+            continue
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        row = f"{name:<10}{result['startup_s']:>11.2f}{result['rss_mb']:>10.0f}{result['rss_delta_mb']:>10.0f}"
+        row += ''.join(f"{result['latency_ms'][str(b)]:>11.2f}" for b in args.batch)
+        print(row)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""
+Per-request logging overhead: flushed print() vs the queue-based logger.
+
+Each mode runs in a fresh process whose stdout is a pipe drained by this
+script (like a container log driver). Worker threads simulate requests that
+each produce the ~15 lines the recognize path used to print:
+    print          15 x print(f"[DEBUG] ...", flush=True) -- before
+    queue-info     14 DEBUG lines (filtered) + 1 INFO access line, LOG_LEVEL=INFO -- production default
+    queue-sampled  as queue-info with LOG_REQUEST_SAMPLE_RATE=0.1
+    queue-debug    LOG_LEVEL=DEBUG: all 15 lines queued and written (troubleshooting)
+    python benchmarks/bench_logging.py --threads 8 --requests 2000 [--reader-delay-ms 1]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LINES_PER_REQUEST = 15
+MODES = {
+    'print': {},
+    'queue-info': {'LOG_LEVEL': 'INFO', 'LOG_REQUEST_SAMPLE_RATE': '1.0'},
+    'queue-sampled': {'LOG_LEVEL': 'INFO', 'LOG_REQUEST_SAMPLE_RATE': '0.1'},
+    'queue-debug': {'LOG_LEVEL': 'DEBUG', 'LOG_REQUEST_SAMPLE_RATE': '1.0'},
+}
+HEADERS = {'Origin': 'http://localhost:5173', 'Content-Type': 'image/jpeg', 'Referer': 'http://localhost:5173/teacher'}
+
+
+def print_request(i):
+    print(f"[DEBUG] Request: POST /api/recognize", flush=True)
+    print(f"[DEBUG] Headers: {HEADERS}", flush=True)
+    for face in range(LINES_PER_REQUEST - 3):
+        print(f"[DEBUG] Face {face + 1} recognized as Student {i} (ID-{i}) with {87.5:.1f}% confidence", flush=True)
+    print(f"[DEBUG] Successfully marked attendance and created notification for {i}", flush=True)
+
+
+def logging_request(logger, start_request_logging, i):
+    import logging
+    start_request_logging()
+    logger.debug("Request: %s %s", 'POST', '/api/recognize')
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Headers: %s", dict(HEADERS))
+    for face in range(LINES_PER_REQUEST - 3):
+        logger.debug("Face %d recognized as %s (%s) with %.1f%% confidence", face + 1, f"Student {i}", f"ID-{i}", 87.5)
+    logger.info("%s %s %d %.1fms", 'POST', '/api/recognize', 200, 42.0)
+
+
+def run_worker(mode, threads, requests):
+    """Inside the subprocess: time every simulated request; stats go to stderr as JSON."""
+    dropped = lambda: 0
+    if mode == 'print':
+        handle = print_request
+    else:
+        sys.path.insert(0, BACKEND_DIR)
+        import logging
+        from logging_config import configure_logging, start_request_logging
+        from metrics import LOG_RECORDS_DROPPED
+        configure_logging()
+        logger = logging.getLogger('app')
+        handle = lambda i: logging_request(logger, start_request_logging, i)
+        dropped = LOG_RECORDS_DROPPED.value
+
+    durations = []
+    lock = threading.Lock()
+
+    def worker(offset):
+        local = []
+        for i in range(requests):
+            start = time.perf_counter()
+            handle(offset + i)
+            local.append(time.perf_counter() - start)
+        with lock:
+            durations.extend(local)
+
+    start = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(t * requests,)) for t in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    wall = time.perf_counter() - start
+    durations.sort()
+    stats = {
+        'mean_us': sum(durations) / len(durations) * 1e6,
+        'p99_us': durations[int(len(durations) * 0.99)] * 1e6,
+        'requests_per_s': len(durations) / wall,
+        'dropped': dropped(),
+    }
+    sys.stderr.write(json.dumps(stats) + '\n')
+
+
+def drain(stream, delay):
+    """Read the child's stdout like a log collector would, optionally a slow one."""
+    total = 0
+    while True:
+        chunk = stream.read(65536)
+        if not chunk:
+            return total
+        total += len(chunk)
+        if delay:
+            time.sleep(delay)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=2000, help="Requests per thread")
+    parser.add_argument('--reader-delay-ms', type=float, default=0.0, help="Pause between 64 KiB reads of the log pipe")
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=list(MODES))
+    parser.add_argument('--worker', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.threads, args.requests)
+        return 0
+
+    print(f"{args.threads} threads x {args.requests} requests, {LINES_PER_REQUEST} log lines each")
+    print(f"{'mode':<15}{'mean us/req':>13}{'p99 us/req':>13}{'req/s':>12}{'log MB':>9}{'dropped':>9}")
+    for mode in args.modes:
+        env = dict(os.environ, **MODES[mode])
+        cmd = [sys.executable, os.path.abspath(__file__), '--worker', mode,
+               '--threads', str(args.threads), '--requests', str(args.requests)]
+        proc = subprocess.Popen(cmd, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stderr = []
+        reader = threading.Thread(target=lambda: stderr.append(proc.stderr.read()))
+        reader.start()
+        written = drain(proc.stdout, args.reader_delay_ms / 1000)
+        proc.wait()
+        reader.join()
+        if proc.returncode != 0:
+            print(f"{mode:<15} ❌ {stderr[0].decode().strip().splitlines()[-1]}")
+            continue
+        stats = json.loads(stderr[0].decode().strip().splitlines()[-1])
+        print(f"{mode:<15}{stats['mean_us']:>13.1f}{stats['p99_us']:>13.1f}"
+              f"{stats['requests_per_s']:>12.0f}{written / 1e6:>9.1f}{stats['dropped']:>9}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""
+Memory and accuracy of the quantized gallery modes against float32.
+
+Builds a synthetic gallery (random unit identities with a few templates each,
+queries = a template + noise) in every FACE_GALLERY_DTYPE mode and reports
+resident gallery memory per 10k identities, top-1 agreement with the float32
+gallery and match latency. Runs without a database or TensorFlow:
+    python benchmarks/bench_quantized_gallery.py --identities 50000 --templates 4 --rerank-k 32
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from face_gallery import FaceGallery
+
+
+def make_gallery(identities, templates, dim, queries, noise, seed):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((identities, dim)).astype(np.float32)
+    items = []
+    for i in range(identities):
+        # Templates of one student are close to each other (different photos, same face)
+        items.append((f"ID-{i}", centers[i] + 0.3 * rng.standard_normal((templates, dim)).astype(np.float32)))
+    targets = rng.integers(0, identities, queries)
+    probes = [items[t][1][0] + noise * rng.standard_normal(dim).astype(np.float32) for t in targets]
+    return items, probes
+
+
+def run(gallery, probes, threshold):
+    times = []
+    results = []
+    for q in probes:
+        start = time.perf_counter()
+        results.append(gallery.match(q, threshold)[0])
+        times.append(time.perf_counter() - start)
+    return results, np.percentile(times, 50) * 1000, np.percentile(times, 95) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--identities', type=int, default=20000)
+    parser.add_argument('--templates', type=int, default=4, help="Templates per identity (centroid + photos)")
+    parser.add_argument('--dim', type=int, default=128)
+    parser.add_argument('--queries', type=int, default=300)
+    parser.add_argument('--noise', type=float, default=0.8, help="Query noise per dimension")
+    parser.add_argument('--threshold', type=float, default=0.4)
+    parser.add_argument('--rerank-k', type=int, default=32)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    items, probes = make_gallery(args.identities, args.templates, args.dim, args.queries, args.noise, args.seed)
+    per_10k = 10000 / args.identities
+
+    print(f"identities={args.identities} templates={args.templates} queries={args.queries} rerank_k={args.rerank_k}")
+    print(f"{'dtype':<10}{'MB/10k ids':>12}{'vs float32':>12}{'top-1 agree':>13}{'p50 ms':>10}{'p95 ms':>10}")
+    reference = None
+    reference_bytes = None
+    for dtype in ('float32', 'float16', 'int8'):
+        gallery = FaceGallery(use_ann=False, dtype=dtype, rerank_k=args.rerank_k)
+        gallery.load_templates(items)
+        results, p50, p95 = run(gallery, probes, args.threshold)
+        if reference is None:
+            reference, reference_bytes = results, gallery.nbytes
+        agreement = float(np.mean([a == b for a, b in zip(results, reference)]))
+        print(f"{dtype:<10}{gallery.nbytes * per_10k / 1e6:>12.2f}{gallery.nbytes / reference_bytes:>12.2f}"
+              f"{agreement:>13.3f}{p50:>10.3f}{p95:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
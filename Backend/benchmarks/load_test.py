@@ -0,0 +1,292 @@
+"""
+Offline end-to-end load test of the Flask app: no Neon, no TensorFlow.
+
+The app is booted against a throwaway SQLite database with a deterministic
+stub detector and embedder registered in face_pipeline's DETECTORS/EMBEDDERS,
+so decoding, the gallery, matching, rosters and attendance writes are the
+real code paths; only the network models are replaced. N synthetic students
+are seeded (each one a fixed colour pattern, enrolled through the pipeline),
+then each endpoint is driven in turn over HTTP at the given concurrency:
+
+    python benchmarks/load_test.py --students 200 --concurrency 8 --requests 400 --output load.json
+    python benchmarks/load_test.py --compare load.json      # same run, compared with a saved result
+
+Per endpoint: p50/p95/p99 latency, mean, requests/s and error count.
+Latencies of the stub models say nothing about Facenet; use
+bench_embed_backends.py for that.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TILE = 160
+# Faces per synthetic class photo; 5 tiles keep the photo under recognize's 800px downscale
+FACES_PER_PHOTO = 5
+PERIODS = [str(p) for p in range(1, 9)]
+CLASSES = ['8', '9', '10']
+DATE = '2024-01-15'
+
+
+def configure_environment(db_path):
+    """Point the app at SQLite and the stub models; must run before app is imported."""
+    os.environ['NEON_DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ['FACE_DETECTOR'] = 'stub'
+    os.environ['FACE_EMBED_BACKEND'] = 'stub'
+    os.environ['MODEL_WARMUP'] = 'lazy'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.pop('INFERENCE_SOCKET', None)
+    # ATTENDANCE_WRITE_MODE=write-behind runs can be compared too; keep their journal in the scratch dir
+    os.environ.setdefault('ATTENDANCE_JOURNAL_PATH', os.path.join(os.path.dirname(db_path), 'journal.db'))
+
+
+def register_stub_models():
+    import numpy as np
+    from embedding_backends import EmbeddingBackend
+    from face_pipeline import DETECTORS, EMBEDDERS, FaceRegion
+
+    class StubDetector:
+        """One face per TILE x TILE cell that isn't flat background."""
+
+        name = 'stub'
+
+        def detect(self, image):
+            regions = []
+            for y in range(0, image.shape[0] - TILE + 1, TILE):
+                for x in range(0, image.shape[1] - TILE + 1, TILE):
+                    if image[y:y + TILE, x:x + TILE].std() > 10:
+                        regions.append(FaceRegion(x, y, TILE, TILE, None, None, 1.0))
+            return regions
+
+    class StubEmbedder(EmbeddingBackend):
+        """Fixed random projection of a 16x16 thumbnail: same crop, same vector; robust to JPEG noise."""
+
+        name = 'stub'
+
+        def _load(self):
+            return np.random.default_rng(1234).standard_normal((16 * 16 * 3, self.dim)).astype(np.float32)
+
+        def _run(self, projection, batch):
+            n, h, w, c = batch.shape
+            thumbs = batch.reshape(n, 16, h // 16, 16, w // 16, c).mean(axis=(2, 4)).reshape(n, -1)
+            thumbs -= thumbs.mean(axis=1, keepdims=True)
+            return thumbs @ projection
+
+    DETECTORS[StubDetector.name] = StubDetector
+    EMBEDDERS[StubEmbedder.name] = StubEmbedder
+
+
+def student_tile(index):
+    """The synthetic 'face' of student `index`: an 8x8 grid of seeded colours."""
+    import numpy as np
+    blocks = np.random.default_rng(index).integers(0, 256, (8, 8, 3), dtype=np.uint8)
+    return np.kron(blocks, np.ones((TILE // 8, TILE // 8, 1), dtype=np.uint8))
+
+
+def class_photo(indices):
+    """JPEG bytes of the given students side by side on a flat background."""
+    import cv2
+    import numpy as np
+    photo = np.full((TILE, TILE * FACES_PER_PHOTO, 3), 127, dtype=np.uint8)
+    for slot, index in enumerate(indices):
+        photo[:, slot * TILE:(slot + 1) * TILE] = student_tile(index)
+    ok, buf = cv2.imencode('.jpg', photo, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return buf.tobytes()
+
+
+def student_id(index):
+    return f'S{index:05d}'
+
+
+def seed(students):
+    """Create the schema and enroll `students` synthetic students, teachers and an admin."""
+    from sqlalchemy import text
+    import neon_db
+    import recognition
+    from embedding_codec import encode_embedding
+    from models import Base, FaceEncoding, Student, User
+
+    with neon_db.engine.connect() as conn:
+        # Readers don't block the attendance writers
+        conn.execute(text('PRAGMA journal_mode=WAL'))
+    Base.metadata.create_all(neon_db.engine)
+
+    db = neon_db.SessionLocal()
+    try:
+        for index in range(students):
+            sid, name = student_id(index), f'Student {index}'
+            [embedding] = recognition.get_face_encodings_from_image(student_tile(index))
+            db.add(FaceEncoding(person_id=f'ID-{sid} - {name}', embedding=encode_embedding(embedding)))
+            db.add(Student(student_id=sid, name=name, class_name=CLASSES[index % len(CLASSES)], section='A'))
+            db.add(User(username=f'student{index}', password='x', role='student', full_name=name, student_id=sid))
+        for t in range(max(students // 30, 1)):
+            db.add(User(username=f'teacher{t}', password='x', role='teacher', full_name=f'Teacher {t}'))
+        db.add(User(username='admin', password='x', role='admin', full_name='Admin'))
+        db.commit()
+    finally:
+        db.close()
+
+
+def build_requests(students, count, rng):
+    """Per endpoint, `count` (method, path, body, content_type) tuples."""
+    def recognize():
+        class_index = rng.randrange(len(CLASSES))
+        members = list(range(class_index, students, len(CLASSES))) or list(range(students))
+        faces = rng.sample(members, min(FACES_PER_PHOTO, len(members)))
+        query = f'?period={rng.choice(PERIODS)}&date={DATE}&className={CLASSES[class_index]}&section=A'
+        return 'POST', '/api/recognize' + query, class_photo(faces), 'image/jpeg'
+
+    def mark_attendance():
+        index = rng.randrange(students)
+        body = {'studentId': student_id(index), 'name': f'Student {index}', 'date': DATE, 'period': rng.choice(PERIODS)}
+        return 'POST', '/api/mark-attendance', json.dumps(body).encode(), 'application/json'
+
+    def period_attendance():
+        return 'GET', f'/api/period-attendance?date={DATE}&period={rng.choice(PERIODS)}', None, None
+
+    def student_stats():
+        return 'GET', f'/api/student/{student_id(rng.randrange(students))}/stats', None, None
+
+    endpoints = {
+        'recognize': recognize,
+        'mark-attendance': mark_attendance,
+        'period-attendance': period_attendance,
+        'teacher-stats': lambda: ('GET', '/api/teacher/stats', None, None),
+        'admin-stats': lambda: ('GET', '/api/admin/stats', None, None),
+        'education-stats': lambda: ('GET', '/api/education/stats', None, None),
+        'student-stats': student_stats,
+    }
+    return {name: [make() for _ in range(count)] for name, make in endpoints.items()}
+
+
+def send(base_url, method, path, body, content_type):
+    """One request; returns (seconds, ok). Handled refusals (e.g. "already marked") still count as ok."""
+    req = urllib.request.Request(base_url + path, data=body, method=method)
+    if content_type:
+        req.add_header('Content-Type', content_type)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=60) as resp:
+            resp.read()
+            ok = resp.status == 200
+    except (urllib.error.URLError, OSError):
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * q), len(sorted_values) - 1)]
+
+
+def run_endpoint(base_url, requests, concurrency):
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        results = list(pool.map(lambda r: send(base_url, *r), requests))
+        wall = time.perf_counter() - start
+    durations = sorted(seconds for seconds, _ in results)
+    return {
+        'requests': len(results),
+        'errors': sum(1 for _, ok in results if not ok),
+        'p50_ms': round(percentile(durations, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(durations, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(durations, 0.99) * 1000, 2),
+        'mean_ms': round(sum(durations) / len(durations) * 1000, 2),
+        'rps': round(len(results) / wall, 1),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    print(f"{'endpoint':<20}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'errors':>8}")
+    for name, r in results.items():
+        line = f"{name:<20}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['rps']:>9.1f}{r['errors']:>8}"
+        before = (baseline or {}).get(name)
+        if before and before['p95_ms'] and before['rps']:
+            line += f"   p95 {r['p95_ms'] / before['p95_ms']:.2f}x, req/s {r['rps'] / before['rps']:.2f}x vs baseline"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=400, help="Requests per endpoint")
+    parser.add_argument('--endpoints', nargs='+', default=None, help="Subset of endpoints to drive")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help="Write results as JSON")
+    parser.add_argument('--compare', default=None, help="JSON from an earlier run to compare against")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='praesentix-load-')
+    configure_environment(os.path.join(workdir, 'load.db'))
+    sys.path.insert(0, BACKEND_DIR)
+    register_stub_models()
+
+    print(f"Seeding {args.students} students into {workdir}...")
+    start = time.perf_counter()
+    seed(args.students)
+    print(f"✓ Seeded in {time.perf_counter() - start:.1f}s")
+
+    from werkzeug.serving import make_server
+    from app import app
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='load-test-server', daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    plan = build_requests(args.students, args.requests, random.Random(args.seed))
+    if args.endpoints:
+        unknown = set(args.endpoints) - set(plan)
+        if unknown:
+            print(f"❌ Unknown endpoints: {', '.join(sorted(unknown))} (choose from {', '.join(plan)})")
+            return 2
+        plan = {name: plan[name] for name in args.endpoints}
+
+    # First request loads the gallery and the stub models; keep it out of the numbers
+    send(base_url, *build_requests(args.students, 1, random.Random(-1))['recognize'][0])
+
+    print(f"{args.requests} requests per endpoint at concurrency {args.concurrency}")
+    results = {name: run_endpoint(base_url, requests, args.concurrency) for name, requests in plan.items()}
+    server.shutdown()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['endpoints']
+    print_results(results, baseline)
+
+    if args.output:
+        report = {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'students': args.students,
+            'concurrency': args.concurrency,
+            'requestsPerEndpoint': args.requests,
+            'endpoints': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Results written to {args.output}")
+    return 1 if any(r['errors'] for r in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
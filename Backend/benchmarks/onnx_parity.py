@@ -0,0 +1,94 @@
+"""
+Parity check: ONNX Runtime Facenet vs the DeepFace/TensorFlow Facenet.
+
+tests/test_onnx_parity.py runs this check on the repo's fixture photos as part
+of the test suite. This script is for checking an export against your own
+photos: faces in the images are detected and aligned once, then embedded by
+both backends; every pair of embeddings must agree to --min-cosine. Without
+--images, seeded synthetic crops are used (checks the exported network only).
+Exits non-zero on disagreement:
+    python benchmarks/onnx_parity.py --onnx facenet.onnx --images path/to/faces --min-cosine 0.999
+"""
+import argparse
+import os
+import sys
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from embedding_backends import DeepFaceBackend, OnnxBackend, FACENET_ONNX_PATH
+from face_pipeline import DETECTORS, ALIGNERS
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+
+def fixture_crops(images_dir, detector_name, input_size):
+    detector = DETECTORS[detector_name]()
+    aligner = ALIGNERS['deepface']()
+    crops = []
+    for filename in sorted(os.listdir(images_dir)):
+        if not filename.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        image = cv2.imread(os.path.join(images_dir, filename))
+        if image is None:
+            continue
+        regions = detector.detect(image)
+        crops.extend(aligner.align(image, regions, input_size))
+    return crops
+
+
+def synthetic_crops(count, input_size, seed=0):
+    rng = np.random.default_rng(seed)
+    h, w = input_size
+    crops = []
+    for _ in range(count):
+        noise = rng.random((h // 8, w // 8, 3)).astype(np.float32)
+        crops.append(cv2.resize(noise, (w, h), interpolation=cv2.INTER_CUBIC).clip(0, 1)[np.newaxis])
+    return crops
+
+
+def cosine(a, b):
+    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--onnx', default=FACENET_ONNX_PATH, help="ONNX model (default: FACENET_ONNX_PATH)")
+    parser.add_argument('--images', default=None, help="Directory of fixture face photos")
+    parser.add_argument('--detector', default=os.environ.get('FACE_DETECTOR', 'opencv'))
+    parser.add_argument('--synthetic', type=int, default=32, help="Synthetic crops when --images is not given")
+    parser.add_argument('--batch', type=int, default=8)
+    parser.add_argument('--min-cosine', type=float, default=0.999)
+    args = parser.parse_args()
+
+    reference = DeepFaceBackend()
+    candidate = OnnxBackend(path=args.onnx)
+    if args.images:
+        crops = fixture_crops(args.images, args.detector, reference.input_size)
+        source = f"{len(crops)} faces from {args.images}"
+    else:
+        crops = synthetic_crops(args.synthetic, reference.input_size)
+        source = f"{len(crops)} synthetic crops"
+    if not crops:
+        print("❌ No faces found in the fixture images")
+        return 1
+
+    similarities = []
+    for start in range(0, len(crops), args.batch):
+        batch = crops[start:start + args.batch]
+        for a, b in zip(reference.embed(batch), candidate.embed(batch)):
+            similarities.append(cosine(a, b))
+    similarities = np.array(similarities)
+
+    worst = int(np.argmin(similarities))
+    print(f"{source}: cosine min={similarities.min():.6f} mean={similarities.mean():.6f} (worst: crop {worst})")
+    if similarities.min() < args.min_cosine:
+        print(f"❌ ONNX embeddings disagree with TensorFlow (min cosine < {args.min_cosine})")
+        return 1
+    print(f"✅ ONNX backend matches TensorFlow (min cosine >= {args.min_cosine})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+Embedding backends: the model that turns aligned face crops into vectors.
+
+Every backend takes crops as produced by the aligner ((1, h, w, 3) float32
+BGR in [0, 1]) and returns one embedding per crop from a single batched call:
+
+    backend.input_size   -> (h, w) the crops must have
+    backend.dim          -> embedding length
+    backend.load()       -> load weights (idempotent, thread-safe)
+    backend.loaded       -> True once weights are in memory
+    backend.embed(crops) -> [np.ndarray(dim)] in crop order
+
+Select one with FACE_EMBED_BACKEND:
+    deepface  Facenet through DeepFace/TensorFlow (default)
+    onnx      the same Facenet network exported to ONNX (FACENET_ONNX_PATH),
+              run by ONNX Runtime, so TensorFlow is never imported
+
+Export the ONNX file once from the DeepFace weights (needs tf2onnx):
+    python embedding_backends.py export --output facenet.onnx
+"""
+import os
+import sys
+import threading
+
+import numpy as np
+
+FACENET_ONNX_PATH = os.environ.get('FACENET_ONNX_PATH', '')
+# ONNX Runtime threads per forward pass; keep workers x threads <= cores
+ONNX_INTRA_OP_THREADS = int(os.environ.get('FACE_ONNX_THREADS', '2'))
+
+
+class EmbeddingBackend:
+    """Base class: lazy, thread-safe model loading around a batched _run()."""
+
+    name = None
+    model_name = 'Facenet'
+    input_size = (160, 160)
+    dim = 128
+
+    def __init__(self):
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    def load(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._load()
+        return self._model
+
+    def embed(self, crops):
+        if not crops:
+            return []
+        batch = np.ascontiguousarray(np.concatenate(crops, axis=0), dtype=np.float32)
+        embeddings = self._run(self.load(), batch)
+        return [np.asarray(e, dtype=np.float64) for e in embeddings]
+
+    def _load(self):
+        raise NotImplementedError
+
+    def _run(self, model, batch):
+        raise NotImplementedError
+
+
+class DeepFaceBackend(EmbeddingBackend):
+    """DeepFace's Facenet weights, called directly on a stacked batch of crops."""
+
+    name = 'deepface'
+
+    def _load(self):
+        from deepface import DeepFace
+        return DeepFace.build_model(model_name=self.model_name)
+
+    def _run(self, model, batch):
+        return model.model(batch, training=False).numpy()
+
+
+class OnnxBackend(EmbeddingBackend):
+    """Facenet exported to ONNX, run on CPU by ONNX Runtime with a bounded thread pool."""
+
+    name = 'onnx'
+
+    def __init__(self, path=None, intra_op_threads=None):
+        super().__init__()
+        self.path = path or FACENET_ONNX_PATH
+        self.intra_op_threads = intra_op_threads or ONNX_INTRA_OP_THREADS
+        self._input_name = None
+        self._channels_first = False
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            raise RuntimeError(f"FACENET_ONNX_PATH does not point to an ONNX model: '{self.path}'")
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = self.intra_op_threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        session = ort.InferenceSession(self.path, sess_options=options, providers=['CPUExecutionProvider'])
+
+        model_input = session.get_inputs()[0]
+        self._input_name = model_input.name
+        # tf2onnx keeps Keras' NHWC layout; a PyTorch export would be NCHW
+        self._channels_first = len(model_input.shape) == 4 and model_input.shape[1] == 3
+        return session
+
+    def _run(self, session, batch):
+        if self._channels_first:
+            batch = np.ascontiguousarray(batch.transpose(0, 3, 1, 2))
+        return session.run(None, {self._input_name: batch})[0]
+
+
+EMBEDDERS = {backend.name: backend for backend in (DeepFaceBackend, OnnxBackend)}
+
+
+def export_onnx(output, opset=13):
+    """Convert DeepFace's Facenet Keras model to ONNX (NHWC float32 input, batch dimension left dynamic)."""
+    import tensorflow as tf
+    import tf2onnx
+
+    model = DeepFaceBackend().load().model
+    h, w = EmbeddingBackend.input_size
+    spec = (tf.TensorSpec((None, h, w, 3), tf.float32, name='input'),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=opset, output_path=output)
+    print(f"✅ Exported Facenet to {output}")
+    return True
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Embedding backend tools")
+    sub = parser.add_subparsers(dest='command', required=True)
+    export = sub.add_parser('export', help="Export DeepFace's Facenet to ONNX (requires tf2onnx)")
+    export.add_argument('--output', default='facenet.onnx')
+    export.add_argument('--opset', type=int, default=13)
+    args = parser.parse_args()
+    sys.exit(0 if export_onnx(args.output, args.opset) else 1)
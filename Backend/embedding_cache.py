@@ -0,0 +1,144 @@
+"""
+LRU cache of face embeddings keyed by a perceptual hash of the aligned crop.
+
+Kiosk cameras re-send near-identical frames, so the same aligned face crop
+reaches the embedding stage again and again. Crops are keyed by an average +
+difference hash (aHash/dHash) of a downscaled grayscale copy, so tiny pixel
+differences between consecutive frames map to the same key.
+
+A 128-bit perceptual key can collide for two different faces under similar
+lighting, and a false hit would report the wrong student. Each entry also
+keeps a small grayscale thumbnail of its crop, and a hit is only used when
+the new crop's thumbnail is within EMBED_CACHE_MAX_DIFF (mean absolute
+difference, 0-255 gray levels) of the cached one. Otherwise it counts as a
+miss and the crop is embedded. A rejected hit only costs a forward pass.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+EMBED_CACHE_MAX_MB = float(os.environ.get('EMBED_CACHE_MAX_MB', '4'))
+EMBED_CACHE_TTL_SECONDS = float(os.environ.get('EMBED_CACHE_TTL_SECONDS', '300'))
+# Hash grid size: 8 -> 64-bit aHash + 64-bit dHash per key
+EMBED_CACHE_HASH_SIZE = int(os.environ.get('EMBED_CACHE_HASH_SIZE', '8'))
+# Hit confirmation: thumbnail side (pixels) and the largest mean gray-level difference accepted
+EMBED_CACHE_VERIFY_SIZE = int(os.environ.get('EMBED_CACHE_VERIFY_SIZE', '32'))
+EMBED_CACHE_MAX_DIFF = float(os.environ.get('EMBED_CACHE_MAX_DIFF', '3'))
+
+# Rough per-entry bookkeeping cost on top of the embedding itself (key bytes, tuple, dict slot)
+_ENTRY_OVERHEAD_BYTES = 200
+
+
+def _gray(crop):
+    img = np.asarray(crop)
+    if img.ndim == 4:
+        img = img[0]
+    img = img.astype(np.float32)
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+
+
+def crop_hash(crop, hash_size=EMBED_CACHE_HASH_SIZE):
+    """
+    Perceptual key of a (1, h, w, 3) or (h, w, 3) crop: average hash (pixels
+    above the mean) followed by difference hash (left/right gradients), as bytes.
+    """
+    small = cv2.resize(_gray(crop), (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    ahash = small[:, :-1] > small[:, :-1].mean()
+    dhash = small[:, 1:] > small[:, :-1]
+    return np.packbits(np.concatenate([ahash, dhash])).tobytes()
+
+
+def crop_thumbnail(crop, size=EMBED_CACHE_VERIFY_SIZE):
+    """uint8 grayscale size x size copy of a [0, 1] crop (as the aligner produces), used to confirm cache hits."""
+    small = cv2.resize(_gray(crop), (size, size), interpolation=cv2.INTER_AREA)
+    return np.clip(small * 255.0 + 0.5, 0, 255).astype(np.uint8)
+
+
+class EmbeddingCache:
+    """
+    Bounded (bytes + TTL) LRU map from crop hash to (embedding, thumbnail),
+    with hit/miss counters. get() only returns the embedding when the caller's
+    thumbnail matches the cached one.
+    """
+
+    def __init__(self, max_bytes=int(EMBED_CACHE_MAX_MB * 1024 * 1024), ttl_seconds=EMBED_CACHE_TTL_SECONDS,
+                 max_diff=EMBED_CACHE_MAX_DIFF):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.max_diff = max_diff
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.rejections = 0
+
+    @staticmethod
+    def _entry_size(key, embedding, thumbnail):
+        return len(key) + embedding.nbytes + thumbnail.nbytes + _ENTRY_OVERHEAD_BYTES
+
+    def _matches(self, cached, thumbnail):
+        if cached.shape != thumbnail.shape:
+            return False
+        diff = np.abs(cached.astype(np.int16) - thumbnail.astype(np.int16)).mean()
+        return diff <= self.max_diff
+
+    def get(self, key, thumbnail):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            embedding, cached_thumbnail, expires_at = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.bytes_used -= self._entry_size(key, embedding, cached_thumbnail)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            if not self._matches(cached_thumbnail, thumbnail):
+                # Same perceptual key, different face: embed it (put() then replaces the entry)
+                self.rejections += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+
+    def put(self, key, embedding, thumbnail):
+        embedding = np.asarray(embedding)
+        size = self._entry_size(key, embedding, thumbnail)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes_used -= self._entry_size(key, old[0], old[1])
+            self._entries[key] = (embedding, thumbnail, time.monotonic() + self.ttl_seconds)
+            self.bytes_used += size
+            while self.bytes_used > self.max_bytes:
+                old_key, (old_embedding, old_thumbnail, _) = self._entries.popitem(last=False)
+                self.bytes_used -= self._entry_size(old_key, old_embedding, old_thumbnail)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytesUsed': self.bytes_used,
+                'maxBytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'rejections': self.rejections,
+            }
@@ -0,0 +1,50 @@
+import struct
+
+import numpy as np
+
+# Binary layout of FaceEncoding.embedding:
+#   16-byte header: magic b'PXEM', version (u8), dtype code (u8), rows (u16), dim (u32), 4 reserved bytes
+#   followed by rows * dim little-endian values.
+# The header is 16 bytes so the float32 payload stays aligned for np.frombuffer.
+MAGIC = b'PXEM'
+VERSION = 1
+HEADER = struct.Struct('<4sBBHI4x')
+
+DTYPE_CODES = {
+    1: np.dtype('<f4'),
+    2: np.dtype('<f2'),
+}
+CODE_FOR_DTYPE = {dtype: code for code, dtype in DTYPE_CODES.items()}
+
+
+def encode_embedding(vectors, dtype='<f4'):
+    """Pack one vector (dim,) or several (rows, dim) into the binary column format."""
+    dtype = np.dtype(dtype)
+    if dtype not in CODE_FOR_DTYPE:
+        raise ValueError(f"Unsupported embedding dtype: {dtype}")
+    arr = np.asarray(vectors, dtype=dtype)
+    if arr.ndim == 1:
+        arr = arr[np.newaxis, :]
+    if arr.ndim != 2:
+        raise ValueError(f"Expected a vector or matrix, got shape {arr.shape}")
+    rows, dim = arr.shape
+    header = HEADER.pack(MAGIC, VERSION, CODE_FOR_DTYPE[dtype], rows, dim)
+    return header + np.ascontiguousarray(arr).tobytes()
+
+
+def decode_embedding(blob):
+    """
+    Unpack a binary embedding into a read-only (rows, dim) array.
+    The array is a view over blob (no copy), so keep blob alive while using it.
+    """
+    if blob is None:
+        raise ValueError("Empty embedding")
+    magic, version, code, rows, dim = HEADER.unpack_from(blob, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a binary embedding (bad magic)")
+    if version != VERSION:
+        raise ValueError(f"Unsupported embedding version: {version}")
+    if code not in DTYPE_CODES:
+        raise ValueError(f"Unsupported embedding dtype code: {code}")
+    arr = np.frombuffer(blob, dtype=DTYPE_CODES[code], count=rows * dim, offset=HEADER.size)
+    return arr.reshape(rows, dim)
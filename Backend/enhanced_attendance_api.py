@@ -256,6 +256,7 @@ def recognize_face():
         
         detected_face['attendanceMarked'] = success
         detected_face['attendanceAlreadyMarked'] = not success and 'already marked' in message.lower()
+        detected_face['attendanceQueued'] = success and 'queued' in message.lower()
         
         return jsonify({
             'success': True,
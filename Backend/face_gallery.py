@@ -0,0 +1,490 @@
+import os
+import json
+import logging
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import func
+
+from models import FaceEncoding
+from embedding_codec import decode_embedding
+from ann_index import IVFIndex, ANN_INDEX_PATH
+from metrics import INFERENCE_STAGE_SECONDS
+from gallery_quantization import GalleryWriter, append_rows, GALLERY_DTYPE, GALLERY_RERANK_K, QUANTIZED_DTYPES
+
+logger = logging.getLogger(__name__)
+
+# Facenet embeddings are 128-d; rows with any other size (e.g. old MediaPipe
+# landmark vectors) can never match a Facenet query, so they are left out.
+EMBEDDING_DIM = 128
+
+# How often (seconds) a worker checks whether another worker changed face_encodings
+GALLERY_REFRESH_SECONDS = float(os.environ.get('FACE_GALLERY_REFRESH_SECONDS', '30'))
+
+# Optional approximate search for district-scale galleries (FACE_ANN_INDEX=ivf).
+# Below FACE_ANN_MIN_SIZE the exact scan is already fast, so the index is skipped.
+ANN_INDEX_KIND = os.environ.get('FACE_ANN_INDEX', '').lower()
+ANN_MIN_SIZE = int(os.environ.get('FACE_ANN_MIN_SIZE', '20000'))
+
+# Per-photo templates kept per student, in addition to their centroid
+ENROLL_MAX_TEMPLATES = int(os.environ.get('ENROLL_MAX_TEMPLATES', '10'))
+
+# Rows copied at a time when a quantized gallery's storage is rewritten
+_COPY_ROWS = 16384
+
+# How faces in one photo are paired with students: 'hungarian' (max total similarity) or 'greedy'
+ASSIGNMENT_STRATEGY = os.environ.get('FACE_ASSIGNMENT', 'hungarian').lower()
+
+
+def build_templates(encodings, max_templates=ENROLL_MAX_TEMPLATES):
+    """Stack a student's enrollment encodings as [centroid, photo 1, photo 2, ...] for storage."""
+    encodings = [np.asarray(encoding, dtype=np.float32).reshape(-1) for encoding in encodings]
+    return np.vstack([np.mean(encodings, axis=0)] + encodings[:max_templates])
+
+
+def assign_greedy(scores, min_score):
+    """
+    One-to-one assignment by descending score.
+    Returns {face_row: gallery_column} for pairs with score >= min_score.
+    """
+    faces, columns = np.nonzero(scores >= min_score)
+    order = np.argsort(-scores[faces, columns], kind='stable')
+    assignment = {}
+    taken = set()
+    for i in order:
+        face, column = int(faces[i]), int(columns[i])
+        if face in assignment or column in taken:
+            continue
+        assignment[face] = column
+        taken.add(column)
+    return assignment
+
+
+def assign_hungarian(scores, min_score):
+    """
+    Optimal one-to-one assignment maximizing total similarity (scipy's Hungarian solver).
+    Pairs below min_score are never assigned.
+    """
+    from scipy.optimize import linear_sum_assignment
+
+    allowed = scores >= min_score
+    # Disallowed pairs get a cost no allowed pairing can beat, and are dropped afterwards
+    cost = np.where(allowed, -scores, scores.shape[0] + 1.0)
+    faces, columns = linear_sum_assignment(cost)
+    return {int(f): int(c) for f, c in zip(faces, columns) if allowed[f, c]}
+
+
+def student_key(person_id):
+    """student_id of an "ID-{student_id} - {name}" person_id; other person_ids are their own key."""
+    if person_id.startswith('ID-') and ' - ' in person_id:
+        return person_id[3:].split(' - ', 1)[0]
+    return person_id
+
+
+def max_by_owner(scores, owners):
+    """
+    Collapse template columns of scores to one column per person, keeping the best.
+    owners[j] is the person column of template column j and must be non-decreasing.
+    Returns (person_columns, person_scores).
+    """
+    if owners.size == 0:
+        return owners, scores
+    starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+    if starts.size == owners.size:
+        return owners, scores
+    return owners[starts], np.maximum.reduceat(scores, starts, axis=1)
+
+
+class FaceGallery:
+    """
+    Process-resident gallery of enrolled faces.
+
+    Holds an L2-normalized float32 matrix of templates and the matching
+    person_id list, so a lookup is one matrix product plus an argmax instead of
+    loading and scanning every FaceEncoding row per request. A person may have
+    several templates (centroid plus one per enrollment photo); their rows are
+    contiguous and `owners` maps each row to its person, and a person scores as
+    their best template.
+
+    With dtype float16/int8 (FACE_GALLERY_DTYPE) only compact codes stay in
+    RAM; queries are scored against them and the top rows re-scored exactly
+    against the memory-mapped float32 templates (see gallery_quantization.py).
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM, refresh_seconds=GALLERY_REFRESH_SECONDS,
+                 use_ann=None, ann_path=ANN_INDEX_PATH, dtype=None, rerank_k=GALLERY_RERANK_K):
+        self.dim = dim
+        self.refresh_seconds = refresh_seconds
+        self.use_ann = (ANN_INDEX_KIND == 'ivf') if use_ann is None else use_ann
+        self.ann_path = ann_path
+        self.dtype = (dtype or GALLERY_DTYPE).lower()
+        self.rerank_k = rerank_k
+        self._lock = threading.Lock()
+        # (person_ids, matrix, ann_index, owners, coarse) is swapped as one tuple so readers never need the lock
+        matrix, coarse = GalleryWriter(dim, self.dtype).finish()
+        self._snapshot = ([], matrix, None, np.zeros(0, dtype=np.int32), coarse)
+        # (person_ids list it was built from, {student_id: [columns]}), rebuilt when the gallery changes
+        self._student_columns = None
+        self._fingerprint = None
+        self._checked_at = 0.0
+        self._loaded = False
+
+    def __len__(self):
+        return len(self._snapshot[0])
+
+    @property
+    def person_ids(self):
+        return self._snapshot[0]
+
+    @property
+    def matrix(self):
+        return self._snapshot[1]
+
+    @property
+    def ann_index(self):
+        return self._snapshot[2]
+
+    @property
+    def owners(self):
+        return self._snapshot[3]
+
+    @property
+    def coarse(self):
+        return self._snapshot[4]
+
+    @property
+    def nbytes(self):
+        """Bytes of gallery data resident in RAM (memory-mapped float32 templates excluded)."""
+        matrix, owners, coarse = self._snapshot[1], self._snapshot[3], self._snapshot[4]
+        resident = 0 if isinstance(matrix, np.memmap) else matrix.nbytes
+        return resident + owners.nbytes + (coarse.nbytes if coarse is not None else 0)
+
+    @property
+    def template_person_ids(self):
+        """person_id of every matrix row."""
+        person_ids, owners = self._snapshot[0], self._snapshot[3]
+        return [person_ids[i] for i in owners]
+
+    def _normalize(self, encoding):
+        """Return a unit-length float32 copy of encoding, or None if unusable."""
+        vec = np.asarray(encoding, dtype=np.float32).reshape(-1)
+        if vec.shape[0] != self.dim:
+            return None
+        norm = np.linalg.norm(vec)
+        if not np.isfinite(norm) or norm == 0:
+            return None
+        return vec / norm
+
+    def _normalize_templates(self, encodings):
+        """Unit-length (k, dim) float32 templates from one vector or a (rows, dim) stack; unusable rows are dropped."""
+        arr = np.asarray(encodings, dtype=np.float32)
+        if arr.ndim == 1:
+            arr = arr[np.newaxis, :]
+        if arr.ndim != 2 or arr.shape[1] != self.dim:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        norms = np.linalg.norm(arr, axis=1)
+        usable = np.isfinite(norms) & (norms > 0)
+        return (arr[usable] / norms[usable, np.newaxis]).astype(np.float32)
+
+    def _read_fingerprint(self, db):
+        """Cheap (row count, last update) pair used to detect changes from other workers."""
+        count, last_update = db.query(func.count(FaceEncoding.id), func.max(FaceEncoding.updated_at)).one()
+        return count, last_update
+
+    def load(self, db):
+        """Rebuild the gallery from the face_encodings table."""
+        with self._lock, INFERENCE_STAGE_SECONDS.time(stage='gallery_load'):
+            fingerprint = self._read_fingerprint(db)
+            query = db.query(FaceEncoding.person_id, FaceEncoding.embedding, FaceEncoding.encoding_data).order_by(FaceEncoding.id)
+            self._load_rows(self._decode_rows(query))
+            self._fingerprint = fingerprint
+            self._checked_at = time.monotonic()
+            self._loaded = True
+
+    def _decode_rows(self, query):
+        for person_id, embedding, encoding_data in query:
+            try:
+                if embedding is not None:
+                    yield person_id, decode_embedding(embedding)
+                else:
+                    # Row not migrated yet (see `python migrate.py embeddings`)
+                    yield person_id, json.loads(encoding_data)
+            except Exception as e:
+                logger.error("Error loading encoding for %s: %s", person_id, e)
+
+    def load_templates(self, items):
+        """Replace the gallery with (person_id, templates) pairs, e.g. for benchmarks or offline tools."""
+        with self._lock:
+            self._load_rows(items)
+
+    def _load_rows(self, items):
+        person_ids = []
+        counts = []
+        writer = GalleryWriter(self.dim, self.dtype)
+        for person_id, encodings in items:
+            templates = self._normalize_templates(encodings)
+            if not len(templates):
+                continue
+            person_ids.append(person_id)
+            counts.append(len(templates))
+            writer.add(templates)
+
+        matrix, coarse = writer.finish()
+        owners = np.repeat(np.arange(len(person_ids), dtype=np.int32), counts)
+        self._snapshot = (person_ids, matrix, self._prepare_index(person_ids, matrix, owners), owners, coarse)
+        logger.info("Face gallery loaded: %d people, %d templates (%s)", len(person_ids), len(matrix), self.dtype)
+
+    def _prepare_index(self, person_ids, matrix, owners):
+        """Load the saved ANN index (topping it up with new rows) or build a fresh one."""
+        if not self.use_ann or len(matrix) < ANN_MIN_SIZE:
+            return None
+        try:
+            row_ids = [person_ids[i] for i in owners]
+            index = IVFIndex.load(self.ann_path)
+            if index is not None and index.person_ids == row_ids[:len(index.person_ids)]:
+                for row in range(len(index.person_ids), len(row_ids)):
+                    index.add(row, matrix[row])
+                    index.person_ids.append(row_ids[row])
+            else:
+                index = IVFIndex.build(matrix, row_ids)
+            index.save(self.ann_path)
+            logger.info("ANN index ready: %d faces in %d lists", len(index), index.nlist)
+            return index
+        except Exception as e:
+            logger.error("ANN index unavailable, using exact search: %s", e)
+            return None
+
+    def ensure_fresh(self, db):
+        """Load on first use, then reload only when face_encodings changed elsewhere."""
+        if not self._loaded:
+            self.load(db)
+            return
+        if time.monotonic() - self._checked_at < self.refresh_seconds:
+            return
+        fingerprint = self._read_fingerprint(db)
+        self._checked_at = time.monotonic()
+        if fingerprint != self._fingerprint:
+            self.load(db)
+
+    def upsert(self, person_id, encodings, db=None):
+        """
+        Add or replace one person's templates after enrollment without a full reload.
+        encodings is one vector or a (rows, dim) stack; nothing usable removes the person.
+        """
+        templates = self._normalize_templates(encodings)
+        with self._lock:
+            person_ids, matrix, index, owners, coarse = self._snapshot
+            if person_id in person_ids:
+                column = person_ids.index(person_id)
+                rows = np.flatnonzero(owners == column)
+                if coarse is None and len(templates) == len(rows):
+                    matrix = matrix.copy()
+                    matrix[rows] = templates
+                    if index is not None:
+                        for row, vec in zip(rows, templates):
+                            index.add(int(row), vec)
+                        index.save(self.ann_path)
+                else:
+                    # Drop the old templates and append the new ones; later rows shift, so the index is rebuilt
+                    keep = np.flatnonzero(owners != column)
+                    counts = np.bincount(owners, minlength=len(person_ids))
+                    counts = np.delete(counts, column)
+                    person_ids = person_ids[:column] + person_ids[column + 1:]
+                    writer = GalleryWriter(self.dim, self.dtype)
+                    for start in range(0, len(keep), _COPY_ROWS):
+                        writer.add(matrix[keep[start:start + _COPY_ROWS]])
+                    if len(templates):
+                        person_ids = person_ids + [person_id]
+                        writer.add(templates)
+                        counts = np.append(counts, len(templates))
+                    matrix, coarse = writer.finish()
+                    owners = np.repeat(np.arange(len(person_ids), dtype=np.int32), counts)
+                    index = self._prepare_index(person_ids, matrix, owners) if index is not None else None
+            elif len(templates):
+                first_row = len(matrix)
+                person_ids = person_ids + [person_id]
+                matrix, coarse = append_rows(matrix, coarse, templates)
+                owners = np.concatenate([owners, np.full(len(templates), len(person_ids) - 1, dtype=np.int32)])
+                if index is not None:
+                    for offset, vec in enumerate(templates):
+                        index.add(first_row + offset, vec)
+                        index.person_ids.append(person_id)
+                    index.save(self.ann_path)
+                elif self.use_ann and len(matrix) >= ANN_MIN_SIZE:
+                    index = self._prepare_index(person_ids, matrix, owners)
+            self._snapshot = (person_ids, matrix, index, owners, coarse)
+            if db is not None and self._loaded:
+                # Our own write changed the fingerprint; record it so it doesn't trigger a reload
+                self._fingerprint = self._read_fingerprint(db)
+                self._checked_at = time.monotonic()
+
+    def invalidate(self):
+        """Force a full reload on the next ensure_fresh()."""
+        with self._lock:
+            self._loaded = False
+
+    def _candidate_rows(self, queries, matrix, index, coarse):
+        """
+        Rows worth scoring exactly: the union of the queries' ANN candidates or
+        top coarse-scored rows. None means scan the whole matrix.
+        """
+        if index is not None:
+            rows = np.unique(np.concatenate([index.search(q, matrix)[0] for q in queries]))
+        elif coarse is not None:
+            rows = coarse.top_k(queries, self.rerank_k)
+        else:
+            return None
+        return rows if rows.size else None
+
+    def match(self, encoding, threshold):
+        """
+        Find the closest enrolled face by cosine distance.
+        Returns (person_id, confidence_percent); person_id is None above threshold.
+        """
+        person_ids, matrix, index, owners, coarse = self._snapshot
+        if not person_ids:
+            return None, 0
+
+        query = self._normalize(encoding)
+        if query is None:
+            return None, 0
+
+        rows = self._candidate_rows(query[np.newaxis, :], matrix, index, coarse)
+        if rows is None:
+            similarities = matrix @ query
+            best = int(np.argmax(similarities))
+            best_similarity = float(similarities[best])
+        else:
+            # rows are sorted, so ties still go to the lower row like the full scan
+            similarities = matrix[rows] @ query
+            top = int(np.argmax(similarities))
+            best, best_similarity = int(rows[top]), float(similarities[top])
+        min_distance = 1.0 - best_similarity
+
+        # Convert distance to confidence (approximate mapping)
+        # distance 0 -> 100%, distance threshold -> 60% approx
+        confidence = max(0, (1 - min_distance) * 100)
+
+        if min_distance <= threshold:
+            return person_ids[owners[best]], confidence
+
+        return None, confidence
+
+    def _columns_for(self, person_ids, student_ids):
+        """Sorted gallery columns of the given student_ids (a student may have several person_ids)."""
+        cached = self._student_columns
+        if cached is None or cached[0] is not person_ids:
+            mapping = {}
+            for column, person_id in enumerate(person_ids):
+                mapping.setdefault(student_key(person_id), []).append(column)
+            cached = self._student_columns = (person_ids, mapping)
+        return sorted(column for student_id in student_ids for column in cached[1].get(str(student_id), ()))
+
+    def _assign(self, snapshot, queries, threshold, strategy, columns=None, exclude=None):
+        """
+        Score queries against the gallery (or only the given person columns) and
+        assign identities one-to-one; person columns in exclude are never assigned.
+        Returns [(person_id or None, confidence)] per query.
+        """
+        person_ids, matrix, index, owners, coarse = snapshot
+        if columns is not None:
+            # Roster sub-gallery: a few dozen students, scored exactly
+            columns = np.asarray(columns, dtype=owners.dtype)
+            starts = np.searchsorted(owners, columns, 'left')
+            ends = np.searchsorted(owners, columns, 'right')
+            rows = np.concatenate([np.arange(a, b) for a, b in zip(starts, ends)])
+            columns, scores = max_by_owner(queries @ matrix[rows].T, owners[rows])
+        else:
+            # With an ANN index or quantized codes only the candidate rows are scored exactly
+            rows = self._candidate_rows(queries, matrix, index, coarse)
+            if rows is None:
+                columns, scores = max_by_owner(queries @ matrix.T, owners)
+            else:
+                columns, scores = max_by_owner(queries @ matrix[rows].T, owners[rows])
+        if exclude:
+            # Removed before assignment, so a face whose best candidate is taken gets its next best
+            keep = ~np.isin(columns, exclude)
+            columns, scores = columns[keep], scores[:, keep]
+            if not columns.size:
+                return [(None, 0)] * len(queries)
+
+        strategy = strategy or ASSIGNMENT_STRATEGY
+        assign = assign_greedy if strategy == 'greedy' or len(queries) == 1 else assign_hungarian
+        assignment = assign(scores, 1.0 - threshold)
+
+        best_scores = scores.max(axis=1)
+        results = []
+        for row in range(len(queries)):
+            if row in assignment:
+                similarity = float(scores[row, assignment[row]])
+                results.append((person_ids[int(columns[assignment[row]])], max(0, similarity * 100)))
+            else:
+                # Same confidence the single-face matcher reports for an unknown face
+                results.append((None, max(0, float(best_scores[row]) * 100)))
+        return results
+
+    def match_batch(self, encodings, threshold, strategy=None, roster=None, exclude=None):
+        """
+        Match all faces from one photo at once.
+
+        Scores the M faces against every template in a single matrix product,
+        keeps each student's best template, and assigns identities one-to-one,
+        so two faces never resolve to the same student. Returns a list of
+        (person_id, confidence_percent) per face, in the same order as
+        encodings; person_id is None for unassigned faces.
+
+        With a roster (student_ids of the class in the room), faces are matched
+        against those students first; only faces the roster leaves unmatched
+        are searched in the whole gallery. Students of the person_ids in exclude
+        (e.g. already held by other faces in the frame) are never assigned.
+        """
+        snapshot = self._snapshot
+        person_ids = snapshot[0]
+        results = [(None, 0)] * len(encodings)
+        if not person_ids or not len(encodings):
+            return results
+
+        queries = [self._normalize(encoding) for encoding in encodings]
+        valid = [i for i, q in enumerate(queries) if q is not None]
+        if not valid:
+            return results
+        queries = np.vstack([queries[i] for i in valid])
+
+        pending = list(range(len(valid)))
+        taken = set()
+        excluded = set(self._columns_for(person_ids, {student_key(person_id) for person_id in exclude})) \
+            if exclude else set()
+        columns = self._columns_for(person_ids, roster) if roster else None
+        if columns and excluded:
+            columns = [column for column in columns if column not in excluded]
+        if columns:
+            for row, result in enumerate(self._assign(snapshot, queries, threshold, strategy, columns)):
+                if result[0] is not None:
+                    results[valid[row]] = result
+                    taken.add(result[0])
+            pending = [row for row in pending if results[valid[row]][0] is None]
+
+        if pending:
+            # A student already placed by the roster pass can't be a second face too
+            if taken:
+                excluded.update(self._columns_for(person_ids, {student_key(person_id) for person_id in taken}))
+            exclude_columns = sorted(excluded) or None
+            for row, result in zip(pending, self._assign(snapshot, queries[pending], threshold, strategy,
+                                                         exclude=exclude_columns)):
+                results[valid[row]] = result
+        return results
+
+
+_gallery = None
+_gallery_lock = threading.Lock()
+
+
+def get_gallery():
+    """Return the process-wide FaceGallery, creating it on first use."""
+    global _gallery
+    if _gallery is None:
+        with _gallery_lock:
+            if _gallery is None:
+                _gallery = FaceGallery()
+    return _gallery
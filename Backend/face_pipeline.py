@@ -0,0 +1,325 @@
+"""
+Face recognition pipeline split into independent, swappable stages:
+
+    detector.detect(image)                -> face regions
+    aligner.align(image, regions, size)   -> model-ready crops, one per region
+    embedder.embed(crops)                 -> one embedding per crop (single batched forward pass)
+
+Each stage is timed separately. Images without faces stop after detection,
+so they never touch (or load) the embedding model.
+"""
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from embedding_backends import EMBEDDERS
+from embedding_cache import crop_hash, crop_thumbnail
+from metrics import INFERENCE_STAGE_SECONDS
+
+FaceRegion = namedtuple('FaceRegion', ['x', 'y', 'w', 'h', 'left_eye', 'right_eye', 'confidence'])
+
+
+class OpenCVDetector:
+    """
+    DeepFace's opencv (Haar cascade) detector, built once and reused for every
+    image. It runs the way DeepFace.extract_faces runs it: on the image padded by
+    half its size with black, with boxes and eyes mapped back to the image. The
+    padding changes which windows the cascade scans, so this is needed for the
+    same faces (and eyes) as galleries enrolled through DeepFace.
+    """
+
+    name = 'opencv'
+
+    def __init__(self):
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        if self._model is None:
+            from deepface import DeepFace
+            self._model = DeepFace.build_model(model_name=self.name, task='face_detector')
+        return self._model
+
+    def detect(self, image):
+        h, w = image.shape[:2]
+        border_h, border_w = int(0.5 * h), int(0.5 * w)
+        padded = cv2.copyMakeBorder(image, border_h, border_h, border_w, border_w, cv2.BORDER_CONSTANT, value=[0, 0, 0])
+        # The cascade classifier is shared and not safe to call from several threads at once
+        with self._lock:
+            regions = self._get_model().detect_faces(padded)
+
+        def unpad(point):
+            return (point[0] - border_w, point[1] - border_h) if point is not None else None
+
+        return [FaceRegion(r.x - border_w, r.y - border_h, r.w, r.h, unpad(r.left_eye), unpad(r.right_eye), r.confidence)
+                for r in regions]
+
+
+class HaarDetector:
+    """
+    The same Haar cascades (face, then eyes inside each face) as DeepFace's
+    opencv detector, loaded straight from OpenCV so DeepFace/TensorFlow are
+    never imported. Pair with FACE_EMBED_BACKEND=onnx for a TensorFlow-free process.
+    """
+
+    name = 'haar'
+
+    def __init__(self):
+        self._face = None
+        self._eye = None
+        self._lock = threading.Lock()
+
+    def _cascades(self):
+        if self._face is None:
+            self._face = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+            self._eye = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml')
+        return self._face, self._eye
+
+    def _find_eyes(self, face_img, eye_cascade):
+        gray = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY)
+        eyes = eye_cascade.detectMultiScale(gray, 1.1, 10)
+        if len(eyes) < 2:
+            return None, None
+        # The two largest detections; the one further right in the image is the person's left eye
+        eye_1, eye_2 = sorted(eyes, key=lambda e: abs(e[2] * e[3]), reverse=True)[:2]
+        right_eye, left_eye = (eye_1, eye_2) if eye_1[0] < eye_2[0] else (eye_2, eye_1)
+        return ((int(left_eye[0] + left_eye[2] / 2), int(left_eye[1] + left_eye[3] / 2)),
+                (int(right_eye[0] + right_eye[2] / 2), int(right_eye[1] + right_eye[3] / 2)))
+
+    def detect(self, image):
+        with self._lock:
+            face_cascade, eye_cascade = self._cascades()
+            faces, _, scores = face_cascade.detectMultiScale3(image, 1.1, 10, outputRejectLevels=True)
+            regions = []
+            for (x, y, w, h), score in zip(faces, scores):
+                x, y, w, h = int(x), int(y), int(w), int(h)
+                left_eye, right_eye = self._find_eyes(image[y:y + h, x:x + w], eye_cascade)
+                if left_eye is not None:
+                    left_eye = (x + left_eye[0], y + left_eye[1])
+                    right_eye = (x + right_eye[0], y + right_eye[1])
+                regions.append(FaceRegion(x, y, w, h, left_eye, right_eye, float(score)))
+        return regions
+
+
+class EyeAligner:
+    """
+    Crops each region and levels the eyes, following DeepFace's alignment:
+    rotate around the face centre by the eye angle, then cut out the box.
+    Crops are returned as (1, h, w, 3) float32 BGR in [0, 1], letterboxed to the model size.
+    """
+
+    name = 'eyes'
+
+    def align(self, image, regions, target_size):
+        return [self._prepare(self._crop(image, region), target_size) for region in regions]
+
+    def _crop(self, image, region):
+        x, y, w, h = int(region.x), int(region.y), int(region.w), int(region.h)
+        if region.left_eye is None or region.right_eye is None:
+            return image[max(y, 0):y + h, max(x, 0):x + w]
+
+        # Work on a padded sub-image so rotation doesn't pull in black corners
+        pad = max(w, h) // 2
+        x1, y1 = max(x - pad, 0), max(y - pad, 0)
+        x2, y2 = min(x + w + pad, image.shape[1]), min(y + h + pad, image.shape[0])
+        sub = image[y1:y2, x1:x2]
+
+        (lx, ly), (rx, ry) = region.left_eye, region.right_eye
+        angle = float(np.degrees(np.arctan2(ly - ry, lx - rx)))
+        center = (x + w / 2.0 - x1, y + h / 2.0 - y1)
+        rotation = cv2.getRotationMatrix2D(center, angle, 1.0)
+        rotated = cv2.warpAffine(sub, rotation, (sub.shape[1], sub.shape[0]))
+
+        cx, cy = int(center[0] - w / 2.0), int(center[1] - h / 2.0)
+        return rotated[max(cy, 0):cy + h, max(cx, 0):cx + w]
+
+    def _prepare(self, crop, target_size):
+        target_h, target_w = target_size
+        crop = crop.astype(np.float32) / 255.0
+        factor = min(target_h / crop.shape[0], target_w / crop.shape[1])
+        resized = cv2.resize(crop, (int(crop.shape[1] * factor), int(crop.shape[0] * factor)))
+        diff_h, diff_w = target_h - resized.shape[0], target_w - resized.shape[1]
+        padded = np.pad(
+            resized,
+            ((diff_h // 2, diff_h - diff_h // 2), (diff_w // 2, diff_w - diff_w // 2), (0, 0)),
+            'constant'
+        )
+        if padded.shape[:2] != (target_h, target_w):
+            padded = cv2.resize(padded, (target_w, target_h))
+        return padded[np.newaxis, ...].astype(np.float32)
+
+
+class DeepFaceAligner(EyeAligner):
+    """
+    DeepFace's own alignment, step for step (extract_faces with align=True):
+    pad the image by half its size, rotate the whole padded image about its
+    centre with PIL bicubic, project the box onto the rotated image and cut it
+    out. Crops match DeepFace.represent, so galleries enrolled before the
+    pipeline split keep matching. DeepFace itself is not imported.
+    """
+
+    name = 'deepface'
+
+    def align(self, image, regions, target_size):
+        if not regions:
+            return []
+        h, w = image.shape[:2]
+        border_h, border_w = int(0.5 * h), int(0.5 * w)
+        padded = cv2.copyMakeBorder(image, border_h, border_h, border_w, border_w, cv2.BORDER_CONSTANT, value=[0, 0, 0])
+        return [self._prepare(self._crop_padded(padded, region, border_w, border_h), target_size)
+                for region in regions]
+
+    def _crop_padded(self, padded, region, border_w, border_h):
+        x, y = int(region.x) + border_w, int(region.y) + border_h
+        w, h = int(region.w), int(region.h)
+        if region.left_eye is None or region.right_eye is None:
+            return padded[y:y + h, x:x + w]
+
+        from PIL import Image
+
+        (lx, ly), (rx, ry) = region.left_eye, region.right_eye
+        angle = float(np.degrees(np.arctan2(ly - ry, lx - rx)))
+        rotated = np.array(Image.fromarray(padded).rotate(angle, resample=Image.BICUBIC))
+        x1, y1, x2, y2 = self._project(x, y, w, h, angle, padded.shape[:2])
+        return rotated[y1:y2, x1:x2]
+
+    @staticmethod
+    def _project(x, y, w, h, angle, size):
+        """The (x1, y1, x2, y2) box after rotating the image by angle degrees (DeepFace's project_facial_area)."""
+        direction = 1 if angle >= 0 else -1
+        angle = abs(angle) % 360
+        if angle == 0:
+            return x, y, x + w, y + h
+        angle = angle * np.pi / 180
+        height, width = size
+        cx, cy = x + w / 2 - width / 2, y + h / 2 - height / 2
+        new_x = cx * np.cos(angle) + cy * direction * np.sin(angle) + width / 2
+        new_y = -cx * direction * np.sin(angle) + cy * np.cos(angle) + height / 2
+        return (max(int(new_x - w / 2), 0), max(int(new_y - h / 2), 0),
+                min(int(new_x + w / 2), width), min(int(new_y + h / 2), height))
+
+
+DETECTORS = {OpenCVDetector.name: OpenCVDetector, HaarDetector.name: HaarDetector}
+ALIGNERS = {EyeAligner.name: EyeAligner, DeepFaceAligner.name: DeepFaceAligner}
+
+
+class StageTimings:
+    """Cumulative call count and seconds per stage, safe to update from many threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def record(self, stage, seconds):
+        with self._lock:
+            count, total = self._totals.get(stage, (0, 0.0))
+            self._totals[stage] = (count + 1, total + seconds)
+
+    def summary(self):
+        with self._lock:
+            return {
+                stage: {'calls': count, 'totalMs': round(total * 1000, 1), 'meanMs': round(total * 1000 / count, 2)}
+                for stage, (count, total) in self._totals.items()
+            }
+
+
+class FacePipeline:
+    """
+    Detector -> aligner -> embedder, optionally embedding through a MicroBatcher.
+    With an EmbeddingCache, crops whose perceptual hash was embedded recently
+    (and whose thumbnail matches the cached crop) reuse that embedding, and
+    only the misses reach the model.
+    """
+
+    def __init__(self, detector, aligner, embedder, batcher=None, cache=None):
+        self.detector = detector
+        self.aligner = aligner
+        self.embedder = embedder
+        self.batcher = batcher
+        self.cache = cache
+        self.timings = StageTimings()
+
+    def _timed(self, stage, timings, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            timings[stage] = elapsed
+            self.timings.record(stage, elapsed)
+            INFERENCE_STAGE_SECONDS.observe(elapsed, stage=stage)
+
+    def detect(self, image, timings=None):
+        return self._timed('detect', {} if timings is None else timings, self.detector.detect, image)
+
+    def align(self, image, regions, timings=None):
+        return self._timed('align', {} if timings is None else timings,
+                           self.aligner.align, image, regions, self.embedder.input_size)
+
+    def _embed_uncached(self, crops):
+        fn = self.batcher.submit if self.batcher is not None else self.embedder.embed
+        return fn(crops)
+
+    def _embed_cached(self, crops):
+        keys = [crop_hash(crop) for crop in crops]
+        thumbnails = [crop_thumbnail(crop) for crop in crops]
+        embeddings = [self.cache.get(key, thumbnail) for key, thumbnail in zip(keys, thumbnails)]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            fresh = self._embed_uncached([crops[i] for i in missing])
+            for i, embedding in zip(missing, fresh):
+                embeddings[i] = embedding
+                self.cache.put(keys[i], embedding, thumbnails[i])
+        return embeddings
+
+    def embed(self, crops, timings=None):
+        fn = self._embed_cached if self.cache is not None else self._embed_uncached
+        return self._timed('embed', {} if timings is None else timings, fn, crops)
+
+    def encode(self, image):
+        """
+        Run all stages on one image.
+        Returns (embeddings, regions, timings) where timings maps stage -> seconds for this call.
+        """
+        timings = {}
+        regions = self.detect(image, timings)
+        if not regions:
+            return [], [], timings
+        crops = self.align(image, regions, timings)
+        return self.embed(crops, timings), regions, timings
+
+    def encode_many(self, images, workers=4):
+        """
+        Detect and align several images in a thread pool, then embed every crop
+        in one forward pass. Returns (embeddings_per_image, regions_per_image, timings)
+        where timings sums each stage's seconds over all images.
+        """
+        def prepare(image):
+            image_timings = {}
+            regions = self.detect(image, image_timings)
+            crops = self.align(image, regions, image_timings) if regions else []
+            return regions, crops, image_timings
+
+        if len(images) > 1 and workers > 1:
+            with ThreadPoolExecutor(max_workers=min(workers, len(images))) as pool:
+                prepared = list(pool.map(prepare, images))
+        else:
+            prepared = [prepare(image) for image in images]
+
+        timings = {}
+        for _, _, image_timings in prepared:
+            for stage, seconds in image_timings.items():
+                timings[stage] = timings.get(stage, 0.0) + seconds
+
+        all_crops = [crop for _, crops, _ in prepared for crop in crops]
+        embeddings = self.embed(all_crops, timings) if all_crops else []
+        per_image = []
+        offset = 0
+        for _, crops, _ in prepared:
+            per_image.append(list(embeddings[offset:offset + len(crops)]))
+            offset += len(crops)
+        return per_image, [regions for regions, _, _ in prepared], timings
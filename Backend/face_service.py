@@ -0,0 +1,19 @@
+"""
+The recognition stack as seen by the web app: image decoding, inference and
+gallery templates. Importing it pulls in numpy and OpenCV, and inference
+brings DeepFace/TensorFlow on first use, so app.py only imports this module
+inside the recognition endpoints. Attendance, notification and login
+requests never load any of it.
+"""
+from embedding_codec import encode_embedding
+from face_gallery import build_templates
+from image_io import decode_image
+from inference_service import get_inference
+# Enrollment photos are decoded (here) and detected/aligned (in recognition) with the same pool size
+from recognition import ENROLL_WORKERS
+
+
+def enrollment_templates(encodings):
+    """(templates, packed FaceEncoding.embedding blob) for a student's enrollment photos."""
+    templates = build_templates(encodings)
+    return templates, encode_embedding(templates)
@@ -0,0 +1,169 @@
+"""
+Face tracking for live camera streams.
+
+Students sit still for minutes, so re-embedding every face on every frame is
+wasted work. FaceTracker follows detections across frames by box overlap
+(IoU); a track is only embedded when it is new, when its identity is still
+uncertain, or for a periodic re-check. Everything else reuses the identity
+the track already has.
+"""
+import itertools
+import os
+
+# Minimum box overlap for a detection to continue an existing track
+TRACK_IOU_THRESHOLD = float(os.environ.get('TRACK_IOU_THRESHOLD', '0.3'))
+# Frames a track may go undetected before it is dropped
+TRACK_MAX_MISSES = int(os.environ.get('TRACK_MAX_MISSES', '5'))
+# Identities below this confidence (%) are treated as uncertain and retried
+TRACK_CONFIRM_CONFIDENCE = float(os.environ.get('TRACK_CONFIRM_CONFIDENCE', '70'))
+# Uncertain/unknown tracks are re-embedded every N frames, confirmed ones every M frames
+TRACK_RETRY_FRAMES = int(os.environ.get('TRACK_RETRY_FRAMES', '5'))
+TRACK_REVERIFY_FRAMES = int(os.environ.get('TRACK_REVERIFY_FRAMES', '60'))
+
+
+def iou(a, b):
+    """Intersection-over-union of two (x, y, w, h) boxes."""
+    ax2, ay2 = a[0] + a[2], a[1] + a[3]
+    bx2, by2 = b[0] + b[2], b[1] + b[3]
+    iw = max(0, min(ax2, bx2) - max(a[0], b[0]))
+    ih = max(0, min(ay2, by2) - max(a[1], b[1]))
+    inter = iw * ih
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union > 0 else 0.0
+
+
+class Track:
+    """One face followed across frames."""
+
+    def __init__(self, track_id, region, frame):
+        self.id = track_id
+        self.region = region
+        self.misses = 0
+        self.person_id = None
+        self.confidence = 0.0
+        self.embedded_at = None
+        self.first_seen = frame
+        # Attendance result for the current identity, reported on every frame
+        self.attendance = None
+
+    @property
+    def box(self):
+        return (self.region.x, self.region.y, self.region.w, self.region.h)
+
+    @property
+    def confirmed(self):
+        return self.person_id is not None and self.confidence >= TRACK_CONFIRM_CONFIDENCE
+
+    def needs_embedding(self, frame):
+        if self.embedded_at is None:
+            return True
+        interval = TRACK_REVERIFY_FRAMES if self.confirmed else TRACK_RETRY_FRAMES
+        return frame - self.embedded_at >= interval
+
+    def set_identity(self, person_id, confidence, frame):
+        if person_id != self.person_id:
+            self.attendance = None
+        self.person_id = person_id
+        self.confidence = confidence
+        self.embedded_at = frame
+
+
+class FaceTracker:
+    """Greedy IoU tracker: detections continue the overlapping track or start a new one."""
+
+    def __init__(self, iou_threshold=TRACK_IOU_THRESHOLD, max_misses=TRACK_MAX_MISSES):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.tracks = []
+        self.frame = 0
+        self._ids = itertools.count(1)
+
+    def update(self, regions):
+        """Advance one frame; returns the live track for each region, in the same order."""
+        self.frame += 1
+        pairs = sorted(
+            ((iou(t.box, (r.x, r.y, r.w, r.h)), ti, ri)
+             for ti, t in enumerate(self.tracks) for ri, r in enumerate(regions)),
+            reverse=True
+        )
+        assigned = {}
+        used_tracks = set()
+        for overlap, ti, ri in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if ti in used_tracks or ri in assigned:
+                continue
+            assigned[ri] = self.tracks[ti]
+            used_tracks.add(ti)
+
+        for ti, track in enumerate(self.tracks):
+            track.misses = 0 if ti in used_tracks else track.misses + 1
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+
+        result = []
+        for ri, region in enumerate(regions):
+            track = assigned.get(ri)
+            if track is None:
+                track = Track(next(self._ids), region, self.frame)
+                self.tracks.append(track)
+            track.region = region
+            result.append(track)
+        return result
+
+
+class RecognitionSession:
+    """
+    Per-connection state for a streaming camera.
+
+    process_frame() detects faces, embeds only the tracks that need it,
+    matches them in one batch and calls mark_attendance(person_id, confidence)
+    once per newly identified track. mark_attendance returns the attendance
+    dict (attendanceMarked / attendanceAlreadyMarked) to report for that face.
+    """
+
+    def __init__(self, inference, threshold, mark_attendance, describe, roster=None):
+        self.inference = inference
+        self.threshold = threshold
+        # student_ids of the class in the room, searched before the whole gallery
+        self.roster = roster
+        self.mark_attendance = mark_attendance
+        self.describe = describe
+        self.tracker = FaceTracker()
+        self.embedded_faces = 0
+        self.seen_faces = 0
+
+    def process_frame(self, image):
+        regions = self.inference.detect(image)
+        tracks = self.tracker.update(regions)
+        frame = self.tracker.frame
+        self.seen_faces += len(tracks)
+
+        pending = [i for i, t in enumerate(tracks) if t.needs_embedding(frame)]
+        if pending:
+            embeddings = self.inference.embed_regions(image, [regions[i] for i in pending])
+            # A student confirmed on another face in this frame can't also be one of the new faces
+            pending_set = set(pending)
+            held = [t.person_id for i, t in enumerate(tracks) if i not in pending_set and t.confirmed]
+            matches = self.inference.match_batch(embeddings, self.threshold, roster=self.roster, exclude=held)
+            for i, (person_id, confidence) in zip(pending, matches):
+                tracks[i].set_identity(person_id, confidence, frame)
+            self.embedded_faces += len(pending)
+
+        faces = []
+        for i, track in enumerate(tracks):
+            if track.person_id and track.attendance is None:
+                track.attendance = self.mark_attendance(track.person_id, track.confidence)
+            face = self.describe(track.person_id, track.confidence)
+            face.update(track.attendance or {'attendanceMarked': False, 'attendanceAlreadyMarked': False,
+                                            'attendanceQueued': False})
+            face['trackId'] = track.id
+            face['box'] = [int(v) for v in track.box]
+            face['embedded'] = i in pending
+            faces.append(face)
+
+        return {
+            'success': True,
+            'frame': frame,
+            'detectedFaces': faces,
+            'embeddedFaces': len(pending),
+        }
@@ -0,0 +1,155 @@
+"""
+Compact storage for large face galleries.
+
+In a quantized gallery (FACE_GALLERY_DTYPE=float16 or int8) only the coarse
+codes stay in RAM: int8 with one float32 scale per row, or float16. The exact
+float32 templates are written to an anonymous temp file and memory-mapped, so
+the kernel pages them in on demand and can drop them under memory pressure.
+Every query is scored against the codes, then only the top-k rows are
+re-scored exactly in float32.
+"""
+import os
+import tempfile
+
+import numpy as np
+
+GALLERY_DTYPE = os.environ.get('FACE_GALLERY_DTYPE', 'float32').lower()
+# Rows re-scored exactly per query; must cover a student's templates plus close look-alikes
+GALLERY_RERANK_K = int(os.environ.get('FACE_GALLERY_RERANK_K', '32'))
+GALLERY_SPILL_DIR = os.environ.get('FACE_GALLERY_SPILL_DIR', tempfile.gettempdir())
+
+QUANTIZED_DTYPES = ('float16', 'int8')
+
+# Coarse scoring dequantizes this many rows at a time to bound the float32 temporary
+_CHUNK_ROWS = 16384
+
+
+def quantize(matrix, kind):
+    """(codes, scales) for float32 rows; scales is None for float16."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if kind == 'float16':
+        return matrix.astype(np.float16), None
+    if kind == 'int8':
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.rint(matrix / scales[:, np.newaxis]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    raise ValueError(f"Unknown gallery dtype: {kind}")
+
+
+class QuantizedMatrix:
+    """Rows stored as float16, or as int8 with a per-row float32 scale."""
+
+    def __init__(self, codes, scales=None):
+        self.codes = codes
+        self.scales = scales
+
+    @classmethod
+    def from_float(cls, matrix, kind):
+        return cls(*quantize(matrix, kind))
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def scores(self, queries):
+        """Approximate (M, rows) similarities of float32 queries against every row."""
+        queries = np.asarray(queries, dtype=np.float32)
+        out = np.empty((len(queries), len(self.codes)), dtype=np.float32)
+        for start in range(0, len(self.codes), _CHUNK_ROWS):
+            block = self.codes[start:start + _CHUNK_ROWS].astype(np.float32)
+            part = queries @ block.T
+            if self.scales is not None:
+                part *= self.scales[start:start + _CHUNK_ROWS]
+            out[:, start:start + len(block)] = part
+        return out
+
+    def top_k(self, queries, k=GALLERY_RERANK_K):
+        """Sorted union of each query's k best rows by approximate score."""
+        scores = self.scores(queries)
+        if scores.shape[1] <= k:
+            return np.arange(scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        return np.unique(top)
+
+
+class GalleryWriter:
+    """
+    Accumulates normalized float32 template blocks into the gallery's storage.
+
+    float32: one in-RAM matrix, no coarse codes.
+    float16/int8: blocks are streamed to an anonymous memory-mapped file and
+    quantized one block at a time, so the full float32 matrix is never held in RAM.
+    """
+
+    def __init__(self, dim, kind=GALLERY_DTYPE, spill_dir=GALLERY_SPILL_DIR):
+        self.dim = dim
+        self.kind = kind if kind in QUANTIZED_DTYPES else 'float32'
+        self.rows = 0
+        self._blocks = []
+        self._codes = []
+        self._scales = []
+        self._file = tempfile.TemporaryFile(dir=spill_dir) if self.kind != 'float32' else None
+
+    def add(self, block):
+        block = np.ascontiguousarray(block, dtype=np.float32)
+        if not len(block):
+            return
+        self.rows += len(block)
+        if self._file is None:
+            self._blocks.append(block)
+            return
+        self._file.write(block.tobytes())
+        codes, scales = quantize(block, self.kind)
+        self._codes.append(codes)
+        if scales is not None:
+            self._scales.append(scales)
+
+    def finish(self):
+        """Return (matrix, coarse); matrix is float32 (in RAM or memory-mapped), coarse is None for float32."""
+        if self._file is None:
+            matrix = np.vstack(self._blocks) if self._blocks else np.zeros((0, self.dim), dtype=np.float32)
+            return np.ascontiguousarray(matrix, dtype=np.float32), None
+        coarse_dtype = np.float16 if self.kind == 'float16' else np.int8
+        codes = np.concatenate(self._codes) if self._codes else np.zeros((0, self.dim), dtype=coarse_dtype)
+        scales = None
+        if self.kind == 'int8':
+            scales = np.concatenate(self._scales) if self._scales else np.zeros(0, dtype=np.float32)
+        return self._map(self._file, self.rows, self.dim), QuantizedMatrix(codes, scales)
+
+    @staticmethod
+    def _map(file, rows, dim):
+        if rows == 0:
+            return np.zeros((0, dim), dtype=np.float32)
+        file.flush()
+        matrix = np.memmap(file, dtype=np.float32, mode='r', shape=(rows, dim))
+        # Appends reuse the same file; remember it on the mapping
+        matrix.spill_file = file
+        return matrix
+
+
+def append_rows(matrix, coarse, block):
+    """
+    New (matrix, coarse) with block appended; the inputs are left untouched.
+    A memory-mapped matrix grows its file in place, so existing rows are not rewritten.
+    """
+    block = np.ascontiguousarray(block, dtype=np.float32)
+    spill_file = getattr(matrix, 'spill_file', None)
+    if coarse is None:
+        return np.vstack([matrix, block]), None
+    codes, scales = quantize(block, 'int8' if coarse.scales is not None else 'float16')
+    coarse = QuantizedMatrix(
+        np.concatenate([coarse.codes, codes]),
+        np.concatenate([coarse.scales, scales]) if scales is not None else None
+    )
+    if spill_file is None:
+        # Quantized gallery that was empty so far: start its spill file
+        writer = GalleryWriter(block.shape[1], 'int8' if coarse.scales is not None else 'float16')
+        writer.add(block)
+        return writer.finish()[0], coarse
+    spill_file.seek(0, os.SEEK_END)
+    spill_file.write(block.tobytes())
+    return GalleryWriter._map(spill_file, len(matrix) + len(block), matrix.shape[1]), coarse
@@ -0,0 +1,71 @@
+import struct
+
+import cv2
+import numpy as np
+
+from metrics import REQUEST_STAGE_SECONDS
+
+# libjpeg can decode straight to 1/2, 1/4 or 1/8 scale, never materializing the full-size bitmap
+_REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _jpeg_size(buf):
+    """(width, height) from a JPEG's SOF segment, without decoding it."""
+    pos = 2
+    while pos + 9 < len(buf):
+        if buf[pos] != 0xFF:
+            return None
+        marker = buf[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        (length,) = struct.unpack_from('>H', buf, pos + 2)
+        if marker in _JPEG_SOF_MARKERS:
+            height, width = struct.unpack_from('>HH', buf, pos + 5)
+            return width, height
+        pos += 2 + length
+    return None
+
+
+def image_size(buf):
+    """(width, height) read from the JPEG/PNG header, or None for other formats."""
+    if buf[:2] == b'\xff\xd8':
+        return _jpeg_size(buf)
+    if buf[:8] == b'\x89PNG\r\n\x1a\n' and len(buf) >= 24:
+        return struct.unpack_from('>II', buf, 16)
+    return None
+
+
+def decode_image(buf, max_dim):
+    """
+    Decode image bytes to a BGR array no larger than max_dim on its long side.
+    Large JPEGs are decoded at a reduced scale first, so the full-resolution
+    bitmap is never allocated. Returns None if the bytes aren't an image.
+    """
+    nparr = np.frombuffer(buf, np.uint8)
+    flag = cv2.IMREAD_COLOR
+    size = image_size(buf)
+    if size is not None and buf[:2] == b'\xff\xd8':
+        long_side = max(size)
+        for factor, reduced_flag in _REDUCED_FLAGS:
+            # Keep at least max_dim pixels so the final INTER_AREA resize still has detail to work with
+            if long_side // factor >= max_dim:
+                flag = reduced_flag
+                break
+
+    with REQUEST_STAGE_SECONDS.time(stage='imdecode'):
+        image = cv2.imdecode(nparr, flag)
+    if image is None:
+        return None
+
+    h, w = image.shape[:2]
+    if max(h, w) > max_dim:
+        scale = max_dim / max(h, w)
+        with REQUEST_STAGE_SECONDS.time(stage='resize'):
+            image = cv2.resize(image, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+    return image
@@ -0,0 +1,569 @@
+"""
+Inference sidecar: one process owns the Facenet model and the face gallery.
+
+Gunicorn workers talk to it over a Unix domain socket instead of each
+importing TensorFlow and loading their own copy of the weights.
+
+Run it next to the web app (from the Backend directory):
+    python inference_service.py --supervise --socket /tmp/praesentix-inference.sock
+and point the workers at it with INFERENCE_SOCKET=/tmp/praesentix-inference.sock.
+Without INFERENCE_SOCKET the app runs inference in-process, as before.
+--supervise runs the service as a child process and restarts it if it exits
+(a crash, or the OOM killer); without it the service runs in the foreground.
+
+The socket is bound before the model loads, so workers can connect at once:
+PING answers "loading" until the model and gallery are ready, and every other
+op waits for them.
+
+Wire protocol (all integers little-endian), one request/response at a time
+per connection, connections are kept open and reused:
+    request:  op (u8) | payload length (u32) | payload
+    response: status (u8, 0 = ok) | payload length (u32) | payload (error text if status != 0)
+
+Building blocks:
+    image    u16 h, u16 w, u8 channels, uint8 BGR pixels[h * w * channels]
+    vectors  u16 count, u16 dim, float32[count * dim]
+    strings  u16 count, then per string: u16 length, utf-8 bytes
+    regions  u16 faces, then per face: i32 x, y, w, h, left eye x, y, right eye x, y (-1 = none),
+             f32 confidence (NaN = none)
+
+Ops (op code in brackets):
+    EMBED [1]          image -> vectors (one per detected face)
+    MATCH [2]          f32 threshold, vectors (the faces), strings (roster student_ids; count 0 = no roster),
+                       optionally strings (person_ids held by other faces, never assigned)
+                       -> per face: f32 confidence, u16 id length (0xFFFF = no match), utf-8 person_id
+    UPSERT [3]         u16 id length, utf-8 person_id, vectors (the person's templates) -> empty
+    SIZE [4]           empty -> u32 gallery size
+    PING [5]           empty -> utf-8 state ("loading" or "ready")
+    DETECT [6]         image -> regions
+    EMBED_REGIONS [7]  regions, image -> vectors (one per region)
+    STATS [8]          empty -> utf-8 JSON (stage timings, cache counters, gallery size)
+    EMBED_MANY [9]     u16 images, then per image: u32 size, image
+                       -> u16 images, u8 has_face[images], vectors (first face of each image that has one)
+    METRICS [10]       empty -> utf-8 Prometheus text of the sidecar's metrics
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+
+import numpy as np
+
+import metrics
+from logging_config import configure_logging
+
+logger = logging.getLogger(__name__)
+
+OP_EMBED = 1
+OP_MATCH = 2
+OP_UPSERT = 3
+OP_SIZE = 4
+OP_PING = 5
+OP_DETECT = 6
+OP_EMBED_REGIONS = 7
+OP_STATS = 8
+OP_EMBED_MANY = 9
+OP_METRICS = 10
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+FRAME = struct.Struct('<BI')
+IMAGE_HEADER = struct.Struct('<HHB')
+VECTORS_HEADER = struct.Struct('<HH')
+REGION = struct.Struct('<8if')
+U16 = struct.Struct('<H')
+U32 = struct.Struct('<I')
+F32 = struct.Struct('<f')
+NO_MATCH = 0xFFFF
+
+INFERENCE_SOCKET = os.environ.get('INFERENCE_SOCKET', '')
+DEFAULT_SOCKET = '/tmp/praesentix-inference.sock'
+# How long a worker keeps retrying while the sidecar is still starting up
+CONNECT_TIMEOUT_SECONDS = float(os.environ.get('INFERENCE_CONNECT_TIMEOUT', '30'))
+# How long warm_up() waits for a sidecar that is up but still loading the model and gallery
+WARMUP_TIMEOUT_SECONDS = float(os.environ.get('INFERENCE_WARMUP_TIMEOUT', '600'))
+# Supervisor backoff between restarts; reset once a child stays up for RESTART_RESET_SECONDS
+RESTART_BACKOFF_MAX_SECONDS = 30.0
+RESTART_RESET_SECONDS = 60.0
+
+LOADING = 'loading'
+READY = 'ready'
+
+
+class InferenceError(Exception):
+    """The inference service could not be reached or reported a failure."""
+
+
+def _recv_exact(sock, size):
+    buf = bytearray(size)
+    view = memoryview(buf)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:], size - received)
+        if n == 0:
+            raise ConnectionError("Inference socket closed")
+        received += n
+    return buf
+
+
+def _send_frame(sock, code, *parts):
+    length = sum(len(p) for p in parts)
+    sock.sendall(FRAME.pack(code, length))
+    for part in parts:
+        sock.sendall(part)
+
+
+def _recv_frame(sock):
+    code, length = FRAME.unpack(_recv_exact(sock, FRAME.size))
+    return code, _recv_exact(sock, length) if length else bytearray()
+
+
+def _pack_vectors(encodings):
+    matrix = np.ascontiguousarray(np.asarray(encodings, dtype='<f4').reshape(len(encodings), -1))
+    return VECTORS_HEADER.pack(*matrix.shape), matrix.tobytes()
+
+
+def _unpack_vectors(payload, offset=0):
+    count, dim = VECTORS_HEADER.unpack_from(payload, offset)
+    matrix = np.frombuffer(payload, dtype='<f4', count=count * dim, offset=offset + VECTORS_HEADER.size)
+    return matrix.reshape(count, dim)
+
+
+def _pack_image(image):
+    image = np.ascontiguousarray(image, dtype=np.uint8)
+    channels = image.shape[2] if image.ndim == 3 else 1
+    return IMAGE_HEADER.pack(image.shape[0], image.shape[1], channels), image.data.cast('B')
+
+
+def _unpack_image(payload):
+    h, w, channels = IMAGE_HEADER.unpack_from(payload, 0)
+    image = np.frombuffer(payload, dtype=np.uint8, count=h * w * channels, offset=IMAGE_HEADER.size)
+    return image.reshape((h, w, channels) if channels > 1 else (h, w))
+
+
+def _pack_strings(values):
+    parts = [U16.pack(len(values))]
+    for value in values:
+        data = str(value).encode('utf-8')
+        parts.append(U16.pack(len(data)) + data)
+    return b''.join(parts)
+
+
+def _unpack_strings(payload, offset=0):
+    (count,) = U16.unpack_from(payload, offset)
+    offset += U16.size
+    values = []
+    for _ in range(count):
+        (length,) = U16.unpack_from(payload, offset)
+        offset += U16.size
+        values.append(bytes(payload[offset:offset + length]).decode('utf-8'))
+        offset += length
+    return values, offset
+
+
+def _pack_regions(regions):
+    parts = [U16.pack(len(regions))]
+    for r in regions:
+        left = r.left_eye if r.left_eye is not None else (-1, -1)
+        right = r.right_eye if r.right_eye is not None else (-1, -1)
+        confidence = r.confidence if r.confidence is not None else float('nan')
+        parts.append(REGION.pack(int(r.x), int(r.y), int(r.w), int(r.h),
+                                 int(left[0]), int(left[1]), int(right[0]), int(right[1]), confidence))
+    return b''.join(parts)
+
+
+def _unpack_regions(payload, offset=0):
+    from face_pipeline import FaceRegion
+
+    (count,) = U16.unpack_from(payload, offset)
+    offset += U16.size
+    regions = []
+    for _ in range(count):
+        x, y, w, h, lx, ly, rx, ry, confidence = REGION.unpack_from(payload, offset)
+        offset += REGION.size
+        left = (lx, ly) if lx >= 0 else None
+        right = (rx, ry) if rx >= 0 else None
+        regions.append(FaceRegion(x, y, w, h, left, right, None if confidence != confidence else confidence))
+    return regions, offset
+
+
+class LocalInference:
+    """In-process inference: loads DeepFace/TensorFlow into this process."""
+
+    def __init__(self):
+        import recognition
+        from face_gallery import get_gallery
+
+        self._recognition = recognition
+        self.gallery = get_gallery()
+        self.model_name = recognition.MODEL_NAME
+
+    def _session(self, db):
+        if db is not None:
+            return db, False
+        from neon_db import SessionLocal
+        return SessionLocal(), True
+
+    def warm_up(self):
+        self._recognition.warm_up()
+
+    def embed(self, image):
+        return self._recognition.get_face_encodings_from_image(image)
+
+    def detect(self, image):
+        return self._recognition.get_pipeline().detect(image)
+
+    def embed_regions(self, image, regions):
+        pipeline = self._recognition.get_pipeline()
+        return pipeline.embed(pipeline.align(image, regions))
+
+    def embed_many(self, images):
+        """Encodings of the first face in each image (None where no face), embedded in one batch."""
+        return self._recognition.get_first_face_encodings(images)
+
+    def match_batch(self, encodings, threshold, db=None, roster=None, exclude=None):
+        db, should_close = self._session(db)
+        try:
+            self.gallery.ensure_fresh(db)
+        finally:
+            if should_close:
+                db.close()
+        with metrics.INFERENCE_STAGE_SECONDS.time(stage='match'):
+            return self.gallery.match_batch(encodings, threshold, roster=roster, exclude=exclude)
+
+    def upsert(self, person_id, encoding, db=None):
+        db, should_close = self._session(db)
+        try:
+            self.gallery.upsert(person_id, encoding, db=db)
+        finally:
+            if should_close:
+                db.close()
+
+    def gallery_size(self):
+        return len(self.gallery)
+
+    def stats(self):
+        """Per-stage timings and embedding-cache counters of the loaded pipeline."""
+        pipeline = self._recognition.get_pipeline()
+        return {
+            'stages': pipeline.timings.summary(),
+            'embeddingCache': pipeline.cache.stats() if pipeline.cache is not None else None,
+            'gallerySize': len(self.gallery),
+        }
+
+    def metrics_text(self):
+        """Nothing extra: in-process inference records into this process's registry."""
+        return ''
+
+
+class InferenceClient:
+    """Thin client used by gunicorn workers when INFERENCE_SOCKET is set."""
+
+    def __init__(self, socket_path, connect_timeout=CONNECT_TIMEOUT_SECONDS, warmup_timeout=WARMUP_TIMEOUT_SECONDS):
+        self.socket_path = socket_path
+        self.connect_timeout = connect_timeout
+        self.warmup_timeout = warmup_timeout
+        self.model_name = 'Facenet'
+        # One persistent connection per thread (gunicorn gthread workers share the client)
+        self._local = threading.local()
+
+    def _connect(self):
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.socket_path)
+                return sock
+            except OSError as e:
+                sock.close()
+                if time.monotonic() >= deadline:
+                    raise InferenceError(f"Inference service unavailable at {self.socket_path}: {e}")
+                time.sleep(0.2)
+
+    def _call(self, op, *parts):
+        # Retry once on a fresh connection in case the service was restarted
+        for attempt in range(2):
+            sock = getattr(self._local, 'sock', None)
+            try:
+                if sock is None:
+                    sock = self._local.sock = self._connect()
+                _send_frame(sock, op, *parts)
+                status, payload = _recv_frame(sock)
+                break
+            except (ConnectionError, OSError) as e:
+                if sock is not None:
+                    sock.close()
+                self._local.sock = None
+                if attempt:
+                    raise InferenceError(f"Inference service connection failed: {e}")
+        if status != STATUS_OK:
+            raise InferenceError(bytes(payload).decode('utf-8', 'replace'))
+        return payload
+
+    def warm_up(self):
+        """Wait until the sidecar reports it has loaded the model and gallery."""
+        deadline = time.monotonic() + self.warmup_timeout
+        while bytes(self._call(OP_PING)).decode('utf-8') == LOADING:
+            if time.monotonic() >= deadline:
+                raise InferenceError(f"Inference service still loading after {self.warmup_timeout:.0f}s")
+            time.sleep(0.5)
+
+    def embed(self, image):
+        payload = self._call(OP_EMBED, *_pack_image(image))
+        return list(_unpack_vectors(payload))
+
+    def detect(self, image):
+        payload = self._call(OP_DETECT, *_pack_image(image))
+        return _unpack_regions(payload)[0]
+
+    def embed_regions(self, image, regions):
+        if not regions:
+            return []
+        payload = self._call(OP_EMBED_REGIONS, _pack_regions(regions), *_pack_image(image))
+        return list(_unpack_vectors(payload))
+
+    def match_batch(self, encodings, threshold, db=None, roster=None, exclude=None):
+        if not len(encodings):
+            return []
+        header, data = _pack_vectors(encodings)
+        payload = self._call(OP_MATCH, F32.pack(threshold), header, data, _pack_strings(roster or ()),
+                             _pack_strings(exclude or ()))
+        results = []
+        offset = 0
+        for _ in range(len(encodings)):
+            (confidence,) = F32.unpack_from(payload, offset)
+            (length,) = U16.unpack_from(payload, offset + F32.size)
+            offset += F32.size + U16.size
+            if length == NO_MATCH:
+                results.append((None, confidence))
+            else:
+                results.append((bytes(payload[offset:offset + length]).decode('utf-8'), confidence))
+                offset += length
+        return results
+
+    def embed_many(self, images):
+        if not images:
+            return []
+        parts = [U16.pack(len(images))]
+        for image in images:
+            header, data = _pack_image(image)
+            parts.extend((U32.pack(len(header) + len(data)), header, data))
+        payload = self._call(OP_EMBED_MANY, *parts)
+        (count,) = U16.unpack_from(payload, 0)
+        found = np.frombuffer(payload, dtype=np.uint8, count=count, offset=U16.size)
+        vectors = iter(_unpack_vectors(payload, U16.size + count))
+        return [next(vectors) if has_face else None for has_face in found]
+
+    def upsert(self, person_id, encodings, db=None):
+        pid = person_id.encode('utf-8')
+        templates = np.asarray(encodings, dtype='<f4')
+        if templates.ndim == 1:
+            templates = templates[np.newaxis, :]
+        self._call(OP_UPSERT, U16.pack(len(pid)), pid, *_pack_vectors(templates))
+
+    def gallery_size(self):
+        return U32.unpack(self._call(OP_SIZE))[0]
+
+    def stats(self):
+        return json.loads(bytes(self._call(OP_STATS)).decode('utf-8'))
+
+    def metrics_text(self):
+        """The sidecar's own metrics (pipeline stages, gallery), in Prometheus text format."""
+        return bytes(self._call(OP_METRICS)).decode('utf-8')
+
+
+_inference = None
+_inference_lock = threading.Lock()
+
+
+def get_inference():
+    """Sidecar client if INFERENCE_SOCKET is set, otherwise in-process inference."""
+    global _inference
+    if _inference is None:
+        with _inference_lock:
+            if _inference is None:
+                _inference = InferenceClient(INFERENCE_SOCKET) if INFERENCE_SOCKET else LocalInference()
+    return _inference
+
+
+# ===== Service side =====
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        service = self.server.inference
+        while True:
+            try:
+                op, payload = _recv_frame(self.request)
+            except ConnectionError:
+                return
+            try:
+                reply = self._dispatch(service, op, payload)
+                _send_frame(self.request, STATUS_OK, *reply)
+            except Exception as e:
+                logger.exception("Inference op %d failed", op)
+                _send_frame(self.request, STATUS_ERROR, str(e).encode('utf-8'))
+
+    def _dispatch(self, service, op, payload):
+        if op == OP_PING:
+            if self.server.startup_error is not None:
+                raise InferenceError(self.server.startup_error)
+            return ((READY if self.server.ready.is_set() else LOADING).encode('utf-8'),)
+        # Anything but PING waits for the model and gallery to finish loading
+        self.server.ready.wait()
+        if self.server.startup_error is not None:
+            raise InferenceError(self.server.startup_error)
+        if op == OP_EMBED:
+            image = _unpack_image(payload)
+            # Concurrent EMBEDs from different workers are coalesced by recognition's micro-batcher
+            encodings = service.embed(image)
+            if not encodings:
+                return (VECTORS_HEADER.pack(0, 0),)
+            return _pack_vectors(encodings)
+        if op == OP_MATCH:
+            (threshold,) = F32.unpack_from(payload, 0)
+            encodings = _unpack_vectors(payload, F32.size)
+            offset = F32.size + VECTORS_HEADER.size + encodings.nbytes
+            roster, exclude = None, None
+            if offset < len(payload):
+                roster, offset = _unpack_strings(payload, offset)
+            if offset < len(payload):
+                exclude, offset = _unpack_strings(payload, offset)
+            parts = []
+            for person_id, confidence in service.match_batch(list(encodings), threshold, roster=roster,
+                                                             exclude=exclude):
+                if person_id is None:
+                    parts.append(F32.pack(confidence) + U16.pack(NO_MATCH))
+                else:
+                    pid = person_id.encode('utf-8')
+                    parts.append(F32.pack(confidence) + U16.pack(len(pid)) + pid)
+            return (b''.join(parts),)
+        if op == OP_UPSERT:
+            (length,) = U16.unpack_from(payload, 0)
+            person_id = bytes(payload[U16.size:U16.size + length]).decode('utf-8')
+            service.upsert(person_id, _unpack_vectors(payload, U16.size + length))
+            return ()
+        if op == OP_SIZE:
+            return (U32.pack(service.gallery_size()),)
+        if op == OP_EMBED_MANY:
+            (count,) = U16.unpack_from(payload, 0)
+            offset = U16.size
+            images = []
+            for _ in range(count):
+                (size,) = U32.unpack_from(payload, offset)
+                offset += U32.size
+                images.append(_unpack_image(memoryview(payload)[offset:offset + size]))
+                offset += size
+            encodings = service.embed_many(images)
+            found = bytes(encoding is not None for encoding in encodings)
+            vectors = [encoding for encoding in encodings if encoding is not None]
+            if not vectors:
+                return U16.pack(count), found, VECTORS_HEADER.pack(0, 0)
+            return (U16.pack(count), found) + _pack_vectors(vectors)
+        if op == OP_METRICS:
+            return (metrics.render().encode('utf-8'),)
+        if op == OP_STATS:
+            return (json.dumps(service.stats()).encode('utf-8'),)
+        if op == OP_DETECT:
+            return (_pack_regions(service.detect(_unpack_image(payload))),)
+        if op == OP_EMBED_REGIONS:
+            regions, offset = _unpack_regions(payload)
+            encodings = service.embed_regions(_unpack_image(memoryview(payload)[offset:]), regions)
+            if not encodings:
+                return (VECTORS_HEADER.pack(0, 0),)
+            return _pack_vectors(encodings)
+        raise ValueError(f"Unknown op {op}")
+
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, inference):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        self.inference = inference
+        self.ready = threading.Event()
+        self.startup_error = None
+        super().__init__(socket_path, _Handler)
+
+
+def _load(server):
+    """Load the model and gallery behind an already-listening socket; on failure, stop the server."""
+    inference = server.inference
+    try:
+        logger.info("Inference service: loading model...")
+        inference.warm_up()
+        from neon_db import SessionLocal
+        db = SessionLocal()
+        try:
+            inference.gallery.ensure_fresh(db)
+        finally:
+            db.close()
+    except Exception as e:
+        logger.exception("Inference service failed to load")
+        server.startup_error = f"Inference service failed to load: {e}"
+        server.ready.set()
+        server.shutdown()
+        return
+    server.ready.set()
+    logger.info("Inference service ready (%d faces)", inference.gallery_size())
+
+
+def serve(socket_path):
+    configure_logging()
+    server = InferenceServer(socket_path, LocalInference())
+    logger.info("Inference service listening on %s", socket_path)
+    threading.Thread(target=_load, args=(server,), name='inference-load', daemon=True).start()
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+    return 1 if server.startup_error is not None else 0
+
+
+def supervise(socket_path):
+    """Run serve() in a child process and restart it whenever it exits, with backoff."""
+    import signal
+    import subprocess
+
+    configure_logging()
+    stopping = False
+    child = None
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        if child is not None and child.poll() is None:
+            child.send_signal(signum)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    backoff = 1.0
+    while not stopping:
+        started = time.monotonic()
+        child = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--socket', socket_path])
+        code = child.wait()
+        if stopping:
+            break
+        if time.monotonic() - started >= RESTART_RESET_SECONDS:
+            backoff = 1.0
+        logger.error("Inference service exited with code %s; restarting in %.0fs", code, backoff)
+        time.sleep(backoff)
+        backoff = min(backoff * 2, RESTART_BACKOFF_MAX_SECONDS)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Praesentix inference sidecar")
+    parser.add_argument('--socket', default=INFERENCE_SOCKET or DEFAULT_SOCKET)
+    parser.add_argument('--supervise', action='store_true', help="restart the service whenever it exits")
+    args = parser.parse_args()
+    sys.exit(supervise(args.socket) if args.supervise else serve(args.socket))
@@ -0,0 +1,264 @@
+"""
+Bulk-load a school's face gallery from a directory of per-student folders.
+
+    <root>/
+        123 - Jane Doe/      -> person_id "ID-123 - Jane Doe"
+            front.jpg
+            left.jpg
+        Ravi Kumar/          -> person_id "Ravi Kumar"
+            ...
+
+Every folder is embedded with the same Facenet pipeline as app.py
+(centroid plus per-photo templates, like /api/enroll-face) by a pool of
+worker processes. Results are upserted into face_encodings in batches,
+and each committed folder is recorded in a checkpoint file, so an
+interrupted run resumes where it stopped. Unreadable photos are skipped,
+and a folder that fails as a whole is reported at the end without stopping
+the run. Failed folders aren't checkpointed, so the next run retries them.
+Folders that map to the same person_id ("123 - Jane Doe" and "123_Jane Doe")
+are stored once, from the folder with the most faces, with a warning.
+
+Usage (from the Backend directory):
+    python ingest_gallery.py <root> [--workers 2] [--batch-size 200] [--checkpoint FILE] [--restart]
+"""
+import argparse
+import multiprocessing
+import os
+import re
+import sys
+import time
+from datetime import datetime
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+# Same working resolution as /api/enroll-face
+INGEST_MAX_DIM = 640
+# "123 - Jane Doe" / "123_Jane Doe" folders become the app's "ID-123 - Jane Doe" person_id
+_ID_FOLDER = re.compile(r'^(?:ID-)?(\d+)\s*[-_]\s*(.+)$')
+
+
+def person_id_for_folder(folder):
+    match = _ID_FOLDER.match(folder)
+    if match:
+        return f"ID-{match.group(1)} - {match.group(2).strip()}"
+    return folder
+
+
+def list_students(root):
+    """(folder name, [image paths]) for every student folder under root, in name order."""
+    students = []
+    for folder in sorted(os.listdir(root)):
+        path = os.path.join(root, folder)
+        if not os.path.isdir(path):
+            continue
+        images = [os.path.join(path, f) for f in sorted(os.listdir(path)) if f.lower().endswith(IMAGE_EXTENSIONS)]
+        if images:
+            students.append((folder, images))
+    return students
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding='utf-8') as f:
+        return {line.rstrip('\n') for line in f if line.strip()}
+
+
+def append_checkpoint(path, folders):
+    with open(path, 'a', encoding='utf-8') as f:
+        f.writelines(f"{folder}\n" for folder in folders)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+# ===== Worker processes =====
+
+def _init_worker():
+    # One process = one model copy; batching across threads and the crop cache don't help here
+    os.environ['FACE_BATCH_MAX_WAIT_MS'] = '0'
+    os.environ['EMBED_CACHE_MAX_MB'] = '0'
+    os.environ['ENROLL_WORKERS'] = '1'
+    import recognition
+    recognition.warm_up()
+
+
+def embed_student(task):
+    """
+    Worker: (folder, image paths) -> (folder, templates or None, images read,
+    faces found, unreadable image paths, error or None).
+    """
+    import recognition
+    from image_io import decode_image
+    from face_gallery import build_templates
+
+    folder, paths = task
+    images = []
+    unreadable = []
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                image = decode_image(f.read(), max_dim=INGEST_MAX_DIM)
+        except Exception:
+            image = None
+        if image is None:
+            unreadable.append(path)
+        else:
+            images.append(image)
+    try:
+        encodings = [e for e in recognition.get_first_face_encodings(images) if e is not None] if images else []
+        templates = build_templates(encodings) if encodings else None
+    except Exception as e:
+        return folder, None, len(images), 0, unreadable, f"{type(e).__name__}: {e}"
+    return folder, templates, len(images), len(encodings), unreadable, None
+
+
+# ===== Database =====
+
+def upsert_encodings(db, rows):
+    """INSERT ... ON CONFLICT (person_id) DO UPDATE for a batch of face_encodings rows, one statement."""
+    from neon_db import engine
+    from models import FaceEncoding
+
+    if engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    stmt = insert(FaceEncoding).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[FaceEncoding.person_id],
+        set_={
+            'embedding': stmt.excluded.embedding,
+            'encoding_data': None,
+            'num_images': stmt.excluded.num_images,
+            'updated_at': stmt.excluded.updated_at,
+        }
+    )
+    db.execute(stmt)
+    db.commit()
+
+
+def ingest(root, workers=2, batch_size=200, checkpoint=None, restart=False):
+    from neon_db import SessionLocal
+    from embedding_codec import encode_embedding
+
+    if not os.path.isdir(root):
+        print(f"❌ Not a directory: {root}")
+        return False
+
+    checkpoint = checkpoint or os.path.join(root, '.ingest_checkpoint')
+    if restart and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    done = load_checkpoint(checkpoint)
+    students = [s for s in list_students(root) if s[0] not in done]
+    total_images = sum(len(paths) for _, paths in students)
+    print(f"Ingesting {len(students)} students ({total_images} images) from {root}"
+          + (f", skipping {len(done)} already done" if done else ""))
+    if not students:
+        print("✅ Nothing to do")
+        return True
+
+    db = SessionLocal()
+    # Keyed by person_id: one upsert statement can't touch the same row twice
+    pending_rows = {}
+    pending_folders = []
+    # person_id -> (folder, faces) of the folder stored for it this run
+    claimed = {}
+    stored_ids = set()
+    images_done = faces_found = 0
+    no_face = []
+    collisions = []
+    failed = []
+    unreadable = []
+    started = time.perf_counter()
+
+    def flush():
+        if pending_rows:
+            upsert_encodings(db, list(pending_rows.values()))
+            stored_ids.update(pending_rows)
+        # Folders without a usable face are checkpointed too, so a resume doesn't retry them forever
+        append_checkpoint(checkpoint, pending_folders)
+        pending_rows.clear()
+        pending_folders.clear()
+
+    # spawn: every worker imports TensorFlow fresh instead of inheriting a forked parent
+    context = multiprocessing.get_context('spawn')
+    try:
+        with context.Pool(processes=workers, initializer=_init_worker) as pool:
+            for folder, templates, num_images, num_faces, bad_images, error in \
+                    pool.imap_unordered(embed_student, students):
+                images_done += num_images
+                faces_found += num_faces
+                unreadable.extend(bad_images)
+                if error is not None:
+                    # Not checkpointed: the next run tries the folder again
+                    failed.append((folder, error))
+                    continue
+                pending_folders.append(folder)
+                if templates is None:
+                    no_face.append(folder)
+                else:
+                    person_id = person_id_for_folder(folder)
+                    previous = claimed.get(person_id)
+                    if previous is not None:
+                        # Keep the folder with more faces; on a tie, the later one
+                        kept, dropped = ((folder, previous[0]) if num_faces >= previous[1]
+                                         else (previous[0], folder))
+                        collisions.append((person_id, kept, dropped))
+                    if previous is None or num_faces >= previous[1]:
+                        claimed[person_id] = (folder, num_faces)
+                        now = datetime.utcnow()
+                        pending_rows[person_id] = {
+                            'person_id': person_id,
+                            'embedding': encode_embedding(templates),
+                            'encoding_data': None,
+                            'num_images': num_faces,
+                            'created_at': now,
+                            'updated_at': now,
+                        }
+                if len(pending_folders) >= batch_size:
+                    flush()
+                    elapsed = time.perf_counter() - started
+                    print(f"  {len(stored_ids)} students stored, {images_done}/{total_images} images "
+                          f"({images_done / elapsed:.1f} images/sec)", flush=True)
+            flush()
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Ingest failed: {e} (re-run to resume from {checkpoint})")
+        return False
+    finally:
+        db.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ Stored {len(stored_ids)} students from {images_done} images ({faces_found} faces) in {elapsed:.1f}s "
+          f"-> {images_done / elapsed:.1f} images/sec, {len(students) / elapsed:.2f} students/sec")
+    for folder in no_face:
+        print(f" ⚠️ No face found for {folder}")
+    for path in unreadable:
+        print(f" ⚠️ Could not read {path}")
+    for person_id, kept, dropped in collisions:
+        print(f" ⚠️ {dropped} and {kept} are both {person_id}; stored {kept}")
+    for folder, error in failed:
+        print(f" ❌ Failed {folder}: {error}")
+    if failed:
+        print(f"{len(failed)} folders failed and will be retried on the next run")
+    print("Running workers pick the new faces up on their next gallery refresh; "
+          "rebuild the ANN index (python ann_index.py build) if FACE_ANN_INDEX=ivf")
+    return not failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk face gallery ingest")
+    parser.add_argument('root', help="Directory with one sub-folder of photos per student")
+    parser.add_argument('--workers', type=int, default=2,
+                        help="Embedding processes (each loads its own Facenet copy, ~300MB)")
+    parser.add_argument('--batch-size', type=int, default=200, help="Students per upsert/checkpoint")
+    parser.add_argument('--checkpoint', default=None, help="Progress file (default: <root>/.ingest_checkpoint)")
+    parser.add_argument('--restart', action='store_true', help="Ignore the checkpoint and ingest everything")
+    args = parser.parse_args(argv)
+    ok = ingest(args.root, workers=args.workers, batch_size=args.batch_size,
+                checkpoint=args.checkpoint, restart=args.restart)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
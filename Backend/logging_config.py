@@ -0,0 +1,175 @@
+"""
+Logging for the web app and the inference sidecar.
+
+Request threads only put records on a bounded queue; one background thread
+formats whatever has accumulated and writes it to stdout in a single write
+and flush. A slow log pipe therefore never stalls a request, and when the
+queue is full, records are dropped and counted instead of blocking. Modules
+log with logging.getLogger(__name__) and %-style arguments, so filtered-out
+DEBUG lines cost almost nothing.
+
+    LOG_LEVEL=INFO                         root level (keep DEBUG off in production)
+    LOG_LEVELS=face_gallery=DEBUG,app=WARNING  per-module overrides
+    LOG_REQUEST_SAMPLE_RATE=1.0            fraction of requests whose DEBUG/INFO lines are kept
+                                           (warnings and errors are always logged)
+    LOG_FORMAT=text|json
+    LOG_QUEUE_SIZE=10000
+"""
+import atexit
+import contextvars
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+
+from metrics import LOG_RECORDS_DROPPED
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_LEVELS = os.environ.get('LOG_LEVELS', '')
+LOG_REQUEST_SAMPLE_RATE = float(os.environ.get('LOG_REQUEST_SAMPLE_RATE', '1.0'))
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text').lower()
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+
+_request_id = contextvars.ContextVar('log_request_id', default='-')
+_request_sampled = contextvars.ContextVar('log_request_sampled', default=True)
+_request_ids = itertools.count(1)
+_writer = None
+# Most records formatted and written per write()/flush()
+_WRITE_BATCH = 512
+
+
+def start_request_logging():
+    """Tag the current request with an id and decide whether its DEBUG/INFO lines are sampled in."""
+    request_id = f"{os.getpid():x}-{next(_request_ids):x}"
+    _request_id.set(request_id)
+    _request_sampled.set(LOG_REQUEST_SAMPLE_RATE >= 1.0 or random.random() < LOG_REQUEST_SAMPLE_RATE)
+    return request_id
+
+
+class _RequestContextFilter(logging.Filter):
+    """Adds request_id to every record; drops sub-WARNING records of requests not sampled in."""
+
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        return record.levelno >= logging.WARNING or _request_sampled.get()
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the caller: past max_size queued records, new ones are dropped and counted."""
+
+    def __init__(self, log_queue, max_size):
+        super().__init__(log_queue)
+        self.max_size = max_size
+
+    def prepare(self, record):
+        # The queue stays in this process, so the record can travel as-is and
+        # the message is formatted by the writer thread, not the request thread
+        return record
+
+    def enqueue(self, record):
+        if self.queue.qsize() >= self.max_size:
+            LOG_RECORDS_DROPPED.inc()
+            return
+        self.queue.put(record)
+
+
+class _LogWriter:
+    """Background thread: drains the queue in batches, one write and flush per batch."""
+
+    _STOP = object()
+
+    def __init__(self, log_queue, stream, formatter):
+        self.queue = log_queue
+        self.stream = stream
+        self.formatter = formatter
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """Write out what is queued (called at exit)."""
+        self.queue.put(self._STOP)
+        self._thread.join(timeout=5)
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < _WRITE_BATCH:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(record is self._STOP for record in batch)
+            lines = []
+            for record in batch:
+                if record is self._STOP:
+                    continue
+                try:
+                    lines.append(self.formatter.format(record))
+                except Exception:
+                    lines.append(f"Unformattable log record from {record.name}: {record.msg!r}")
+            if lines:
+                try:
+                    self.stream.write('\n'.join(lines) + '\n')
+                    self.stream.flush()
+                except (OSError, ValueError):
+                    pass  # stdout closed; nothing sensible left to do with log lines
+            if stop:
+                return
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'requestId': getattr(record, 'request_id', '-'),
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+def _parse_levels(spec):
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, level = item.partition('=')
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging():
+    """Route all logging through the queue and its writer thread (idempotent)."""
+    global _writer
+    if _writer is not None:
+        return
+
+    if LOG_FORMAT == 'json':
+        formatter = _JsonFormatter()
+    else:
+        formatter = logging.Formatter('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s')
+
+    handler = _DroppingQueueHandler(queue.SimpleQueue(), LOG_QUEUE_SIZE)
+    handler.addFilter(_RequestContextFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    # werkzeug's per-request access lines duplicate our own request logging
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    for name, level in _parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _writer = _LogWriter(handler.queue, sys.stdout, formatter)
+    _writer.start()
+    atexit.register(_writer.stop)
@@ -0,0 +1,123 @@
+"""
+Process-local index of attendance already marked, by date and period.
+
+During a period the same students are recognized frame after frame. Once a
+(student_id, date, period) is known to be marked, repeats are answered from
+here without a database query (or a journal write). The index only holds
+positive knowledge: a miss falls through to the database, which stays the
+arbiter between workers, so the index can be incomplete but never wrong.
+
+Today's marks are loaded from the attendance table in a background thread,
+once per process and day. Only the MARKED_INDEX_DAYS most recent dates are
+kept, so memory stays bounded to a couple of school days. Marks for an older
+date (a teacher back-filling last week) are written normally but not
+indexed, so they never push out the current days. Dates that aren't
+YYYY-MM-DD are not indexed either.
+
+Nothing removes entries when attendance rows are deleted behind the app's
+back (by SQL or a cleanup script). Until the date rolls out of the window or
+the workers restart, those students are still answered "already marked".
+Restart the app after deleting attendance for the current days.
+
+    MARKED_INDEX_DAYS=2   (0 disables the index)
+"""
+import logging
+import os
+import threading
+from datetime import datetime
+
+from metrics import MARKED_INDEX_LOOKUPS
+
+MARKED_INDEX_DAYS = int(os.environ.get('MARKED_INDEX_DAYS', '2'))
+
+logger = logging.getLogger(__name__)
+
+
+class MarkedIndex:
+    """{date: {period: {student_id}}} of marks known to be in the database (or the journal)."""
+
+    def __init__(self, max_days=MARKED_INDEX_DAYS):
+        self.max_days = max_days
+        self._lock = threading.Lock()
+        self._days = {}
+        self._warmed = set()
+
+    @property
+    def enabled(self):
+        return self.max_days > 0
+
+    @staticmethod
+    def _valid_date(date_str):
+        try:
+            return datetime.strptime(date_str, '%Y-%m-%d').strftime('%Y-%m-%d') == date_str
+        except (TypeError, ValueError):
+            return False
+
+    def _day(self, date_str):
+        """
+        The date's entry, created if needed, evicting the oldest dates past max_days.
+        None if the date isn't indexed (malformed, or older than every retained date). Caller holds the lock.
+        """
+        day = self._days.get(date_str)
+        if day is None:
+            if not self._valid_date(date_str):
+                return None
+            # Validated YYYY-MM-DD strings sort by date
+            if len(self._days) >= self.max_days and date_str < min(self._days):
+                return None
+            day = self._days[date_str] = {}
+            for old in sorted(self._days)[:-self.max_days]:
+                del self._days[old]
+            self._warmed &= set(self._days)
+        return day
+
+    def marked(self, date_str, period, student_ids):
+        """The subset of student_ids known to be marked for (date, period)."""
+        if not self.enabled:
+            return set()
+        with self._lock:
+            known = self._days.get(date_str, {}).get(str(period), ())
+            marked = {student_id for student_id in student_ids if student_id in known}
+        hits = len(marked)
+        if hits:
+            MARKED_INDEX_LOOKUPS.inc(hits, result='hit')
+        if len(student_ids) > hits:
+            MARKED_INDEX_LOOKUPS.inc(len(student_ids) - hits, result='miss')
+        return marked
+
+    def add(self, date_str, period, student_ids):
+        if not self.enabled or not student_ids:
+            return
+        with self._lock:
+            day = self._day(date_str)
+            if day is not None:
+                day.setdefault(str(period), set()).update(student_ids)
+
+    def warm(self, date_str, load):
+        """
+        Load the date's marks in a background thread, once per date.
+        load(date_str) returns (student_id, period) pairs; on failure a later call retries.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if date_str in self._warmed:
+                return
+            self._warmed.add(date_str)
+        threading.Thread(target=self._warm, args=(date_str, load), name='marked-index-warm', daemon=True).start()
+
+    def _warm(self, date_str, load):
+        try:
+            pairs = load(date_str)
+        except Exception as e:
+            logger.warning("Could not load marks for %s into the index: %s", date_str, e)
+            with self._lock:
+                self._warmed.discard(date_str)
+            return
+        with self._lock:
+            day = self._day(date_str)
+            if day is None:
+                return
+            for student_id, period in pairs:
+                day.setdefault(str(period), set()).add(student_id)
+        logger.info("Marked-attendance index: loaded %d marks for %s", len(pairs), date_str)
@@ -0,0 +1,222 @@
+"""
+In-process counters and latency histograms, exposed at /metrics in the
+Prometheus text format (version 0.0.4).
+
+Recording is a perf_counter() pair plus a bisect and a locked increment, so
+timers can wrap every stage of every request:
+
+    with REQUEST_STAGE_SECONDS.time(stage='imdecode'):
+        image = cv2.imdecode(...)
+
+Each process has its own registry. The inference sidecar serves its
+families over the socket, and the web worker appends them to its own page
+(see inference_service.OP_METRICS). Families without samples are left out,
+so the two pages never repeat a family.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; spans a cache hit (~1 ms) to a cold model load (~10 s)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FACE_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 40)
+
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._series = {}
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def render(self):
+        with self._lock:
+            series = {key: self._snapshot(value) for key, value in self._series.items()}
+        if not series:
+            return []
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for key in sorted(series):
+            lines.extend(self._render_series(key, series[key]))
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonic count per label set."""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._series.get(self._key(labels), 0)
+
+    def _snapshot(self, value):
+        return value
+
+    def _render_series(self, key, value):
+        return [f'{self.name}{_format_labels(self.label_names, key)} {_format_number(value)}']
+
+
+class Gauge(_Metric):
+    """Current value per label set (e.g. a queue depth)."""
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._series.get(self._key(labels), 0)
+
+    def _snapshot(self, value):
+        return value
+
+    def _render_series(self, key, value):
+        return [f'{self.name}{_format_labels(self.label_names, key)} {_format_number(value)}']
+
+
+class Histogram(_Metric):
+    """Bucketed observations per label set (cumulative buckets are computed at render time)."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # [per-bucket counts incl. +Inf, sum]
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _snapshot(self, value):
+        return list(value[0]), value[1]
+
+    def _render_series(self, key, value):
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            le = f'le="{_format_number(float(bound))}"'
+            lines.append(f'{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}')
+        labels = _format_labels(self.label_names, key)
+        lines.append(f'{self.name}_sum{labels} {_format_number(float(total))}')
+        lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+def render():
+    """Every metric with at least one sample, in Prometheus text format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+# Web worker: upload handling, decoding, calls into inference, attendance writes
+REQUEST_STAGE_SECONDS = Histogram(
+    'praesentix_request_stage_seconds',
+    'Time spent in each stage of a recognition request in the web worker.',
+    ('stage',))
+HTTP_REQUESTS = Counter(
+    'praesentix_http_requests_total',
+    'HTTP requests by route, method and status code.',
+    ('route', 'method', 'status'))
+HTTP_REQUEST_SECONDS = Histogram(
+    'praesentix_http_request_duration_seconds',
+    'HTTP request latency by route.',
+    ('route',))
+FACES_PER_REQUEST = Histogram(
+    'praesentix_faces_per_request',
+    'Faces detected per recognition request or stream frame.',
+    ('endpoint',), buckets=FACE_COUNT_BUCKETS)
+RECOGNITION_ERRORS = Counter(
+    'praesentix_recognition_errors_total',
+    'Failed recognition requests by endpoint and the stage that failed.',
+    ('endpoint', 'stage'))
+
+ATTENDANCE_JOURNAL_BACKLOG = Gauge(
+    'praesentix_attendance_journal_backlog',
+    'Attendance marks journaled locally and not yet written to the database.')
+ATTENDANCE_JOURNAL_OLDEST_SECONDS = Gauge(
+    'praesentix_attendance_journal_oldest_pending_seconds',
+    'Age of the oldest attendance mark waiting in the journal.')
+ATTENDANCE_JOURNAL_FLUSHES = Counter(
+    'praesentix_attendance_journal_flushes_total',
+    'Journal flush attempts by result (ok, error).',
+    ('result',))
+ATTENDANCE_JOURNAL_FLUSHED = Counter(
+    'praesentix_attendance_journal_flushed_marks_total',
+    'Journaled attendance marks written to the database.')
+ATTENDANCE_JOURNAL_DEAD_LETTERS = Gauge(
+    'praesentix_attendance_journal_dead_letters',
+    'Journaled attendance marks the database kept rejecting, set aside instead of retried.')
+
+MARKED_INDEX_LOOKUPS = Counter(
+    'praesentix_marked_index_lookups_total',
+    'Students looked up in the in-memory already-marked index, by result (hit, miss).',
+    ('result',))
+
+LOG_RECORDS_DROPPED = Counter(
+    'praesentix_log_records_dropped_total',
+    'Log records dropped because the logging queue was full.')
+
+# Wherever inference runs (in-process, or the sidecar): pipeline stages and the face gallery
+INFERENCE_STAGE_SECONDS = Histogram(
+    'praesentix_inference_stage_seconds',
+    'Time spent in each face pipeline and gallery stage.',
+    ('stage',))
@@ -0,0 +1,222 @@
+"""
+One-shot schema/data migrations for the Neon database.
+
+Every migration is idempotent. `deploy` runs all of them in order, and the
+Render build runs it, so a deploy never serves code ahead of its schema.
+
+Usage (from the Backend directory):
+    python migrate.py deploy
+    python migrate.py embeddings [--batch-size 500] [--clear-json]
+    python migrate.py students [--import-sqlite Database/attendance_demo.db]
+    python migrate.py attendance-unique
+    python migrate.py notifications
+"""
+import argparse
+import json
+import sqlite3
+import sys
+import time
+
+import numpy as np
+from sqlalchemy import inspect, text, update
+
+from neon_db import engine, SessionLocal
+from models import Attendance, Base, FaceEncoding, Notification, Student
+from embedding_codec import encode_embedding
+
+
+def ensure_embedding_column():
+    """Add face_encodings.embedding if the table predates the binary format."""
+    columns = {c['name'] for c in inspect(engine).get_columns('face_encodings')}
+    if 'embedding' in columns:
+        return False
+    column_type = 'BYTEA' if engine.dialect.name == 'postgresql' else 'BLOB'
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE face_encodings ADD COLUMN embedding {column_type}"))
+    print("✓ Added column face_encodings.embedding")
+    return True
+
+
+def migrate_embeddings(batch_size=500, clear_json=False):
+    """Convert JSON encoding_data rows into the binary embedding column, batch by batch."""
+    ensure_embedding_column()
+
+    db = SessionLocal()
+    converted = 0
+    failed = 0
+    last_id = 0
+    started = time.perf_counter()
+    try:
+        while True:
+            rows = db.query(FaceEncoding.id, FaceEncoding.person_id, FaceEncoding.encoding_data)\
+                .filter(FaceEncoding.id > last_id,
+                        FaceEncoding.embedding.is_(None),
+                        FaceEncoding.encoding_data.isnot(None))\
+                .order_by(FaceEncoding.id)\
+                .limit(batch_size)\
+                .all()
+            if not rows:
+                break
+
+            updates = []
+            for row_id, person_id, encoding_data in rows:
+                try:
+                    vec = np.asarray(json.loads(encoding_data), dtype=np.float32)
+                except Exception as e:
+                    print(f"⚠️ Skipping {person_id}: {e}")
+                    failed += 1
+                    continue
+                values = {'id': row_id, 'embedding': encode_embedding(vec)}
+                if clear_json:
+                    values['encoding_data'] = None
+                updates.append(values)
+
+            if updates:
+                # Bulk UPDATE ... WHERE id = :id, one statement per batch
+                db.execute(update(FaceEncoding), updates)
+                db.commit()
+            converted += len(updates)
+            last_id = rows[-1][0]
+            print(f"  converted {converted} rows so far...")
+
+        elapsed = time.perf_counter() - started
+        print(f"✅ Converted {converted} face encodings in {elapsed:.1f}s ({failed} skipped)")
+        return failed == 0
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Migration failed: {e}")
+        return False
+    finally:
+        db.close()
+
+
+def migrate_students(import_sqlite=None):
+    """
+    Create the students (class roster) table. Enrolled faces with an
+    "ID-{student_id} - {name}" person_id get a row without a class, and
+    class/section can be imported from the legacy SQLite students table.
+    """
+    Student.__table__.create(bind=engine, checkfirst=True)
+    print("✓ students table ready")
+
+    db = SessionLocal()
+    try:
+        existing = {student_id for (student_id,) in db.query(Student.student_id)}
+        rows = {}
+        if import_sqlite:
+            conn = sqlite3.connect(import_sqlite)
+            try:
+                for name, reg_no, class_name, section in conn.execute(
+                        "SELECT name, reg_no, class, section FROM students WHERE reg_no IS NOT NULL"):
+                    rows[str(reg_no)] = {'student_id': str(reg_no), 'name': name,
+                                         'class_name': class_name, 'section': section}
+            finally:
+                conn.close()
+            print(f"  read {len(rows)} students from {import_sqlite}")
+
+        for (person_id,) in db.query(FaceEncoding.person_id):
+            if person_id.startswith('ID-') and ' - ' in person_id:
+                student_id, name = person_id[3:].split(' - ', 1)
+                rows.setdefault(student_id, {'student_id': student_id, 'name': name,
+                                             'class_name': None, 'section': None})
+
+        new_rows = [row for student_id, row in rows.items() if student_id not in existing]
+        if new_rows:
+            db.execute(Student.__table__.insert(), new_rows)
+            db.commit()
+        print(f"✅ Added {len(new_rows)} students ({len(existing)} already present)")
+        return True
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Migration failed: {e}")
+        return False
+    finally:
+        db.close()
+
+
+ATTENDANCE_UNIQUE_INDEX = 'uq_attendance_student_date_period'
+
+
+def migrate_attendance_unique():
+    """
+    Remove duplicate marks (keeping the first one of each student/date/period)
+    and create the unique index the ON CONFLICT insert relies on. Both happen
+    in one transaction, so no duplicate can slip in between.
+    """
+    index = next(i for i in Attendance.__table__.indexes if i.name == ATTENDANCE_UNIQUE_INDEX)
+    try:
+        with engine.begin() as conn:
+            removed = conn.execute(text("""
+                DELETE FROM attendance WHERE id NOT IN (
+                    SELECT MIN(id) FROM attendance GROUP BY student_id, date, period
+                )
+            """)).rowcount
+            print(f"✓ Removed {removed} duplicate attendance rows")
+            index.create(bind=conn, checkfirst=True)
+        print(f"✅ Unique index {ATTENDANCE_UNIQUE_INDEX} ready")
+        return True
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        return False
+
+
+def migrate_notifications():
+    """Add the feed (timestamp, id) and unread indexes to notifications."""
+    try:
+        for index in Notification.__table__.indexes:
+            index.create(bind=engine, checkfirst=True)
+            print(f"✓ Index {index.name} ready")
+        print("✅ Notification indexes ready")
+        return True
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        return False
+
+
+def migrate_deploy():
+    """Create missing tables, then run every migration; stops at the first failure."""
+    try:
+        Base.metadata.create_all(bind=engine)
+        print("✓ Tables ready")
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        return False
+    steps = (migrate_embeddings, migrate_students, migrate_attendance_unique, migrate_notifications)
+    return all(step() for step in steps)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Praesentix database migrations")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    sub.add_parser('deploy', help="Create missing tables and run every migration (run by the Render build)")
+
+    emb = sub.add_parser('embeddings', help="Convert JSON face encodings to the binary embedding column")
+    emb.add_argument('--batch-size', type=int, default=500)
+    emb.add_argument('--clear-json', action='store_true',
+                     help="Null out encoding_data after conversion to reclaim space")
+
+    students = sub.add_parser('students', help="Create the class roster table and seed it")
+    students.add_argument('--import-sqlite', default=None, metavar='PATH',
+                          help="Legacy SQLite database with a students(name, reg_no, class, section) table")
+
+    sub.add_parser('attendance-unique', help="De-duplicate attendance and add the (student_id, date, period) unique index")
+
+    sub.add_parser('notifications', help="Add the notification feed and unread-count indexes")
+
+    args = parser.parse_args(argv)
+    if args.command == 'deploy':
+        ok = migrate_deploy()
+    elif args.command == 'embeddings':
+        ok = migrate_embeddings(batch_size=args.batch_size, clear_json=args.clear_json)
+    elif args.command == 'students':
+        ok = migrate_students(import_sqlite=args.import_sqlite)
+    elif args.command == 'attendance-unique':
+        ok = migrate_attendance_unique()
+    elif args.command == 'notifications':
+        ok = migrate_notifications()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Float, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Text, Float, JSON, LargeBinary, Index, text
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
@@ -20,12 +20,16 @@ class Attendance(Base):
     liveness_confidence = Column(Float, default=75.0)
     recognition_confidence = Column(Float, default=85.0)
 
+    # One mark per student per period; the write path inserts with ON CONFLICT DO NOTHING against it
+    __table_args__ = (Index('uq_attendance_student_date_period', 'student_id', 'date', 'period', unique=True),)
+
 class FaceEncoding(Base):
     __tablename__ = "face_encodings"
 
     id = Column(Integer, primary_key=True, index=True)
     person_id = Column(String, unique=True, index=True)
-    encoding_data = Column(Text) # JSON string of attributes
+    encoding_data = Column(Text, nullable=True) # Legacy JSON list; superseded by `embedding`
+    embedding = Column(LargeBinary, nullable=True) # float32 bytes with header, see embedding_codec.py
     num_images = Column(Integer, default=1)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -40,6 +44,26 @@ class Notification(Base):
     timestamp = Column(DateTime, default=datetime.utcnow)
     read = Column(Integer, default=0) # Using Integer for boolean compatibility 0/1
 
+    __table_args__ = (
+        # Newest-first feed with keyset pagination: ORDER BY timestamp DESC, id DESC WHERE (timestamp, id) < cursor
+        Index('ix_notifications_timestamp_id', 'timestamp', 'id'),
+        # Partial index: the unread count only scans unread rows
+        Index('ix_notifications_unread', 'id', postgresql_where=text('read = 0'), sqlite_where=text('read = 0')),
+    )
+
+class Student(Base):
+    """Class roster entry; student_id matches Attendance.student_id and the "ID-{student_id}" face person_id."""
+    __tablename__ = "students"
+
+    id = Column(Integer, primary_key=True, index=True)
+    student_id = Column(String, unique=True, index=True)
+    name = Column(String)
+    class_name = Column(String)
+    section = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (Index('ix_students_class_section', 'class_name', 'section'),)
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
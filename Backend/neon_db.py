@@ -7,10 +7,16 @@ load_dotenv()
 
 DATABASE_URL = os.getenv("NEON_DATABASE_URL")
 
+# Neon requires TLS; a sqlite:/// URL (offline benchmarks, local runs) is shared across request threads
+if DATABASE_URL and DATABASE_URL.startswith("sqlite"):
+    connect_args = {"check_same_thread": False}
+else:
+    connect_args = {"sslmode": "require"}
+
 engine = create_engine(
     DATABASE_URL,
     pool_pre_ping=True,
-    connect_args={"sslmode": "require"}
+    connect_args=connect_args
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -0,0 +1,117 @@
+"""
+Digest notifications for attendance marks.
+
+Instead of one "Attendance marked for X" row per student, new marks are
+collected in memory and, every NOTIFICATION_DIGEST_SECONDS, written as one
+notification per class/section and period ("Class 10-A, period 3: 28
+students marked (...)") by a background thread, so the mark path never
+writes a notification itself. The class comes from the students roster;
+students without one are grouped per period.
+
+Digests are informational: marks still pending in memory when a worker is
+killed lose their digest (the attendance rows themselves are unaffected).
+A clean shutdown writes what is pending.
+
+    NOTIFICATION_DIGEST_SECONDS=60
+    NOTIFICATION_DIGEST_NAMES=3    names listed before "and N more"
+"""
+import atexit
+import logging
+import os
+import threading
+from datetime import datetime
+
+NOTIFICATION_DIGEST_SECONDS = float(os.environ.get('NOTIFICATION_DIGEST_SECONDS', '60'))
+NOTIFICATION_DIGEST_NAMES = int(os.environ.get('NOTIFICATION_DIGEST_NAMES', '3'))
+
+logger = logging.getLogger(__name__)
+
+
+def digest_message(names, date_str, period, class_label=None):
+    """Notification text for the students marked in one class and period."""
+    shown = ', '.join(names[:NOTIFICATION_DIGEST_NAMES])
+    if len(names) > NOTIFICATION_DIGEST_NAMES:
+        shown += f" and {len(names) - NOTIFICATION_DIGEST_NAMES} more"
+    where = f"Class {class_label}, period {period}" if class_label else f"Period {period}"
+    count = f"{len(names)} student{'s' if len(names) != 1 else ''}"
+    return f"{where} on {date_str}: {count} marked ({shown})"
+
+
+class NotificationDigest:
+    """
+    Buffers (date, period) -> {student_id: name} and periodically hands it to
+    write(pending), which stores the digests and raises on failure (the batch
+    is then merged back and retried next time).
+    """
+
+    def __init__(self, write, interval=NOTIFICATION_DIGEST_SECONDS):
+        self._write = write
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def record(self, date_str, period, students):
+        """Queue newly marked students: (student_id, name) pairs for one date and period."""
+        if not students:
+            return
+        with self._lock:
+            self._pending.setdefault((date_str, str(period)), {}).update(students)
+        if self._thread is None:
+            self._start()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='notification-digest', daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout=5):
+        """Write what is pending and stop the background thread."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        try:
+            self._write(pending)
+        except Exception as e:
+            logger.warning("Writing %d notification digests failed (will retry): %s", len(pending), e)
+            with self._lock:
+                for key, students in pending.items():
+                    # Marks recorded meanwhile are merged in; nothing is written twice
+                    self._pending.setdefault(key, {}).update(students)
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            self.flush()
+        self.flush()
+
+
+def build_digest_rows(pending, classes, timestamp=None):
+    """
+    Notification rows for pending {(date, period): {student_id: name}}, one per
+    class/section and period. classes maps student_id -> class label (or None).
+    """
+    timestamp = timestamp or datetime.utcnow()
+    rows = []
+    for (date_str, period), students in sorted(pending.items()):
+        by_class = {}
+        for student_id, name in students.items():
+            by_class.setdefault(classes.get(student_id), []).append(name)
+        for class_label, names in sorted(by_class.items(), key=lambda item: item[0] or ''):
+            rows.append({
+                'type': "attendance",
+                'title': "Attendance Marked",
+                'message': digest_message(sorted(names), date_str, period, class_label),
+                'timestamp': timestamp,
+                'read': 0
+            })
+    return rows
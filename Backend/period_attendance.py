@@ -2,71 +2,277 @@ import os
 from datetime import datetime
 import csv
 import io
+import logging
 from neon_db import get_db
-from models import Attendance, Notification
-from sqlalchemy import desc
+from models import Attendance, Notification, Student
+from sqlalchemy import desc, insert, inspect
+from sqlalchemy.exc import DataError, IntegrityError
+from attendance_journal import WRITE_BEHIND, get_journal, idempotency_key
+from marked_index import MarkedIndex
+from notification_digest import NotificationDigest, build_digest_rows
+
+logger = logging.getLogger(__name__)
+
+# (student_id, date, period) keys known to be marked, so repeat recognitions skip the database
+marked_index = MarkedIndex()
+
+# Columns of the unique index on attendance (see `python migrate.py attendance-unique`)
+ATTENDANCE_KEY = ('student_id', 'date', 'period')
+_unique_index_present = None
+
+
+def _has_unique_index(db):
+    """Whether attendance has the (student_id, date, period) unique index; inspected once per process."""
+    global _unique_index_present
+    if _unique_index_present is None:
+        indexes = inspect(db.get_bind()).get_indexes('attendance')
+        _unique_index_present = any(
+            index['unique'] and tuple(index['column_names']) == ATTENDANCE_KEY for index in indexes
+        )
+        if not _unique_index_present:
+            logger.warning("attendance has no unique (student_id, date, period) index; marking with "
+                           "check-then-insert until `python migrate.py attendance-unique` is run")
+    return _unique_index_present
+
+
+def _insert_new_marks(db, many=False):
+    """
+    INSERT INTO attendance ... ON CONFLICT (student_id, date, period) DO NOTHING,
+    for Postgres and SQLite >= 3.35 (local runs). None when the database can't
+    do it with RETURNING, or the unique index is missing: callers then check first.
+    """
+    dialect = db.get_bind().dialect
+    returning = dialect.insert_executemany_returning if many else dialect.insert_returning
+    if not returning or not _has_unique_index(db):
+        return None
+    if dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert(Attendance).on_conflict_do_nothing(index_elements=list(ATTENDANCE_KEY))
+
+
+def _attendance_row(student_id, name, date_str, period, emotion, liveness_confidence,
+                    recognition_confidence, is_live, time_str, timestamp):
+    return {
+        'student_id': student_id,
+        'name': name,
+        'date': date_str,
+        'period': period,
+        'time': time_str,
+        'emotion': emotion,
+        'spoof_status': "LIVE" if is_live else "SPOOFED",
+        'liveness_confidence': float(liveness_confidence),
+        'recognition_confidence': float(recognition_confidence),
+        'timestamp': timestamp
+    }
+
+
+def _insert_rows(db, rows):
+    """
+    Insert attendance rows (unique keys) that aren't marked yet, without committing.
+    Returns the (student_id, date, period) keys actually inserted.
+    """
+    insert_new = _insert_new_marks(db, many=len(rows) > 1)
+    if insert_new is not None:
+        # One statement (executemany with RETURNING is sent as one multi-row INSERT); only new rows come back.
+        # The unique index decides, even with concurrent frames of the same class.
+        returned = db.execute(insert_new.returning(Attendance.student_id, Attendance.date, Attendance.period), rows)
+        return {tuple(key) for key in returned}
+
+    # Without the unique index: one IN query per (date, period), then a plain insert
+    by_slot = {}
+    for row in rows:
+        by_slot.setdefault((row['date'], row['period']), []).append(row)
+    new_rows = []
+    for (date_str, period), slot_rows in by_slot.items():
+        already_marked = {
+            student_id for (student_id,) in db.query(Attendance.student_id).filter(
+                Attendance.student_id.in_([row['student_id'] for row in slot_rows]),
+                Attendance.date == date_str,
+                Attendance.period == period
+            )
+        }
+        new_rows.extend(row for row in slot_rows if row['student_id'] not in already_marked)
+    if new_rows:
+        db.execute(insert(Attendance), new_rows)
+    return {(row['student_id'], row['date'], row['period']) for row in new_rows}
+
+
+def _journal_marks(rows):
+    """Write-behind: journal the rows locally; returns the student_ids newly journaled."""
+    added = start_write_behind().append([
+        (idempotency_key(row['student_id'], row['date'], row['period']),
+         dict(row, timestamp=row['timestamp'].isoformat()))
+        for row in rows
+    ])
+    return {row['student_id'] for row, is_new in zip(rows, added) if is_new}
+
+
+def _flush_journaled_marks(payloads):
+    """Journal flusher: write one batch of journaled marks in one transaction."""
+    db = next(get_db())
+    try:
+        rows = [dict(payload, timestamp=datetime.fromisoformat(payload['timestamp'])) for payload in payloads]
+        inserted = _insert_rows(db, rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    for row in rows:
+        if (row['student_id'], row['date'], row['period']) in inserted:
+            notification_digest.record(row['date'], row['period'], [(row['student_id'], row['name'])])
+
+
+def _mark_rejected(exc):
+    """Flush errors about the journaled marks themselves (constraints, bad values), not the connection."""
+    return isinstance(exc, (IntegrityError, DataError, KeyError, TypeError, ValueError))
+
+
+def _write_digests(pending):
+    """Digest writer: one notification per class/section and period, in one INSERT."""
+    db = next(get_db())
+    try:
+        student_ids = {student_id for students in pending.values() for student_id in students}
+        classes = {}
+        for student_id, class_name, section in db.query(Student.student_id, Student.class_name, Student.section)\
+                .filter(Student.student_id.in_(student_ids)):
+            if class_name:
+                classes[student_id] = f"{class_name}-{section}" if section else class_name
+        db.execute(insert(Notification), build_digest_rows(pending, classes))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+# New marks become one notification per class and period, written in the background
+notification_digest = NotificationDigest(_write_digests)
+
+
+def start_write_behind():
+    """Open the journal and start its flusher (also done on the first journaled mark)."""
+    return get_journal(_flush_journaled_marks, _mark_rejected)
+
+
+# Write-behind: accepted into the journal, not yet known to be new in the database
+QUEUED_MESSAGE = "Attendance queued for this period"
+
+
+def _outcomes(students, marked, message="Attendance marked successfully"):
+    """(success, message) per input student; a student listed twice only counts as marked once."""
+    marked = set(marked)
+    results = []
+    for s in students:
+        if s['student_id'] in marked:
+            marked.discard(s['student_id'])
+            results.append((True, message))
+        else:
+            results.append((False, "Attendance already marked for this period"))
+    return results
+
+
+def _load_marks(date_str):
+    """(student_id, period) of every mark on date_str, for the already-marked index."""
+    db = next(get_db())
+    try:
+        return db.query(Attendance.student_id, Attendance.period).filter(Attendance.date == date_str).all()
+    finally:
+        db.close()
+
+
+def warm_marked_index(date_str=None):
+    """Load a day's marks (today's by default) into the already-marked index, in the background."""
+    marked_index.warm(date_str or datetime.now().strftime('%Y-%m-%d'), _load_marks)
+
 
 def mark_period_attendance(student_id, name, date_str, period, emotion="Neutral", 
                           liveness_confidence=75.0, recognition_confidence=85.0, is_live=True, db=None):
     """Mark attendance for a specific period."""
+    logger.debug("Attempting to mark attendance for %s (%s) on %s, period %s", name, student_id, date_str, period)
+    return mark_period_attendance_bulk([{
+        'student_id': student_id,
+        'name': name,
+        'emotion': emotion,
+        'liveness_confidence': liveness_confidence,
+        'recognition_confidence': recognition_confidence,
+        'is_live': is_live
+    }], date_str, period, db=db)[0]
+
+def mark_period_attendance_bulk(students, date_str, period, db=None):
+    """
+    Mark attendance for everyone recognized in one frame, for a single (date, period).
+
+    `students` is a list of dicts with student_id and name, and optionally emotion,
+    liveness_confidence, recognition_confidence and is_live (same defaults as
+    mark_period_attendance). Students the already-marked index knows about are
+    answered without the database. The rest are inserted with one ON CONFLICT DO
+    NOTHING statement (or after one IN query, without the unique index) and
+    committed once. In write-behind mode the batch goes to the journal instead,
+    and new marks are reported as queued: the database (which may already hold
+    the mark) is only consulted when the journal is flushed.
+    New marks are announced in the next notification digest. Returns
+    [(success, message)] in input order, with the same messages as
+    mark_period_attendance.
+    """
+    if not students:
+        return []
+    if date_str == datetime.now().strftime('%Y-%m-%d'):
+        # No-op once today's marks are loaded (at boot, or here on the first mark after midnight)
+        warm_marked_index(date_str)
+    time_str = datetime.now().strftime("%H:%M:%S")
+    now = datetime.utcnow()
+    rows = {}
+    for s in students:
+        # A student seen twice in the same batch is only marked once
+        if s['student_id'] not in rows:
+            rows[s['student_id']] = _attendance_row(
+                s['student_id'], s['name'], date_str, period, s.get('emotion', 'Neutral'),
+                s.get('liveness_confidence', 75.0), s.get('recognition_confidence', 85.0),
+                s.get('is_live', True), time_str, now)
+
+    known = marked_index.marked(date_str, period, list(rows))
+    pending = [row for student_id, row in rows.items() if student_id not in known]
+    logger.debug("Bulk marking %d students on %s, period %s (%d already marked per index)",
+                 len(rows), date_str, period, len(known))
+    if not pending:
+        return _outcomes(students, ())
+
+    if WRITE_BEHIND:
+        try:
+            inserted = _journal_marks(pending)
+        except Exception as e:
+            logger.exception("Failed to journal attendance on %s, period %s", date_str, period)
+            return [(False, f"Journal error: {str(e)}")] * len(students)
+        marked_index.add(date_str, period, [row['student_id'] for row in pending])
+        return _outcomes(students, inserted, QUEUED_MESSAGE)
+
     should_close = False
     if db is None:
         db = next(get_db())
         should_close = True
-    
+
     try:
-        print(f"[DEBUG] Attempting to mark attendance for {name} ({student_id}) on {date_str}, period {period}", flush=True)
-        time_str = datetime.now().strftime("%H:%M:%S")
-        spoofing_status = "LIVE" if is_live else "SPOOFED"
-        
-        # Check for duplicate
-        existing = db.query(Attendance).filter(
-            Attendance.student_id == student_id,
-            Attendance.date == date_str,
-            Attendance.period == period
-        ).first()
-        
-        if existing:
-            print(f"[DEBUG] Duplicate attendance found for {student_id}", flush=True)
-            return False, "Attendance already marked for this period"
-        
-        # Insert new record
-        new_record = Attendance(
-            student_id=student_id,
-            name=name,
-            date=date_str,
-            period=period,
-            time=time_str,
-            emotion=emotion,
-            spoof_status=spoofing_status,
-            liveness_confidence=float(liveness_confidence),
-            recognition_confidence=float(recognition_confidence),
-            timestamp=datetime.utcnow()
-        )
-        
-        db.add(new_record)
-        
-        # Create Notification
-        new_notification = Notification(
-            type="attendance",
-            title="Attendance Marked",
-            message=f"Attendance marked for {name} ({student_id})",
-            timestamp=datetime.utcnow(),
-            read=0
-        )
-        db.add(new_notification)
-        
-        db.commit()
-        print(f"[DEBUG] Successfully marked attendance and created notification for {student_id}", flush=True)
-        return True, "Attendance marked successfully"
-        
+        inserted = {student_id for student_id, _, _ in _insert_rows(db, pending)}
+        if inserted:
+            db.commit()
+            notification_digest.record(date_str, period, [(row['student_id'], row['name'])
+                                                          for row in pending if row['student_id'] in inserted])
+        # Inserted now or found already marked: either way, repeats needn't ask the database again
+        marked_index.add(date_str, period, [row['student_id'] for row in pending])
+        logger.debug("Bulk marked %d new, %d already marked", len(inserted), len(students) - len(inserted))
+        return _outcomes(students, inserted)
+
     except Exception as e:
-        print(f"[ERROR] Failed to mark attendance: {e}", flush=True)
-        import traceback
-        traceback.print_exc()
-        if should_close:
-            db.rollback()
-        return False, f"Database error: {str(e)}"
+        logger.exception("Failed to bulk mark attendance on %s, period %s", date_str, period)
+        db.rollback()
+        return [(False, f"Database error: {str(e)}")] * len(students)
     finally:
         if should_close:
             db.close()
@@ -101,8 +307,10 @@ def get_period_attendance(date_str=None, period=None, class_filter=None):
         return results
         
     except Exception as e:
-        print(f"Error getting period attendance: {e}")
+        logger.error("Error getting period attendance: %s", e)
         return []
+    finally:
+        db.close()
 
 def export_period_attendance_csv(date_str=None, period=None):
     """Export period attendance to CSV format with enhanced readability."""
@@ -163,7 +371,7 @@ def export_period_attendance_csv(date_str=None, period=None):
         return csv_content
         
     except Exception as e:
-        print(f"Error exporting CSV: {e}")
+        logger.error("Error exporting CSV: %s", e)
         return None
 
 def get_attendance_summary(date_str=None):
@@ -194,5 +402,7 @@ def get_attendance_summary(date_str=None):
         return records
         
     except Exception as e:
-        print(f"Error getting attendance summary: {e}")
-        return []
\ No newline at end of file
+        logger.error("Error getting attendance summary: %s", e)
+        return []
+    finally:
+        db.close()
\ No newline at end of file
@@ -0,0 +1,88 @@
+import logging
+import os
+import threading
+
+# Disable oneDNN optimizations and FORCE CPU-ONLY for Render
+os.environ.setdefault('TF_ENABLE_ONEDNN_OPTS', '0')
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "-1")
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "3")
+
+import numpy as np
+
+from batching import MicroBatcher
+from embedding_cache import EmbeddingCache, EMBED_CACHE_MAX_MB
+from face_pipeline import FacePipeline, DETECTORS, ALIGNERS, EMBEDDERS
+
+logger = logging.getLogger(__name__)
+
+# Face recognition settings for DeepFace (Facenet is lighter for 512MB RAM)
+MODEL_NAME = 'Facenet'
+DETECTOR_BACKEND = os.environ.get('FACE_DETECTOR', 'opencv') # opencv is much lighter/faster than ssd, better for low-mem environments
+# 'deepface' reproduces DeepFace.represent's crops (existing galleries); 'eyes' is faster but needs re-enrollment
+ALIGNER = os.environ.get('FACE_ALIGNER', 'deepface')
+# 'deepface' (TensorFlow) or 'onnx' (ONNX Runtime, needs FACENET_ONNX_PATH); see embedding_backends.py
+EMBED_BACKEND = os.environ.get('FACE_EMBED_BACKEND', 'deepface').lower()
+
+# Face crops from concurrent requests are embedded together in one forward pass.
+# FACE_BATCH_MAX_WAIT_MS=0 disables batching (each request runs its own pass).
+BATCH_MAX_SIZE = int(os.environ.get('FACE_BATCH_MAX_SIZE', '16'))
+BATCH_MAX_WAIT_MS = float(os.environ.get('FACE_BATCH_MAX_WAIT_MS', '10'))
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline():
+    """Process-wide FacePipeline; stages are built once and reused for every request."""
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                embedder = EMBEDDERS[EMBED_BACKEND]()
+                batcher = None
+                if BATCH_MAX_WAIT_MS > 0 and BATCH_MAX_SIZE > 1:
+                    batcher = MicroBatcher(embedder.embed, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, name='facenet-batcher')
+                # EMBED_CACHE_MAX_MB=0 disables the perceptual-hash embedding cache
+                cache = EmbeddingCache() if EMBED_CACHE_MAX_MB > 0 else None
+                _pipeline = FacePipeline(DETECTORS[DETECTOR_BACKEND](), ALIGNERS[ALIGNER](), embedder, batcher, cache)
+    return _pipeline
+
+
+def warm_up():
+    """Load the detector and Facenet weights so the first real request doesn't pay for it."""
+    pipeline = get_pipeline()
+    pipeline.detector.detect(np.zeros((224, 224, 3), dtype=np.uint8))
+    h, w = pipeline.embedder.input_size
+    pipeline.embedder.embed([np.zeros((1, h, w, 3), dtype=np.float32)])
+
+
+# Images decoded/detected/aligned in parallel during enrollment
+ENROLL_WORKERS = int(os.environ.get('ENROLL_WORKERS', '4'))
+
+
+def get_face_encodings_from_image(image):
+    """
+    Extract face encodings from an image (detect -> align -> batched embed).
+    Returns a list of encodings (one per detected face).
+    """
+    try:
+        embeddings, regions, timings = get_pipeline().encode(image)
+        if logger.isEnabledFor(logging.DEBUG):
+            stage_ms = ", ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in timings.items())
+            logger.debug("%d faces in image %s (%s)", len(regions), image.shape, stage_ms)
+        return embeddings
+    except Exception as e:
+        logger.exception("Face encoding error")
+        return []
+
+
+def get_first_face_encodings(images):
+    """
+    Encoding of the first detected face in each image (None if no face).
+    Images are preprocessed in a thread pool and all crops embedded in one batch.
+    """
+    per_image, regions, timings = get_pipeline().encode_many(images, workers=ENROLL_WORKERS)
+    if logger.isEnabledFor(logging.DEBUG):
+        stage_ms = ", ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in timings.items())
+        logger.debug("%d faces in %d images (%s)", sum(map(len, regions)), len(images), stage_ms)
+    return [encodings[0] if encodings else None for encodings in per_image]
@@ -0,0 +1,58 @@
+"""
+Class rosters: which students belong to a class/section.
+
+A recognize call tagged with a class first matches faces against that
+roster's sub-gallery (~40 students) and only falls back to the whole school
+for faces the roster can't explain. Rosters change rarely, so they are cached
+per process for ROSTER_CACHE_SECONDS instead of being queried per frame.
+"""
+import os
+import threading
+import time
+
+from models import Student
+
+ROSTER_CACHE_SECONDS = float(os.environ.get('ROSTER_CACHE_SECONDS', '60'))
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def get_roster(db, class_name, section=None):
+    """student_ids enrolled in class_name (and section, if given); empty tuple for an unknown class."""
+    if not class_name:
+        return ()
+    key = (class_name, section or None)
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached is not None and now - cached[0] < ROSTER_CACHE_SECONDS:
+        return cached[1]
+
+    query = db.query(Student.student_id).filter(Student.class_name == class_name)
+    if section:
+        query = query.filter(Student.section == section)
+    roster = tuple(student_id for (student_id,) in query)
+    with _cache_lock:
+        _cache[key] = (now, roster)
+    return roster
+
+
+def invalidate_rosters():
+    with _cache_lock:
+        _cache.clear()
+
+
+def upsert_student(db, student_id, name, class_name=None, section=None):
+    """Create or update a students row (caller commits); class/section are only overwritten when given."""
+    student = db.query(Student).filter(Student.student_id == student_id).first()
+    if student is None:
+        student = Student(student_id=student_id, name=name, class_name=class_name, section=section)
+        db.add(student)
+    else:
+        student.name = name
+        if class_name:
+            student.class_name = class_name
+            student.section = section
+    invalidate_rosters()
+    return student
@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+# Backend modules import each other as top-level modules (python app.py from Backend/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def app_env(tmp_path_factory):
+    """
+    Environment for importing app: a scratch SQLite database instead of Neon,
+    models loaded only on demand. Modules read these at import time, so one
+    database serves the whole session.
+    """
+    scratch = tmp_path_factory.mktemp('praesentix')
+    os.environ['NEON_DATABASE_URL'] = f"sqlite:///{scratch / 'app.db'}"
+    os.environ['MODEL_WARMUP'] = 'lazy'
+    os.environ['ATTENDANCE_JOURNAL_PATH'] = str(scratch / 'journal.db')
+    os.environ.pop('INFERENCE_SOCKET', None)
+    import models
+    import neon_db
+    models.Base.metadata.create_all(neon_db.engine)
+    return scratch
+
+
+@pytest.fixture(scope='session')
+def client(app_env):
+    from app import app
+    return app.test_client()
@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip('deepface')
+
+from deepface.modules import detection, preprocessing
+
+from face_pipeline import ALIGNERS, DETECTORS
+from image_io import decode_image
+
+PHOTO = os.path.join(os.path.dirname(__file__), '..', '..', 'Logos', 'Cofounder.webp')
+TARGET_SIZE = (160, 160)  # Facenet
+
+
+def _load(max_dim):
+    with open(PHOTO, 'rb') as f:
+        return decode_image(f.read(), max_dim)
+
+
+def _deepface_crops(image):
+    faces = detection.extract_faces(image, detector_backend='opencv', align=True, enforce_detection=False)
+    faces = [face for face in faces if face['confidence'] > 0]
+    # What DeepFace.represent feeds the model: the face back in BGR, resized and padded to the target
+    return [preprocessing.resize_image(face['face'][:, :, ::-1], TARGET_SIZE) for face in faces]
+
+
+def _pipeline_crops(image):
+    detector, aligner = DETECTORS['opencv'](), ALIGNERS['deepface']()
+    return aligner.align(image, detector.detect(image), TARGET_SIZE)
+
+
+@pytest.mark.parametrize('max_dim', [1024, 2304])
+def test_deepface_aligner_reproduces_deepface_crops(max_dim):
+    image = _load(max_dim)
+    expected, actual = _deepface_crops(image), _pipeline_crops(image)
+    assert expected, 'DeepFace found no face in the fixture photo'
+    assert len(actual) == len(expected)
+    for want, got in zip(expected, actual):
+        assert got.shape == want.shape
+        assert np.abs(got.astype(np.float64) - want).mean() <= 0.5 / 255
+
+
+def test_deepface_aligner_embeddings_match_represent():
+    from deepface import DeepFace
+
+    try:
+        model = DeepFace.build_model('Facenet')
+    except Exception as e:  # weights are downloaded on first use
+        pytest.skip(f'Facenet weights unavailable: {e}')
+
+    image = _load(1024)
+    expected = [np.array(r['embedding']) for r in
+                DeepFace.represent(image, model_name='Facenet', detector_backend='opencv', enforce_detection=False)]
+    actual = [np.asarray(model.forward(crop), dtype=np.float64) for crop in _pipeline_crops(image)]
+    assert len(actual) == len(expected)
+    for want, got in zip(expected, actual):
+        cosine = want @ got / (np.linalg.norm(want) * np.linalg.norm(got))
+        assert cosine >= 0.999
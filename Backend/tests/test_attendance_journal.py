@@ -0,0 +1,60 @@
+from attendance_journal import AttendanceJournal
+
+
+class BadMark(Exception):
+    pass
+
+
+class Database:
+    """Accepts every payload except those with student_id 'bad'; can be taken offline."""
+
+    def __init__(self):
+        self.rows = []
+        self.online = True
+
+    def flush(self, payloads):
+        if not self.online:
+            raise ConnectionError('database unreachable')
+        if any(payload['student_id'] == 'bad' for payload in payloads):
+            raise BadMark('rejected')
+        self.rows.extend(payload['student_id'] for payload in payloads)
+
+
+def _journal(tmp_path, database, **kwargs):
+    return AttendanceJournal(str(tmp_path / 'journal.db'), database.flush,
+                             rejected=lambda exc: isinstance(exc, BadMark), **kwargs)
+
+
+def _append(journal, *student_ids):
+    journal.append([(f'{student_id}|2025-01-08|1', {'student_id': student_id}) for student_id in student_ids])
+
+
+def test_rejected_mark_does_not_block_the_marks_behind_it(tmp_path):
+    database = Database()
+    journal = _journal(tmp_path, database, batch_size=2, max_attempts=3)
+    _append(journal, 'bad', 'a', 'b', 'c')
+
+    journal.flush_once()
+    assert database.rows == ['a', 'b', 'c']
+    assert journal.backlog()[0] == 1
+
+    journal.flush_once()
+    journal.flush_once()
+    assert journal.backlog()[0] == 0
+    [(_, payload, attempts, last_error)] = journal.dead_letters()
+    assert payload == {'student_id': 'bad'} and attempts == 3 and last_error == 'rejected'
+
+
+def test_outage_never_dead_letters(tmp_path):
+    database = Database()
+    database.online = False
+    journal = _journal(tmp_path, database, max_attempts=2)
+    _append(journal, 'a', 'b')
+
+    for _ in range(5):
+        assert journal.flush_once() is False
+    assert journal.dead_letters() == []
+
+    database.online = True
+    assert journal.flush_once() is True
+    assert database.rows == ['a', 'b']
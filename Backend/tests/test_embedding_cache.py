@@ -0,0 +1,66 @@
+import numpy as np
+
+from embedding_cache import EmbeddingCache, crop_hash, crop_thumbnail
+from face_pipeline import FacePipeline
+
+
+def _crop(texture=0.0, noise=0.0, seed=0):
+    """(1, 160, 160, 3) float32 crop in [0, 1]: a smooth gradient, plus an optional 4px checker texture."""
+    y, x = np.mgrid[0:160, 0:160] / 160.0
+    img = 0.3 + 0.4 * x + 0.1 * y
+    checker = (np.indices((160, 160)) // 4).sum(0) % 2 * 2 - 1
+    img = img + texture * checker
+    if noise:
+        img = img + np.random.default_rng(seed).normal(0, noise, img.shape)
+    img = np.clip(img, 0, 1)
+    return np.repeat(img[..., None], 3, axis=2)[np.newaxis].astype(np.float32)
+
+
+class CountingEmbedder:
+    """Embeds a crop as its brightness mean and spread, counting how many crops reached it."""
+
+    input_size = (160, 160)
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed(self, crops):
+        self.calls += len(crops)
+        return [np.array([np.mean(crop), np.std(crop)], dtype=np.float32) for crop in crops]
+
+
+def test_similar_but_different_crops_do_not_share_an_embedding():
+    smooth, textured = _crop(), _crop(texture=0.15)
+    # The perceptual keys collide, so the thumbnail check is what tells the faces apart
+    assert crop_hash(smooth) == crop_hash(textured)
+
+    embedder = CountingEmbedder()
+    pipeline = FacePipeline(None, None, embedder, cache=EmbeddingCache(max_bytes=1 << 20))
+    first = pipeline.embed([smooth])[0]
+    second = pipeline.embed([textured])[0]
+
+    assert embedder.calls == 2
+    assert not np.array_equal(first, second)
+    assert pipeline.cache.stats()['rejections'] == 1
+
+
+def test_near_identical_frames_reuse_the_embedding():
+    frame, next_frame = _crop(noise=0.01, seed=1), _crop(noise=0.01, seed=2)
+    embedder = CountingEmbedder()
+    pipeline = FacePipeline(None, None, embedder, cache=EmbeddingCache(max_bytes=1 << 20))
+
+    first = pipeline.embed([frame])[0]
+    second = pipeline.embed([next_frame])[0]
+
+    assert embedder.calls == 1
+    assert np.array_equal(first, second)
+
+
+def test_cache_get_requires_matching_thumbnail():
+    cache = EmbeddingCache(max_bytes=1 << 20)
+    smooth, textured = _crop(), _crop(texture=0.15)
+    key = crop_hash(smooth)
+    cache.put(key, np.ones(4, dtype=np.float32), crop_thumbnail(smooth))
+
+    assert cache.get(key, crop_thumbnail(textured)) is None
+    assert cache.get(key, crop_thumbnail(smooth)) is not None
@@ -0,0 +1,29 @@
+import numpy as np
+
+from face_gallery import FaceGallery
+
+
+def _gallery(items):
+    gallery = FaceGallery(dim=4, use_ann=False, dtype='float32')
+    gallery.load_templates(items)
+    return gallery
+
+
+def test_leftover_face_gets_next_best_when_roster_took_its_best_candidate():
+    gallery = _gallery([('ID-1 - Asha', [1, 0, 0, 0]), ('ID-2 - Bilal', [0, 1, 0, 0])])
+    exact_asha = np.array([1, 0, 0, 0], dtype=np.float32)
+    # Closer to Asha (0.78) than to Bilal (0.62), but Asha is the first face
+    leftover = np.array([1, 0.8, 0, 0], dtype=np.float32)
+
+    matches = gallery.match_batch([exact_asha, leftover], threshold=0.4, roster=['1'])
+
+    assert matches[0][0] == 'ID-1 - Asha'
+    assert matches[1][0] == 'ID-2 - Bilal'
+
+
+def test_roster_taken_student_is_never_matched_twice():
+    gallery = _gallery([('ID-1 - Asha', [1, 0, 0, 0]), ('ID-2 - Bilal', [0, 1, 0, 0])])
+    matches = gallery.match_batch([[1, 0, 0, 0], [1, 0.05, 0, 0]], threshold=0.4, roster=['1'])
+
+    # The second face is only close to Asha (Bilal scores 0.05), so it stays unknown
+    assert [person_id for person_id, _ in matches] == ['ID-1 - Asha', None]
@@ -0,0 +1,43 @@
+import numpy as np
+
+from face_gallery import FaceGallery
+from face_pipeline import FaceRegion
+from face_tracker import RecognitionSession
+
+
+class GalleryInference:
+    """Inference over a real in-memory gallery; each "image" is the list of (region, embedding) in the frame."""
+
+    def __init__(self, gallery):
+        self.gallery = gallery
+
+    def detect(self, frame):
+        return [region for region, _ in frame]
+
+    def embed_regions(self, frame, regions):
+        embeddings = {region: embedding for region, embedding in frame}
+        return [embeddings[region] for region in regions]
+
+    def match_batch(self, encodings, threshold, roster=None, exclude=None):
+        return self.gallery.match_batch(encodings, threshold, roster=roster, exclude=exclude)
+
+
+def _region(x):
+    return FaceRegion(x, 0, 100, 100, None, None, 1.0)
+
+
+def test_new_face_cannot_take_identity_of_confirmed_track():
+    gallery = FaceGallery(dim=4, use_ann=False, dtype='float32')
+    gallery.load_templates([('ID-1 - Asha', [1, 0, 0, 0]), ('ID-2 - Bilal', [0, 1, 0, 0])])
+    session = RecognitionSession(GalleryInference(gallery), 0.4, lambda person_id, confidence: None,
+                                 lambda person_id, confidence: {'name': person_id})
+    asha = np.array([1, 0, 0, 0], dtype=np.float32)
+    # Closer to Asha (0.78) than to Bilal (0.62)
+    lookalike = np.array([1, 0.8, 0, 0], dtype=np.float32)
+
+    first = session.process_frame([(_region(0), asha)])
+    second = session.process_frame([(_region(0), asha), (_region(300), lookalike)])
+
+    assert [face['name'] for face in first['detectedFaces']] == ['ID-1 - Asha']
+    assert second['embeddedFaces'] == 1
+    assert [face['name'] for face in second['detectedFaces']] == ['ID-1 - Asha', 'ID-2 - Bilal']
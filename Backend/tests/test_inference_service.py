@@ -0,0 +1,71 @@
+import threading
+
+import pytest
+
+import inference_service
+from inference_service import InferenceClient, InferenceError, InferenceServer
+
+
+class SlowInference:
+    """Stands in for LocalInference: warm_up blocks until the test lets it finish."""
+
+    def __init__(self, fail=False):
+        self.loaded = threading.Event()
+        self.fail = fail
+        self.gallery = self
+
+    def warm_up(self):
+        self.loaded.wait(5)
+        if self.fail:
+            raise RuntimeError("weights missing")
+
+    def ensure_fresh(self, db):
+        pass
+
+    def gallery_size(self):
+        return 3
+
+
+def _start(tmp_path, inference):
+    server = InferenceServer(str(tmp_path / 'inference.sock'), inference)
+    threading.Thread(target=inference_service._load, args=(server,), daemon=True).start()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, thread
+
+
+def test_sidecar_answers_loading_then_serves(app_env, tmp_path):
+    inference = SlowInference()
+    server, thread = _start(tmp_path, inference)
+    try:
+        client = InferenceClient(server.server_address, connect_timeout=1, warmup_timeout=5)
+        assert bytes(client._call(inference_service.OP_PING)) == b'loading'
+        threading.Timer(0.3, inference.loaded.set).start()
+        client.warm_up()
+        assert client.gallery_size() == 3
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_warm_up_gives_up_after_timeout(app_env, tmp_path):
+    inference = SlowInference()
+    server, thread = _start(tmp_path, inference)
+    try:
+        client = InferenceClient(server.server_address, connect_timeout=1, warmup_timeout=0.2)
+        with pytest.raises(InferenceError, match='still loading'):
+            client.warm_up()
+    finally:
+        inference.loaded.set()
+        server.shutdown()
+        server.server_close()
+
+
+def test_failed_load_stops_the_sidecar(app_env, tmp_path):
+    inference = SlowInference(fail=True)
+    inference.loaded.set()
+    server, thread = _start(tmp_path, inference)
+    thread.join(5)
+    server.server_close()
+    assert not thread.is_alive()
+    assert 'weights missing' in server.startup_error
@@ -0,0 +1,77 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+import ingest_gallery
+from face_gallery import build_templates
+
+
+class InlinePool:
+    """multiprocessing.Pool stand-in that embeds in this process."""
+
+    def __init__(self, processes, initializer):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def imap_unordered(self, func, items):
+        return map(func, items)
+
+
+class InlineContext:
+    Pool = InlinePool
+
+
+def _embed_student(task):
+    """One face per photo, no model: the templates only need to be distinct."""
+    folder, paths = task
+    encodings = [np.full(4, len(paths) + i, dtype=np.float32) for i in range(len(paths))]
+    return folder, build_templates(encodings), len(paths), len(paths), [], None
+
+
+def _student(root, folder, photos):
+    path = root / folder
+    path.mkdir()
+    for i in range(photos):
+        (path / f'{i}.jpg').write_bytes(b'')
+
+
+@pytest.mark.parametrize('batch_size', [1, 200])
+def test_folders_with_the_same_person_id_are_stored_once(app_env, tmp_path, monkeypatch, capsys, batch_size):
+    from models import FaceEncoding
+    from neon_db import SessionLocal
+
+    monkeypatch.setattr(multiprocessing, 'get_context', lambda method: InlineContext())
+    monkeypatch.setattr(ingest_gallery, 'embed_student', _embed_student)
+    _student(tmp_path, '123 - Jane Doe', 3)
+    _student(tmp_path, '123_Jane Doe', 1)
+    _student(tmp_path, 'ID-123 - Jane Doe', 2)
+    _student(tmp_path, 'Ravi Kumar', 1)
+
+    try:
+        assert ingest_gallery.ingest(str(tmp_path), batch_size=batch_size)
+
+        db = SessionLocal()
+        try:
+            rows = {row.person_id: row.num_images for row in db.query(FaceEncoding).filter(
+                FaceEncoding.person_id.in_(['ID-123 - Jane Doe', 'Ravi Kumar']))}
+        finally:
+            db.close()
+        # The folder with the most photos wins, whatever batch the others land in
+        assert rows == {'ID-123 - Jane Doe': 3, 'Ravi Kumar': 1}
+        out = capsys.readouterr().out
+        assert "123_Jane Doe and 123 - Jane Doe are both ID-123 - Jane Doe" in out
+        assert "Stored 2 students" in out
+        # Every folder is checkpointed, so a re-run has nothing left to do
+        assert len(ingest_gallery.load_checkpoint(str(tmp_path / '.ingest_checkpoint'))) == 4
+    finally:
+        db = SessionLocal()
+        db.query(FaceEncoding).filter(FaceEncoding.person_id.in_(['ID-123 - Jane Doe', 'Ravi Kumar'])).delete(
+            synchronize_session=False)
+        db.commit()
+        db.close()
@@ -0,0 +1,32 @@
+from marked_index import MarkedIndex
+
+
+def test_past_date_does_not_evict_current_days():
+    index = MarkedIndex(max_days=2)
+    index.add('2025-01-07', '1', ['a'])
+    index.add('2025-01-08', '1', ['b'])
+
+    index.add('2024-12-01', '1', ['c'])
+
+    assert index.marked('2025-01-07', '1', ['a']) == {'a'}
+    assert index.marked('2025-01-08', '1', ['b']) == {'b'}
+    assert index.marked('2024-12-01', '1', ['c']) == set()
+
+
+def test_newer_date_evicts_the_oldest():
+    index = MarkedIndex(max_days=2)
+    for date_str, student_id in (('2025-01-07', 'a'), ('2025-01-08', 'b'), ('2025-01-09', 'c')):
+        index.add(date_str, '1', [student_id])
+
+    assert index.marked('2025-01-07', '1', ['a']) == set()
+    assert index.marked('2025-01-09', '1', ['c']) == {'c'}
+
+
+def test_malformed_dates_are_not_indexed():
+    index = MarkedIndex(max_days=2)
+    index.add('2025-01-08', '1', ['a'])
+    for date_str in ('08/01/2025', '2025-1-8', '', None):
+        index.add(date_str, '1', ['x'])
+
+    assert index.marked('2025-01-08', '1', ['a']) == {'a'}
+    assert index.marked('08/01/2025', '1', ['x']) == set()
@@ -0,0 +1,40 @@
+import json
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+
+from embedding_codec import decode_embedding
+
+
+def _legacy_database(path):
+    """A database from before binary embeddings: face_encodings with JSON only, no other tables."""
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE face_encodings (
+                id INTEGER PRIMARY KEY, person_id VARCHAR UNIQUE, encoding_data TEXT,
+                num_images INTEGER, created_at DATETIME, updated_at DATETIME)
+        """))
+        conn.execute(text("INSERT INTO face_encodings (person_id, encoding_data, num_images) VALUES (:p, :e, 1)"),
+                     {'p': 'ID-7 - Asha', 'e': json.dumps([0.5] * 128)})
+    return engine
+
+
+def test_deploy_brings_a_legacy_database_up_to_date_and_is_idempotent(app_env, tmp_path, monkeypatch):
+    import migrate
+
+    engine = _legacy_database(tmp_path / 'legacy.db')
+    monkeypatch.setattr(migrate, 'engine', engine)
+    monkeypatch.setattr(migrate, 'SessionLocal', sessionmaker(bind=engine))
+
+    assert migrate.main(['deploy']) == 0
+    assert migrate.main(['deploy']) == 0
+
+    schema = inspect(engine)
+    assert 'embedding' in {c['name'] for c in schema.get_columns('face_encodings')}
+    assert migrate.ATTENDANCE_UNIQUE_INDEX in {i['name'] for i in schema.get_indexes('attendance')}
+    with engine.connect() as conn:
+        (embedding,) = conn.execute(text("SELECT embedding FROM face_encodings")).one()
+        students = conn.execute(text("SELECT student_id, name FROM students")).all()
+    assert decode_embedding(embedding).shape[-1] == 128
+    assert students == [('7', 'Asha')]
@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def notifications(app_env):
+    import neon_db
+    from models import Notification
+    db = neon_db.SessionLocal()
+    try:
+        db.query(Notification).delete()
+        start = datetime(2025, 1, 8, 8, 0)
+        db.add_all([Notification(type='info', title=f'N{i}', message='', timestamp=start + timedelta(minutes=i), read=i % 2)
+                    for i in range(5)])
+        db.commit()
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize('limit', ['0', '-5'])
+def test_limit_below_one_is_rejected(client, notifications, limit):
+    response = client.get(f'/api/notifications?limit={limit}')
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_pages_follow_next_before(client, notifications):
+    first = client.get('/api/notifications?limit=3').get_json()
+    assert [n['title'] for n in first['data']] == ['N4', 'N3', 'N2']
+    assert first['unreadCount'] == 3
+
+    second = client.get(f"/api/notifications?limit=3&before={first['nextBefore']}").get_json()
+    assert [n['title'] for n in second['data']] == ['N1', 'N0']
+    assert second['nextBefore'] is None
@@ -0,0 +1,40 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip('onnxruntime')
+pytest.importorskip('deepface')
+
+from embedding_backends import DeepFaceBackend, OnnxBackend, FACENET_ONNX_PATH
+from face_pipeline import ALIGNERS, DETECTORS
+from image_io import decode_image
+
+PHOTO = os.path.join(os.path.dirname(__file__), '..', '..', 'Logos', 'Cofounder.webp')
+MIN_COSINE = 0.999
+
+
+@pytest.fixture(scope='module')
+def backends():
+    if not FACENET_ONNX_PATH or not os.path.exists(FACENET_ONNX_PATH):
+        pytest.skip('FACENET_ONNX_PATH is not set to an exported model')
+    reference, candidate = DeepFaceBackend(), OnnxBackend(path=FACENET_ONNX_PATH)
+    try:
+        reference.load()
+    except Exception as e:  # weights are downloaded on first use
+        pytest.skip(f'Facenet weights unavailable: {e}')
+    return reference, candidate
+
+
+@pytest.mark.parametrize('max_dim', [1024, 2304])
+def test_onnx_embeddings_match_tensorflow(backends, max_dim):
+    reference, candidate = backends
+    with open(PHOTO, 'rb') as f:
+        image = decode_image(f.read(), max_dim)
+    regions = DETECTORS['opencv']().detect(image)
+    crops = ALIGNERS['deepface']().align(image, regions, reference.input_size)
+    assert crops, 'no face found in the fixture photo'
+
+    for want, got in zip(reference.embed(crops), candidate.embed(crops)):
+        cosine = want @ got / (np.linalg.norm(want) * np.linalg.norm(got))
+        assert cosine >= MIN_COSINE
@@ -0,0 +1,52 @@
+"""
+Upload size limits and request parsing for image endpoints. Kept free of
+numpy/OpenCV so app.py can import it at boot; decoding lives in image_io.
+"""
+import base64
+import os
+
+from metrics import REQUEST_STAGE_SECONDS
+
+# Hard cap on the decoded image upload (bytes); base64 JSON bodies are allowed ~4/3 of this
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', str(8 * 1024 * 1024)))
+MAX_REQUEST_BYTES = MAX_UPLOAD_BYTES * 4 // 3 + 64 * 1024
+
+
+class UploadTooLarge(ValueError):
+    """The uploaded image exceeds MAX_UPLOAD_BYTES."""
+
+
+def read_upload(request, field='image'):
+    """
+    Get image bytes and form fields from a request in any supported encoding:
+      - raw body with Content-Type image/* (fields from the query string)
+      - multipart/form-data with the image in `field` (fields from the form)
+      - JSON with a base64 string in `field` (fields from the JSON object)
+    Returns (image_bytes, fields). Raises UploadTooLarge or ValueError.
+    """
+    content_type = (request.mimetype or '').lower()
+    if request.content_length is not None and request.content_length > MAX_REQUEST_BYTES:
+        raise UploadTooLarge(f"Upload exceeds {MAX_UPLOAD_BYTES} bytes")
+
+    if content_type.startswith('image/'):
+        data = request.stream.read(MAX_UPLOAD_BYTES + 1)
+        fields = request.args
+    elif content_type == 'multipart/form-data':
+        upload = request.files.get(field)
+        if upload is None:
+            raise ValueError('No image provided')
+        data = upload.stream.read(MAX_UPLOAD_BYTES + 1)
+        fields = request.form
+    else:
+        payload = request.get_json(silent=True)
+        if not payload or field not in payload:
+            raise ValueError('No image provided')
+        with REQUEST_STAGE_SECONDS.time(stage='base64_decode'):
+            data = base64.b64decode(payload[field])
+        fields = payload
+
+    if not data:
+        raise ValueError('No image provided')
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise UploadTooLarge(f"Upload exceeds {MAX_UPLOAD_BYTES} bytes")
+    return data, fields
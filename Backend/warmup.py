@@ -0,0 +1,106 @@
+"""
+Background model warmup.
+
+Loading DeepFace/TensorFlow takes seconds, so a worker starts loading the
+recognition stack in a background thread as soon as it boots, instead of
+letting the first /api/recognize of the day pay for it (and time out).
+Recognition requests call ensure_ready(): if the load is in flight they wait
+for it rather than starting a second one; if it failed, they retry it.
+
+MODEL_WARMUP=background (default) warms up at boot; MODEL_WARMUP=lazy loads
+on the first recognition request, for hosts too small to hold the model in
+every worker. /api/ready reports the state.
+"""
+import logging
+import os
+import threading
+import time
+
+MODEL_WARMUP = os.environ.get('MODEL_WARMUP', 'background').lower()
+# Give the worker a moment to start serving before the load competes for CPU
+MODEL_WARMUP_DELAY_SECONDS = float(os.environ.get('MODEL_WARMUP_DELAY_SECONDS', '0'))
+
+COLD = 'cold'
+LOADING = 'loading'
+READY = 'ready'
+FAILED = 'failed'
+
+logger = logging.getLogger(__name__)
+
+
+def rss_mb():
+    """Resident set size of this process in MB (Linux only; None elsewhere)."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class ModelWarmup:
+    """Runs load() once per process, in the background or in the first request that needs it."""
+
+    def __init__(self, load):
+        self._load = load
+        self._lock = threading.Lock()
+        self._thread = None
+        self.state = COLD
+        self.error = None
+        self.load_seconds = None
+        self.rss_delta_mb = None
+
+    def start(self, delay=MODEL_WARMUP_DELAY_SECONDS):
+        """Load in a daemon thread; a no-op if a load was already started."""
+        if self._thread is not None or self.state == READY:
+            return
+        self._thread = threading.Thread(target=self._run, args=(delay,), name='model-warmup', daemon=True)
+        self._thread.start()
+
+    def _run(self, delay):
+        if delay > 0:
+            time.sleep(delay)
+        try:
+            self.ensure_ready()
+        except Exception:
+            pass  # recorded in self.error; the next recognition request retries
+
+    def ensure_ready(self):
+        """Block until the models are loaded, loading them here if nobody else is. Raises if loading fails."""
+        if self.state == READY:
+            return
+        # Whoever holds the lock is loading; everyone else waits for that load instead of starting another
+        with self._lock:
+            if self.state == READY:
+                return
+            self.state = LOADING
+            self.error = None
+            logger.info("Model warmup: loading recognition models...")
+            rss_before = rss_mb()
+            start = time.perf_counter()
+            try:
+                self._load()
+            except Exception as e:
+                self.state = FAILED
+                self.error = str(e)
+                logger.error("Model warmup failed: %s", e)
+                raise
+            self.load_seconds = time.perf_counter() - start
+            rss_after = rss_mb()
+            if rss_before is not None and rss_after is not None:
+                self.rss_delta_mb = rss_after - rss_before
+            self.state = READY
+            logger.info("Model warmup: ready in %.1fs", self.load_seconds)
+
+    def status(self):
+        rss = rss_mb()
+        return {
+            'state': self.state,
+            'ready': self.state == READY,
+            'loadSeconds': round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            'rssDeltaMb': round(self.rss_delta_mb, 1) if self.rss_delta_mb is not None else None,
+            'rssMb': round(rss, 1) if rss is not None else None,
+            'error': self.error,
+        }
@@ -13,6 +13,7 @@ interface Notification {
 
 const NotificationCenter = () => {
   const [notifications, setNotifications] = useState<Notification[]>([]);
+  const [serverUnreadCount, setServerUnreadCount] = useState<number | null>(null);
   const [isOpen, setIsOpen] = useState(false);
 
   useEffect(() => {
@@ -27,13 +28,15 @@ const NotificationCenter = () => {
       const result = await response.json();
       if (result.success) {
         setNotifications(result.data);
+        // Counted by the server across all notifications, not just the first page
+        setServerUnreadCount(typeof result.unreadCount === 'number' ? result.unreadCount : null);
       }
     } catch (error) {
       console.error('Failed to fetch notifications:', error);
     }
   };
 
-  const unreadCount = notifications.filter(n => !n.read).length;
+  const unreadCount = serverUnreadCount ?? notifications.filter(n => !n.read).length;
 
   const markAsRead = async (id: number) => {
     try {
@@ -41,6 +44,9 @@ const NotificationCenter = () => {
         method: 'PUT'
       });
       setNotifications(prev => prev.map(n => n.id === id ? { ...n, read: 1 } : n));
+      if (notifications.some(n => n.id === id && !n.read)) {
+        setServerUnreadCount(prev => (prev === null ? null : Math.max(prev - 1, 0)));
+      }
     } catch (error) {
       console.error('Failed to mark notification as read:', error);
     }
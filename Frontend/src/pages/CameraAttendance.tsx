@@ -133,39 +133,33 @@ const CameraAttendance = () => {
       return;
     }
 
-    const reader = new FileReader();
-    reader.readAsDataURL(blob);
-
-    reader.onloadend = async () => {
-      try {
-        const base64 = (reader.result as string).split(",")[1];
-        const apiService = (await import("../utils/api")).default;
-
-        const result = await apiService.recognizeFace(base64, {
-          period: currentPeriod,
-          date: attendanceDate,
-        });
-
-        if (result.success) {
-          setDetectedFaces(result.detectedFaces);
-
-          const already = result.detectedFaces
-            .filter((f: any) => f.attendanceAlreadyMarked)
-            .map((f: any) => `${f.name} (${f.rollNumber})`);
-
-          if (already.length > 0) {
-            setAlreadyMarkedStudents(already);
-            setShowAlreadyMarkedDialog(true);
-          }
-        } else {
-          showToast("info", "No Faces", "No students detected");
+    try {
+      const apiService = (await import("../utils/api")).default;
+
+      const result = await apiService.recognizeFaceImage(blob, {
+        period: currentPeriod,
+        date: attendanceDate,
+      });
+
+      if (result.success) {
+        setDetectedFaces(result.detectedFaces);
+
+        const already = result.detectedFaces
+          .filter((f: any) => f.attendanceAlreadyMarked)
+          .map((f: any) => `${f.name} (${f.rollNumber})`);
+
+        if (already.length > 0) {
+          setAlreadyMarkedStudents(already);
+          setShowAlreadyMarkedDialog(true);
         }
-      } catch (e: any) {
-        showToast("error", "Scan Failed", e.message);
-      } finally {
-        setIsScanning(false);
+      } else {
+        showToast("info", "No Faces", "No students detected");
       }
-    };
+    } catch (e: any) {
+      showToast("error", "Scan Failed", e.message);
+    } finally {
+      setIsScanning(false);
+    }
   };
 
   return (
@@ -23,6 +23,31 @@ const apiService = {
     return await response.json();
   },
 
+  // Face recognition with the raw JPEG as the body (no base64/JSON overhead)
+  recognizeFaceImage: async (
+    image: Blob,
+    options?: { period?: string; date?: string; className?: string; section?: string }
+  ) => {
+    const queryParams = new URLSearchParams();
+    if (options?.period) queryParams.append('period', options.period);
+    if (options?.date) queryParams.append('date', options.date);
+    if (options?.className) queryParams.append('className', options.className);
+    if (options?.section) queryParams.append('section', options.section);
+
+    const response = await fetch(`${API_CONFIG.BASE_URL}/recognize?${queryParams.toString()}`, {
+      method: 'POST',
+      headers: { 'Content-Type': image.type || 'image/jpeg' },
+      body: image
+    });
+
+    if (!response.ok) {
+      const errorData = await response.json();
+      throw new Error(errorData.message || 'Failed to communicate with the recognition service');
+    }
+
+    return await response.json();
+  },
+
   // Period-based attendance
   getPeriodAttendance: async (date?: string, period?: string) => {
     const queryParams = new URLSearchParams();